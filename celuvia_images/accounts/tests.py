@@ -149,6 +149,8 @@ class AccountsViewsTest(TestCase):
     These tests validate that buyers and vendors can sign up correctly,
     are assigned to the correct groups, and that login works as expected.
     """
+    databases = {"default", "replica"}
+
     def setUp(self):
         """
         Create Buyer and Vendor groups for testing.
@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "celuvia_images.settings")
 
 application = get_asgi_application()
+
+# Compile all templates before the first request
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_TEMPLATES:
+    from celuvia_images.template_cache import warm_templates  # noqa: E402
+    warm_templates()
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 
 
 def site_name(request):
@@ -10,11 +11,11 @@ def site_name(request):
 
 def categories(request):
     """
+    Make the cached category list available in all templates.
+
+    The list is only loaded when a template uses it, and comes from the
+    in-process registry, so rendering doesn't query the database.
     import inside function to avoid app registry issues at import time
     """
-    try:
-        from shop.models import Category
-        cats = Category.objects.all()
-    except Exception:
-        cats = []
-    return {"categories": cats}
+    from shop.functions.categories import get_categories
+    return {"categories": SimpleLazyObject(get_categories)}
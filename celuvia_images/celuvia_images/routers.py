@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+"""
+PRIMARY_DB / REPLICA_DB:
+    - Database aliases used by the router. The replica is optional, if it
+      is not configured in settings.DATABASES every query goes to the
+      primary.
+
+REPLICA_APPS:
+    - Apps whose models may be read from the replica. Sessions, users and
+      auth always use the primary so logins and carts never see stale data.
+"""
+PRIMARY_DB = "default"
+REPLICA_DB = "replica"
+REPLICA_APPS = {"shop"}
+
+PIN_COOKIE = "pin_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_use_replica = ContextVar("use_replica", default=False)
+_pinned = ContextVar("pinned_to_primary", default=False)
+_wrote = ContextVar("wrote_to_primary", default=False)
+
+
+def replica_configured():
+    """
+    Returns True if a replica database alias exists in settings.
+    """
+    return REPLICA_DB in settings.DATABASES
+
+
+def pin_to_primary():
+    """
+    Pin the rest of the current request to the primary database.
+    """
+    _pinned.set(True)
+
+
+def is_pinned():
+    """
+    Returns True if the current request is pinned to the primary.
+    """
+    return _pinned.get()
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Context manager sending shop reads inside the block to the replica,
+    unless the request has been pinned to the primary.
+    """
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_reads(view):
+    """
+    Decorator for catalog and reporting views that can be served from
+    the replica. Works on sync and async views.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            with read_from_replica():
+                return await view(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with read_from_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """
+    Routes catalog reads to the replica and everything else to the
+    primary.
+
+    Reads only go to the replica inside read_from_replica() (or a view
+    decorated with replica_reads) and only while the request is not
+    pinned. Any write to a shop model pins the request, so a view that
+    writes and then reads always reads its own writes.
+    """
+    def db_for_read(self, model, **hints):
+        if (_use_replica.get() and not _pinned.get()
+                and model._meta.app_label in REPLICA_APPS
+                and replica_configured()):
+            return REPLICA_DB
+        return PRIMARY_DB
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in REPLICA_APPS:
+            _wrote.set(True)
+            pin_to_primary()
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is populated by replication, never migrated directly
+        return db == PRIMARY_DB
+
+
+class PrimaryPinningMiddleware:
+    """
+    Sets the per-request sticky flag used by PrimaryReplicaRouter.
+
+    Unsafe methods (POST, PUT, ...) are pinned for the whole request. When
+    a request writes to a shop model a short lived cookie is set, so the
+    requests that follow it (e.g. the redirect after adding a review or
+    the cart -> checkout -> webhook flow) keep reading from the primary
+    while the replica catches up.
+
+    Under ASGI it runs async, so async views aren't passed through a
+    thread. The flags are context variables, which asgiref copies into
+    and back out of the threads running sync ORM calls.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        tokens = self.start(request)
+        try:
+            response = self.get_response(request)
+            self.finish(response)
+        finally:
+            self.reset(tokens)
+        return response
+
+    async def __acall__(self, request):
+        tokens = self.start(request)
+        try:
+            response = await self.get_response(request)
+            self.finish(response)
+        finally:
+            self.reset(tokens)
+        return response
+
+    def start(self, request):
+        """
+        Sets the request's flags, returning the tokens to reset them.
+        """
+        pinned = (request.method not in SAFE_METHODS
+                  or PIN_COOKIE in request.COOKIES)
+        return (_pinned.set(pinned), _wrote.set(False),
+                _use_replica.set(False))
+
+    def finish(self, response):
+        """
+        Sets the pin cookie if the request wrote to a shop model.
+        """
+        if _wrote.get():
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite="Lax")
+
+    def reset(self, tokens):
+        """
+        Restores the flags to what they were before the request.
+        """
+        pinned_token, wrote_token, replica_token = tokens
+        _use_replica.reset(replica_token)
+        _wrote.reset(wrote_token)
+        _pinned.reset(pinned_token)
@@ -12,8 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from django.contrib.messages import constants as messages
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 import os
+import sys
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -22,27 +24,135 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Load .env file
 load_dotenv(os.path.join(BASE_DIR, ".env"))
 
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+# Deployment profiles
+# Set CELUVIA_PROFILE in the .env file to dev, test, prod or bench
+# (`manage.py test` picks test). The profile sets the defaults below, and
+# any of them can still be overridden by its own environment variable.
+PROFILES = {
+    "dev": {
+        "DEBUG": True,
+        "DB_ENGINE": "mysql",
+        "DB_CONN_MAX_AGE": 0,
+        "WEB_WORKERS": 1,
+        "WEB_THREADS": 1,
+        "CACHE_BACKEND": "locmem",
+        "SESSION_MODE": "db",
+        "CACHED_TEMPLATES": False,
+        "WARM_TEMPLATES": False,
+        "LOG_LEVEL": "INFO",
+        "INDEX_REBUILD_SECONDS": 0,
+    },
+    "test": {
+        "DEBUG": False,
+        "DB_ENGINE": "sqlite",
+        "DB_CONN_MAX_AGE": 0,
+        "WEB_WORKERS": 1,
+        "WEB_THREADS": 1,
+        "CACHE_BACKEND": "locmem",
+        "SESSION_MODE": "db",
+        "CACHED_TEMPLATES": True,
+        "WARM_TEMPLATES": False,
+        "LOG_LEVEL": "WARNING",
+        "INDEX_REBUILD_SECONDS": 0,
+    },
+    "prod": {
+        "DEBUG": False,
+        "DB_ENGINE": "mysql",
+        "DB_CONN_MAX_AGE": 60,
+        "WEB_WORKERS": 4,
+        "WEB_THREADS": 2,
+        "CACHE_BACKEND": "redis",
+        "SESSION_MODE": "cached_db",
+        "CACHED_TEMPLATES": True,
+        "WARM_TEMPLATES": True,
+        "LOG_LEVEL": "WARNING",
+        "INDEX_REBUILD_SECONDS": 30,
+    },
+    "bench": {
+        "DEBUG": False,
+        "DB_ENGINE": "sqlite",
+        "DB_CONN_MAX_AGE": 60,
+        "WEB_WORKERS": 1,
+        "WEB_THREADS": 1,
+        "CACHE_BACKEND": "locmem",
+        "SESSION_MODE": "cached_db",
+        "CACHED_TEMPLATES": True,
+        "WARM_TEMPLATES": True,
+        "LOG_LEVEL": "ERROR",
+        "INDEX_REBUILD_SECONDS": 30,
+    },
+}
+
+PROFILE = os.getenv(
+    "CELUVIA_PROFILE", "test" if "test" in sys.argv[1:2] else "dev")
+if PROFILE not in PROFILES:
+    raise ImproperlyConfigured(
+        f"Unknown CELUVIA_PROFILE '{PROFILE}', "
+        f"choose one of {', '.join(PROFILES)}.")
+
+
+def env(name, cast=str):
+    """
+    Read a setting from the environment, falling back to the profile.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return PROFILES[PROFILE][name]
+    if cast is bool:
+        return value.lower() in ("1", "true", "yes", "on")
+    return cast(value)
+
+
+def max_age(value):
+    """
+    Cast CONN_MAX_AGE, where "None" means keep connections forever.
+    """
+    return None if value == "None" else int(value)
+
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-=o39))9z#8()@kqg+9d9r2uxpmnq4scnw#kv++jywj6@#8t*pa"
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    if PROFILE == "prod":
+        raise ImproperlyConfigured("SECRET_KEY must be set in production.")
+    SECRET_KEY = (
+        "django-insecure-=o39))9z#8()@kqg+9d9r2uxpmnq4scnw#kv++jywj6@#8t*pa")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# With DEBUG on, every SQL query is also kept in connection.queries.
+DEBUG = env("DEBUG", bool)
 
 # Stripe keys
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 
+# Stripe API calls (see shop/functions/payments.py): seconds to connect
+# and to wait for a response, retries of timeouts and server errors, and
+# the circuit breaker, which stops calling Stripe for
+# STRIPE_BREAKER_SECONDS after STRIPE_BREAKER_FAILURES failures in a row.
+# STRIPE_API_BASE points the calls at a fake Stripe in benchmarks.
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", 3))
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", 10))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", 1))
+STRIPE_BREAKER_FAILURES = int(os.getenv("STRIPE_BREAKER_FAILURES", 5))
+STRIPE_BREAKER_SECONDS = float(os.getenv("STRIPE_BREAKER_SECONDS", 30))
+
+# Seconds a checkout session's URL is cached under its idempotency key, so
+# the same checkout started again is sent to it without calling Stripe.
+# Sessions stay open for 24 hours.
+STRIPE_SESSION_CACHE_SECONDS = int(
+    os.getenv("STRIPE_SESSION_CACHE_SECONDS", 60 * 60))
+
 # X API keys
 TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN")
 TWITTER_ACCESS_TOKEN_SECRET = os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
 TWITTER_API_KEY = os.getenv("TWITTER_API_KEY")
 TWITTER_API_SECRET = os.getenv("TWITTER_API_SECRET")
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host.strip() for host in
+                 os.getenv("ALLOWED_HOSTS", "").split(",") if host.strip()]
 
 # Application definition
 
@@ -63,6 +173,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "celuvia_images.routers.PrimaryPinningMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -73,17 +184,37 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "celuvia_images.urls"
 
+# Templates are parsed once per process and kept in memory when
+# CACHED_TEMPLATES is on, otherwise they are re-read on every render.
+TEMPLATE_LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+if env("CACHED_TEMPLATES", bool):
+    TEMPLATE_LOADERS = [
+        ("django.template.loaders.cached.Loader", TEMPLATE_LOADERS)]
+
+# Compile every template when the WSGI/ASGI app starts, so the first
+# requests don't pay for parsing (see celuvia_images/template_cache.py)
+WARM_TEMPLATES = env("WARM_TEMPLATES", bool)
+
+# Rebuild the facet and suggestion indexes in a background thread, at most
+# once every INDEX_REBUILD_SECONDS, while requests use the previous one
+# (0 rebuilds on the next request, see shop/functions/cache.py)
+INDEX_REBUILD_SECONDS = env("INDEX_REBUILD_SECONDS", int)
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
+            "loaders": TEMPLATE_LOADERS,
             "context_processors": [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "celuvia_images.context_processors.site_name",
+                "celuvia_images.context_processors.categories",
             ],
         },
     },
@@ -91,6 +222,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "celuvia_images.wsgi.application"
 
+# Served by an ASGI server instead, checkout, the Stripe webhook and the
+# catalog API run async, so requests waiting on Stripe don't hold threads
+ASGI_APPLICATION = "celuvia_images.asgi.application"
+
 # REST Frameork
 REST_FRAMEWORK = {
     "DEFAULT_RENDERED_CLASSES": (
@@ -102,17 +237,108 @@ REST_FRAMEWORK = {
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# Connection reuse: each worker thread keeps its connection open for
+# DB_CONN_MAX_AGE seconds (0 closes it after every request, None keeps it
+# forever) and pings it before reuse when health checks are on.
+DB_CONN_MAX_AGE = env("DB_CONN_MAX_AGE", max_age)
+DB_CONN_HEALTH_CHECKS = os.getenv("DB_CONN_HEALTH_CHECKS", "True") == "True"
+
+# Persistent connections are held per worker thread, so workers * threads
+# must fit within the server's max_connections (MySQL default is 151).
+WEB_WORKERS = env("WEB_WORKERS", int)
+WEB_THREADS = env("WEB_THREADS", int)
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 151))
+
+if env("DB_ENGINE") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / f"{PROFILE}_db.sqlite3",
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.mysql",
+            "NAME": os.getenv("DB_NAME", "celuvia_db"),
+            "USER": os.getenv("DB_USER", "celuvia_admin"),
+            "PASSWORD": os.getenv("DB_PASSWORD", "hyperionDev"),
+            "HOST": os.getenv("DB_HOST", "localhost"),
+            "PORT": os.getenv("DB_PORT", "3306"),
+        }
+    }
+DATABASES["default"]["CONN_MAX_AGE"] = DB_CONN_MAX_AGE
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = DB_CONN_HEALTH_CHECKS
+
+# Read replica for catalog browsing and vendor reporting, only added when
+# DB_REPLICA_HOST is set in the .env file
+if os.getenv("DB_REPLICA_HOST") and env("DB_ENGINE") == "mysql":
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("DB_REPLICA_HOST"),
+        "PORT": os.getenv("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+    }
+
+# Tests run on two SQLite databases, the replica mirrors the primary
+if PROFILE == "test":
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "TEST": {"MIRROR": "default"},
+    }
+    TEST_RUNNER = "celuvia_images.test_runner.ReplicaMirrorRunner"
+
+    # Fast hashing keeps user creation cheap in tests
+    PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+DATABASE_ROUTERS = ["celuvia_images.routers.PrimaryReplicaRouter"]
+
+# Seconds a client keeps reading from the primary after it writes
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 5))
+
+# Cache
+# locmem is per process, prod uses redis so every worker shares one cache
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "celuvia",
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/1"),
+    },
+    "db": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+    },
+}
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
-        "NAME": "celuvia_db",
-        "USER": "celuvia_admin",
-        "PASSWORD": "hyperionDev",
-        "HOST": "localhost",
-        "PORT": "3306",
+        **CACHE_BACKENDS[env("CACHE_BACKEND")],
+        "KEY_PREFIX": "celuvia",
+        "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", 300)),
     }
 }
 
+# Sessions
+# The cart lives in the session, so the mode decides what every cart
+# change costs:
+#   - db: read and write django_session on every change
+#   - cached_db: reads come from the cache, writes still go to the table
+#   - signed_cookies: no session table at all, the cart is kept in a
+#     signed (readable, tamper-proof) cookie limited to about 4KB
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+SESSION_MODE = env("SESSION_MODE")
+if SESSION_MODE not in SESSION_ENGINES:
+    raise ImproperlyConfigured(
+        f"Unknown SESSION_MODE '{SESSION_MODE}', "
+        f"choose one of {', '.join(SESSION_ENGINES)}.")
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+
 
 AUTH_USER_MODEL = "accounts.User"
 LOGIN_REDIRECT_URL = "shop:home"
@@ -166,7 +392,9 @@ SITE_NAME = "Celuvia Images"
 
 # Messages
 
-MESSAGE_STORAGE = "django.contrib.messages.storage.session.SessionStorage"
+# Flash messages go in a cookie and only fall back to the session when too
+# big, so showing a message doesn't write to the session table
+MESSAGE_STORAGE = "django.contrib.messages.storage.fallback.FallbackStorage"
 
 MESSAGE_TAGS = {
     messages.DEBUG: "secondary",
@@ -181,6 +409,36 @@ MESSAGE_TAGS = {
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 DEFAULT_FROM_EMAIL = f"no-reply@{SITE_NAME.lower().replace(' ', '')}.local"
 
+# Logging
+# SQL queries are not logged, even with LOG_LEVEL=DEBUG
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "simple": {
+            "format": "{asctime} {levelname} {name}: {message}",
+            "style": "{",
+        },
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": "simple",
+        },
+    },
+    "root": {
+        "handlers": ["console"],
+        "level": env("LOG_LEVEL"),
+    },
+    "loggers": {
+        "django.db.backends": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,46 @@
+from pathlib import Path
+from django.template import TemplateSyntaxError, engines
+
+"""
+TEMPLATE_SUFFIXES:
+    - File types compiled by warm_templates(), anything else in a
+      template directory (e.g. images) is skipped.
+"""
+TEMPLATE_SUFFIXES = {".html", ".txt", ".xml"}
+
+
+def template_names(engine):
+    """
+    Returns the sorted names of every template the engine's loaders can
+    find, across DIRS and all app template directories.
+    """
+    names = set()
+    for loader in engine.template_loaders:
+        # The cached loader wraps the real loaders
+        for inner in getattr(loader, "loaders", [loader]):
+            for directory in inner.get_dirs():
+                directory = Path(directory)
+                if not directory.is_dir():
+                    continue
+                for path in directory.rglob("*"):
+                    if path.is_file() and path.suffix in TEMPLATE_SUFFIXES:
+                        names.add(path.relative_to(directory).as_posix())
+    return sorted(names)
+
+
+def warm_templates():
+    """
+    Compile every template so the cached loader holds them all before the
+    first request.
+
+    - return: tuple of (number compiled, list of (name, error) pairs).
+    """
+    engine = engines["django"].engine
+    compiled, errors = 0, []
+    for name in template_names(engine):
+        try:
+            engine.get_template(name)
+            compiled += 1
+        except TemplateSyntaxError as e:
+            errors.append((name, e))
+    return compiled, errors
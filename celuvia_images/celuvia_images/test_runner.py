@@ -0,0 +1,28 @@
+from django.db.backends.signals import connection_created
+from django.test.runner import DiscoverRunner
+
+
+def read_uncommitted(sender, connection, **kwargs):
+    """
+    Let the replica connection read the primary's open test transaction.
+    """
+    if connection.alias == "replica" and connection.vendor == "sqlite":
+        connection.cursor().execute("PRAGMA read_uncommitted = 1")
+
+
+class ReplicaMirrorRunner(DiscoverRunner):
+    """
+    Test runner for the replica test mirror.
+
+    Both aliases open the same shared in-memory SQLite database. TestCase
+    wraps every test in a transaction on the primary, so the replica
+    connection is switched to read uncommitted rows, otherwise it would
+    neither see the test data nor avoid SQLite's shared-cache table locks.
+    """
+    def setup_databases(self, **kwargs):
+        connection_created.connect(read_uncommitted)
+        return super().setup_databases(**kwargs)
+
+    def teardown_databases(self, old_config, **kwargs):
+        super().teardown_databases(old_config, **kwargs)
+        connection_created.disconnect(read_uncommitted)
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "celuvia_images.settings")
 
 application = get_wsgi_application()
+
+# Compile all templates before the first request
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_TEMPLATES:
+    from celuvia_images.template_cache import warm_templates  # noqa: E402
+    warm_templates()
@@ -6,9 +6,12 @@ class ShopConfig(AppConfig):
     Tells django to load signals.py for address creation if user added
     address at signuo. This will also allow the delivery address to
     prepoulate at checkout.
+
+    Also registers the system checks in checks.py.
     """
     default_auto_field = "django.db.models.BigAutoField"
     name = "shop"
 
     def ready(self):
         import shop.signals
+        import shop.checks
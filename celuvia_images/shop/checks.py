@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def connection_pool_size(app_configs, **kwargs):
+    """
+    Warn when persistent connections held by every worker thread could
+    use up the database server's max_connections.
+    """
+    errors = []
+    if settings.DB_CONN_MAX_AGE == 0:
+        return errors
+
+    per_alias = settings.WEB_WORKERS * settings.WEB_THREADS
+    needed = per_alias * len(settings.DATABASES)
+    if needed > settings.DB_MAX_CONNECTIONS:
+        errors.append(Warning(
+            f"{settings.WEB_WORKERS} workers x {settings.WEB_THREADS} "
+            f"threads keep up to {needed} persistent connections open, "
+            f"more than DB_MAX_CONNECTIONS ({settings.DB_MAX_CONNECTIONS}).",
+            hint=("Lower WEB_WORKERS or WEB_THREADS, raise max_connections "
+                  "on the database server, or set DB_CONN_MAX_AGE=0."),
+            id="shop.W001",
+        ))
+    return errors
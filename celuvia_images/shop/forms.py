@@ -1,5 +1,6 @@
 from django import forms
-from .models import Store, Product, Review, Size, Category, Address
+from .models import (Store, Product, Review, Size, Category, Address,
+                     PriceChange)
 
 
 class StoreForm(forms.ModelForm):
@@ -161,3 +162,87 @@ class CheckoutAddressForm(forms.ModelForm):
         for field_name, field in self.fields.items():
             field.required = field_name in required_fields
             field.widget.attrs.update({"placeholder": field.label})
+
+
+class CatalogRowForm(forms.Form):
+    """
+    Form validating one row of a catalog import file.
+
+    Fields:
+        - name: CharField, product name
+        - description: CharField, product description
+        - category: CharField, category name, created if it doesn't exist
+        - image: CharField, file name of the image in the uploaded images
+        - small_price: DecimalField, price of small image
+        - medium_price: DecimalField, price of medium image
+        - large_price: DecimalField, price of large image
+    """
+    name = forms.CharField(max_length=200)
+    description = forms.CharField(required=False)
+    category = forms.CharField(max_length=100, required=False)
+    image = forms.CharField(max_length=255)
+    small_price = forms.DecimalField(
+        max_digits=8, decimal_places=2, min_value=0, required=False)
+    medium_price = forms.DecimalField(
+        max_digits=8, decimal_places=2, min_value=0, required=False)
+    large_price = forms.DecimalField(
+        max_digits=8, decimal_places=2, min_value=0, required=False)
+
+    def clean(self):
+        """
+        Requires at least one size to have a price.
+        """
+        cleaned_data = super().clean()
+        prices = [f"{size}_price" for size in ["small", "medium", "large"]]
+        if all(cleaned_data.get(price) is None and price not in self.errors
+               for price in prices):
+            raise forms.ValidationError("At least one price is required.")
+        return cleaned_data
+
+
+class RepriceForm(forms.Form):
+    """
+    Form for changing the prices of many of a store's products at once.
+
+    Fields:
+        - mode: ChoiceField, change prices by a percentage or an amount
+        - value: DecimalField, percentage or amount, negative to lower
+        - category: ModelChoiceField, optional category to limit to
+        - products: ModelMultipleChoiceField, optional selected products,
+          passed from the store page
+    """
+    mode = forms.ChoiceField(
+        choices=PriceChange.MODE_CHOICES,
+        widget=forms.Select(attrs={"class": "form-select"}))
+    value = forms.DecimalField(
+        max_digits=8, decimal_places=2, min_value=-10000, max_value=10000,
+        help_text="Use a negative value to lower prices.",
+        widget=forms.NumberInput(attrs={"class": "form-control"}))
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.all(), required=False,
+        empty_label="All categories",
+        widget=forms.Select(attrs={"class": "form-select"}))
+    products = forms.ModelMultipleChoiceField(
+        queryset=Product.objects.none(), required=False,
+        widget=forms.MultipleHiddenInput)
+
+    def __init__(self, *args, store, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only the store's own products can be selected
+        self.fields["products"].queryset = Product.objects.filter(store=store)
+
+    def clean(self):
+        """
+        A percentage can't lower prices by more than 100% or raise them by
+        more than 1000%.
+        """
+        cleaned_data = super().clean()
+        if (cleaned_data.get("mode") == "percent"
+                and cleaned_data.get("value") is not None):
+            if cleaned_data["value"] < -100:
+                raise forms.ValidationError(
+                    "Prices can't be lowered by more than 100%.")
+            if cleaned_data["value"] > 1000:
+                raise forms.ValidationError(
+                    "Prices can't be raised by more than 1000%.")
+        return cleaned_data
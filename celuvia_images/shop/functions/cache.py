@@ -0,0 +1,116 @@
+from threading import Lock, Thread
+from time import monotonic
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+
+def version_key(name):
+    """
+    Returns the cache key holding the version stamp for name.
+    """
+    return f"version:{name}"
+
+
+def get_version(name):
+    """
+    Returns the current version stamp for name, e.g. "categories".
+
+    Stamps are random rather than counters, so a cleared or evicted cache
+    can never bring back a version that some process already has cached.
+    """
+    key = version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*names):
+    """
+    Give each name a new version stamp, invalidating everything cached
+    under the old one.
+    """
+    cache.set_many({version_key(name): uuid4().hex for name in names}, None)
+
+
+def bump_version_on_commit(*names):
+    """
+    Bump the versions once the current transaction commits, so no other
+    process can reload and cache data from before the change.
+    """
+    transaction.on_commit(lambda: bump_version(*names))
+
+
+class LocalIndex:
+    """
+    A process-local index built from the database, rebuilt when any of
+    its version stamps is bumped.
+
+    Only one thread rebuilds at a time, and the others keep using the
+    previous index meanwhile. With INDEX_REBUILD_SECONDS set, the rebuild
+    runs in a background thread at most that often, so a burst of bumps
+    costs one rebuild and no request waits for it. Only the first build
+    of a process makes its request wait.
+    """
+
+    def __init__(self, names, build):
+        """
+        - param names: version stamps the index depends on.
+        - param build: function returning a new index.
+        """
+        self.names = names
+        self.build = build
+        # (versions, index), replaced as a whole so threads never see a
+        # half-built index
+        self.current = (None, None)
+        self.built_at = 0
+        self.lock = Lock()
+
+    def get(self):
+        """
+        Returns the index, rebuilding it if a version changed.
+        """
+        versions = tuple(get_version(name) for name in self.names)
+        built, index = self.current
+        if built == versions:
+            return index
+        if index is None:
+            with self.lock:
+                if self.current[1] is None:
+                    self.rebuild(versions)
+            return self.current[1]
+        if monotonic() - self.built_at < settings.INDEX_REBUILD_SECONDS:
+            return index
+        if not self.lock.acquire(blocking=False):
+            return index
+        if settings.INDEX_REBUILD_SECONDS:
+            Thread(target=self.rebuild_in_background, args=(versions,),
+                   daemon=True).start()
+            return index
+        try:
+            self.rebuild(versions)
+        finally:
+            self.lock.release()
+        return self.current[1]
+
+    def rebuild(self, versions):
+        """
+        Build the index for versions, read before building so a bump
+        during the build triggers another one.
+        """
+        self.current = (versions, self.build())
+        self.built_at = monotonic()
+
+    def rebuild_in_background(self, versions):
+        """
+        Rebuild from a background thread holding the lock, then release
+        it and close the thread's database connections.
+        """
+        try:
+            self.rebuild(versions)
+        finally:
+            self.lock.release()
+            connections.close_all()
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.utils.timezone import now
+from ..models import Store
+from .cache import bump_version_on_commit
+
+
+def set_products_active(products, active):
+    """
+    Archives or unarchives products with one UPDATE of is_active (and
+    updated_at, which their ETags use), skipping products already in that
+    state.
+
+    update() sends no signals, so cached product pages are invalidated
+    with one bump of the catalog version once the change commits.
+
+    - param products: queryset of products to change.
+    - param active: True to unarchive, False to archive.
+    - return: number of products changed.
+    """
+    changed = products.exclude(is_active=active).update(
+        is_active=active, updated_at=now())
+    if changed:
+        bump_version_on_commit("catalog")
+    return changed
+
+
+def set_store_active(store, active, archive_products=False):
+    """
+    Closes or reopens a store with one UPDATE, optionally archiving all of
+    its products with another in the same transaction, and one bump of
+    the catalog version.
+
+    - param store: store to change, its is_active is updated too.
+    - param active: True to reopen, False to close.
+    - param archive_products: True to also archive the store's products
+      when closing it.
+    - return: number of products archived.
+    """
+    archived = 0
+    with transaction.atomic():
+        Store.objects.filter(pk=store.pk).update(
+            is_active=active, updated_at=now())
+        store.is_active = active
+        if archive_products and not active:
+            archived = store.products.filter(is_active=True).update(
+                is_active=False, updated_at=now())
+        bump_version_on_commit("catalog")
+    return archived
@@ -0,0 +1,265 @@
+import csv
+import io
+import json
+import os
+import zipfile
+from itertools import islice
+from operator import itemgetter
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.db import transaction, IntegrityError
+from django.utils.text import slugify
+from ..forms import CatalogRowForm
+from ..models import Product, Size, Category
+from .cache import bump_version_on_commit
+
+"""
+IMPORT_BATCH_SIZE:
+    - Rows validated and inserted together. Each batch costs a few queries
+      (existing names, categories, products, sizes) however many rows it
+      has, and commits on its own.
+
+IMPORT_FORMATS:
+    - File formats accepted, chosen by file extension when not given.
+"""
+IMPORT_BATCH_SIZE = 500
+IMPORT_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+def import_format(file_name, format=None):
+    """
+    Returns the format of an import file, from format or its extension.
+
+    - raise ValueError: if the format isn't supported.
+    """
+    format = format or IMPORT_FORMATS.get(
+        os.path.splitext(file_name)[1].lower())
+    if format not in IMPORT_FORMATS.values():
+        raise ValueError("The file must be CSV (.csv) or NDJSON (.ndjson).")
+    return format
+
+
+def read_rows(file, format):
+    """
+    Reads an import file one row at a time.
+
+    - param file: binary file object.
+    - param format: "csv" or "ndjson".
+    - return: generator of row dicts, or None for a line that isn't a JSON
+      object.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None
+
+
+class ImageSource:
+    """
+    Images named by import rows, read from a zip file or a directory.
+    """
+    def __init__(self, source=None):
+        """
+        - param source: path of a directory, or a zip file path or file
+          object. None when there are no images.
+        """
+        self.directory = None
+        self.zip = None
+        if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+            self.directory = os.path.realpath(source)
+        elif source is not None:
+            self.zip = zipfile.ZipFile(source)
+            self.zip_names = set(self.zip.namelist())
+
+    def read(self, name):
+        """
+        Returns the bytes of the named image, or None if it isn't there.
+        """
+        if self.directory:
+            path = os.path.realpath(os.path.join(self.directory, name))
+            if (os.path.commonpath([self.directory, path]) == self.directory
+                    and os.path.isfile(path)):
+                with open(path, "rb") as image:
+                    return image.read()
+        elif self.zip and name in self.zip_names:
+            return self.zip.read(name)
+        return None
+
+
+def valid_image(data):
+    """
+    Returns True if data is an image Pillow can read.
+    """
+    try:
+        Image.open(io.BytesIO(data)).verify()
+    except Exception:
+        return False
+    return True
+
+
+class CatalogImport:
+    """
+    Imports products and their sizes into a store in batches.
+
+    Each batch is validated with CatalogRowForm, checked against the
+    store's existing product names, has its categories resolved in one
+    query and is inserted with bulk_create. Rows that fail are reported
+    with their row number and skipped; the rest are imported.
+    """
+    def __init__(self, store, images=None, batch_size=IMPORT_BATCH_SIZE):
+        self.store = store
+        self.images = images or ImageSource()
+        self.batch_size = batch_size
+        self.categories = {}
+        self.names = set()
+        self.created = 0
+        self.errors = []
+        self.image_field = Product._meta.get_field("image")
+
+    def run(self, rows):
+        """
+        Imports rows and returns the report.
+
+        - param rows: iterable of row dicts, e.g. from read_rows().
+        - return: dict with the number of products created and a list of
+          row errors.
+        """
+        rows = enumerate(rows, start=1)
+        while batch := list(islice(rows, self.batch_size)):
+            self.import_batch(batch)
+        return self.report()
+
+    def report(self):
+        """
+        Returns the number of products created and the row errors so far.
+        """
+        return {"created": self.created,
+                "errors": sorted(self.errors, key=itemgetter("row"))}
+
+    def error(self, number, errors):
+        """
+        Records the errors of a row, by field name.
+        """
+        self.errors.append({"row": number, "errors": errors})
+
+    def import_batch(self, batch):
+        """
+        Validates and inserts one batch of (row number, row) pairs.
+        """
+        valid = []
+        for number, row in batch:
+            if row is None:
+                self.error(number, {"__all__": ["Row is not a JSON object."]})
+                continue
+            form = CatalogRowForm(row)
+            if not form.is_valid():
+                self.error(number, form.errors.get_json_data())
+                continue
+            valid.append((number, form.cleaned_data))
+
+        # Product names are unique per store, in the file and the database
+        existing = set(Product.objects.filter(
+            store=self.store, name__in=[data["name"] for _, data in valid]
+        ).values_list("name", flat=True))
+        rows = []
+        for number, data in valid:
+            if data["name"] in existing or data["name"] in self.names:
+                self.error(number, {"name": [
+                    "A product with this name already exists in the store."]})
+                continue
+            image = self.images.read(data["image"])
+            if image is None or not valid_image(image):
+                self.error(number, {"image": [
+                    "Image not found in the uploaded images, or not an "
+                    "image."]})
+                continue
+            self.names.add(data["name"])
+            rows.append((number, data, image))
+        if rows:
+            self.insert(rows)
+
+    def resolve_categories(self, names):
+        """
+        Loads the named categories in one query, creating missing ones,
+        or reusing the category whose slug a new name would take.
+        """
+        missing = {name for name in names if name not in self.categories}
+        if not missing:
+            return
+        found = {category.name: category for category in
+                 Category.objects.filter(name__in=missing)}
+        new = [Category(name=name, slug=slugify(name))
+               for name in missing - set(found)]
+        if new:
+            Category.objects.bulk_create(new, ignore_conflicts=True)
+            # A name whose slug is taken, e.g. "Black White" by "Black &
+            # White", goes in the category with that slug
+            by_slug = {category.slug: category for category in
+                       Category.objects.filter(
+                           slug__in=[category.slug for category in new])}
+            found.update({category.name: by_slug[category.slug]
+                          for category in new if category.slug in by_slug})
+            # bulk_create sends no signals, refresh the category registry
+            bump_version_on_commit("categories")
+        self.categories.update(found)
+
+    def insert(self, rows):
+        """
+        Saves the rows' images and bulk creates their products and sizes.
+        """
+        saved = []
+        try:
+            with transaction.atomic():
+                self.resolve_categories(
+                    {data["category"] for _, data, _ in rows
+                     if data["category"]})
+                products = []
+                for number, data, image in rows:
+                    name = self.image_field.storage.save(
+                        self.image_field.generate_filename(
+                            None, os.path.basename(data["image"])),
+                        ContentFile(image))
+                    saved.append(name)
+                    products.append(Product(
+                        store=self.store, name=data["name"],
+                        description=data["description"], image=name,
+                        category=self.categories.get(data["category"])))
+                Product.objects.bulk_create(products)
+
+                # MySQL doesn't return the new IDs, look them up by name
+                if products[0].pk is None:
+                    ids = dict(Product.objects.filter(
+                        store=self.store,
+                        name__in=[product.name for product in products]
+                    ).values_list("name", "id"))
+                    for product in products:
+                        product.pk = ids[product.name]
+
+                Size.objects.bulk_create([
+                    Size(product=product,
+                         small_price=data["small_price"],
+                         medium_price=data["medium_price"],
+                         large_price=data["large_price"])
+                    for product, (_, data, _) in zip(products, rows)])
+                # Nor here, refresh the listings, e.g. the facet and
+                # suggestion indexes
+                bump_version_on_commit("catalog")
+        except IntegrityError as e:
+            # Categories created in the batch were rolled back too
+            self.categories.clear()
+            for name in saved:
+                self.image_field.storage.delete(name)
+            for number, data, image in rows:
+                self.names.discard(data["name"])
+                self.error(number, {"__all__": [
+                    f"Batch could not be saved: {e}"]})
+            return
+        self.created += len(rows)
@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from celuvia_images.routers import PRIMARY_DB
+from ..models import Category
+from .cache import get_version
+
+"""
+_registry:
+    - Process-local copy of the category list as (version, categories,
+      categories by slug). Replaced as a whole so threads never see a
+      half-updated registry.
+"""
+_registry = (None, [], {})
+
+
+def _load():
+    """
+    Returns the registry for the current version, loading it from the
+    shared cache or, on a miss, from the primary database.
+    """
+    global _registry
+    version = get_version("categories")
+    if _registry[0] != version:
+        key = f"categories:{version}"
+        categories = cache.get(key)
+        if categories is None:
+            # Read the primary, the replica may not have the change yet
+            categories = list(
+                Category.objects.using(PRIMARY_DB).order_by("name"))
+            cache.set(key, categories, None)
+        _registry = (version, categories,
+                     {category.slug: category for category in categories})
+    return _registry
+
+
+def get_categories():
+    """
+    Returns all categories ordered by name, without a database query once
+    loaded.
+    """
+    return _load()[1]
+
+
+def get_category_by_slug(slug):
+    """
+    Returns the category with the given slug, or None if there isn't one.
+    """
+    return _load()[2].get(slug)
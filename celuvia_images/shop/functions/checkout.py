@@ -0,0 +1,125 @@
+from decimal import Decimal
+from django.db import transaction
+from celuvia_images.routers import PRIMARY_DB
+from ..models import Product, Address, Order, OrderItem, PendingCheckout
+
+"""
+SIZE_PRICES:
+    - Price field of the Size model for each size code in the cart.
+"""
+SIZE_PRICES = {"S": "small_price", "M": "medium_price", "L": "large_price"}
+
+
+async def price_cart(cart):
+    """
+    Prices a cart from the database rather than the prices saved in the
+    session, with one query for every product and its sizes. Products
+    archived, deleted, in a closed store or no longer sold in the size
+    chosen can't be checked out.
+
+    - param cart: the cart from the session.
+    - return: (cart with current prices, Stripe line items).
+    - raise ValueError: naming the cart's unavailable products.
+    """
+    # Read the primary, the replica may not have a price change yet
+    products = await Product.objects.using(PRIMARY_DB).select_related(
+        "sizes", "store").ain_bulk(
+        {entry["product_id"] for entry in cart.values()})
+
+    priced, line_items, unavailable = {}, [], []
+    for key, entry in cart.items():
+        product = products.get(entry["product_id"])
+        price = None
+        if product is not None and product.is_active and \
+                product.store.is_active and hasattr(product, "sizes") and \
+                entry["size"] in SIZE_PRICES:
+            price = getattr(product.sizes, SIZE_PRICES[entry["size"]])
+        if price is None:
+            unavailable.append(product.name if product else "a deleted item")
+            continue
+
+        priced[key] = {**entry, "price": str(price)}
+        line_items.append({
+            "price_data": {
+                "currency": "gbp",
+                "product_data": {"name": (f"{product.name} ({entry['size']}, "
+                                          f"{entry['frame_colour']})")},
+                "unit_amount": int(price * 100),
+            },
+            "quantity": entry["quantity"],
+        })
+
+    if unavailable:
+        raise ValueError("These items are no longer available, please remove "
+                         f"them from your cart: {', '.join(unavailable)}.")
+    return priced, line_items
+
+
+def place_order(checkout_id):
+    """
+    Creates the order for a paid checkout, claiming its PendingCheckout by
+    deleting it in the same transaction. A redelivered or concurrent event
+    for the same checkout deletes nothing and places no second order, and
+    an error rolls the claim back so Stripe's retry can place it.
+
+    - param checkout_id: ID of the PendingCheckout, from the Stripe
+      session's metadata.
+    - return: (order, IDs of the products bought), or None if the
+      checkout is unknown or already placed.
+    """
+    pending = PendingCheckout.objects.select_related("user").filter(
+        pk=checkout_id).first()
+    if pending is None:
+        return None
+    with transaction.atomic():
+        claimed, _ = PendingCheckout.objects.filter(pk=pending.pk).delete()
+        if not claimed:
+            return None
+        user = pending.user
+        shipping_data = pending.shipping
+        billing_data = pending.billing
+
+        # Create or reuse unique address
+        shipping_address, _ = Address.objects.update_or_create(
+            user=user,
+            is_shipping=True,
+            defaults={**shipping_data, "is_default": True},
+        )
+        if shipping_data == billing_data:
+            billing_address = shipping_address
+        else:
+            billing_address, _ = Address.objects.update_or_create(
+                user=user,
+                is_billing=True,
+                defaults={**billing_data, "is_default": True},
+            )
+
+        # Calculates carts total
+        cart = pending.cart
+        total = sum(Decimal(
+            item["price"]) * int(item["quantity"]) for item in cart.values())
+
+        order = Order.objects.create(
+            user=user,
+            total=total,
+            shipping_address=shipping_address,
+            billing_address=billing_address,
+        )
+
+        purchased = []
+        products = Product.objects.in_bulk(
+            {entry["product_id"] for entry in cart.values()})
+        for entry in cart.values():
+            product = products.get(entry["product_id"])
+            if product is None:
+                continue
+            purchased.append(product.id)
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                size=entry.get("size", ""),
+                frame_colour=entry.get("frame_colour", ""),
+                quantity=int(entry.get("quantity", 1)),
+                price=Decimal(entry.get("price", "0.00")),
+            )
+    return order, purchased
@@ -0,0 +1,83 @@
+from functools import wraps
+from hashlib import md5
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+from celuvia_images.routers import read_from_replica
+
+
+def table_stamp(queryset):
+    """
+    Returns a cheap version stamp for the rows of queryset, in one query.
+
+    The newest updated_at catches added and changed rows, the row count
+    catches deleted ones.
+
+    - param queryset: queryset of a model with an updated_at field.
+    - return: tuple of (row count, newest updated_at or None).
+    """
+    stamp = queryset.aggregate(count=Count("pk"), latest=Max("updated_at"))
+    return stamp["count"], stamp["latest"]
+
+
+def conditional_get(stamp_func, per_user=False):
+    """
+    Decorator answering repeat GET and HEAD requests with 304 Not Modified
+    when the data behind the view hasn't changed, without running the view.
+
+    The ETag is a hash of the stamps returned by stamp_func. Public views
+    also send Last-Modified, the newest of the stamps' timestamps. Pages
+    showing the user (navbar, CSRF token, cart, messages) pass
+    per_user=True, which mixes those into the ETag and sends no
+    Last-Modified, as it would match across logins.
+
+    Async views get their stamps computed in a thread before
+    Django's condition() checks them, as the stamps query the database.
+
+    - param stamp_func: called with the view's arguments, returns a list of
+      table_stamp() tuples, or None to always run the view (e.g. for 404s).
+      Per-user views may return any stamps, as they get no Last-Modified.
+    - param per_user: True if the response differs between users.
+    """
+    def stamps(request, *args, **kwargs):
+        # Don't cost unsafe requests a query, they never get a 304
+        if request.method not in ("GET", "HEAD"):
+            return None
+        if not hasattr(request, "_stamps"):
+            with read_from_replica():
+                request._stamps = stamp_func(request, *args, **kwargs)
+        return request._stamps
+
+    def etag(request, *args, **kwargs):
+        if not hasattr(request, "_etag"):
+            parts = stamps(request, *args, **kwargs)
+            if parts is not None and per_user:
+                parts = [*parts, request.user.pk,
+                         request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+                         request.COOKIES.get(CookieStorage.cookie_name),
+                         request.session.get("cart")]
+            request._etag = (None if parts is None
+                             else md5(repr(parts).encode()).hexdigest())
+        return request._etag
+
+    def last_modified(request, *args, **kwargs):
+        parts = stamps(request, *args, **kwargs)
+        if per_user or not parts:
+            return None
+        return max((latest for count, latest in parts if latest),
+                   default=None)
+
+    def decorator(view):
+        conditional = condition(etag, last_modified)(view)
+        if not iscoroutinefunction(view):
+            return conditional
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            await sync_to_async(etag)(request, *args, **kwargs)
+            return await conditional(request, *args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,33 @@
+from functools import wraps
+from django.db import connections
+
+
+def recycle_connections():
+    """
+    Close database connections that have outlived CONN_MAX_AGE or errored,
+    and make the rest health check again before their next query.
+
+    Django only does this at the start and end of a request, so long
+    running work (tweets, emails, webhook processing) calls it around slow
+    external calls instead. Connections inside a transaction are left
+    alone so an open atomic block is never broken. So are connections with
+    CONN_MAX_AGE 0, which are always obsolete: Django closes them at the
+    end of the request, rather than reconnecting mid-request here.
+    """
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block and conn.settings_dict["CONN_MAX_AGE"]:
+            conn.close_if_unusable_or_obsolete()
+
+
+def recycles_connections(func):
+    """
+    Decorator calling recycle_connections() before and after func.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        recycle_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            recycle_connections()
+    return wrapper
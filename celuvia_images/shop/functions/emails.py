@@ -0,0 +1,48 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.core.mail import EmailMessage
+from django.template.loader import render_to_string
+from .connections import recycles_connections
+
+
+@recycles_connections
+def send_order_emails(order, customer_email):
+    """
+    Send the order confirmation to the customer and a new order email to
+    the owner of each store in the order.
+
+    Sending mail can be slow, so database connections are recycled before
+    and after.
+    """
+    # Send customer email confirmation
+    subject = f"Celuvia Images - Order Confirmation #{order.id}"
+    body = render_to_string(
+        "shop/order_confirmation_email.txt", {"order": order})
+
+    email = EmailMessage(subject, body, None, [customer_email])
+    email.send(fail_silently=True)
+
+    # Send store owner notification email
+    store_items = defaultdict(list)
+    for item in order.items.select_related("product__store"):
+        store_items[item.product.store].append(item)
+
+    for store, items in store_items.items():
+
+        # Get owner total per store
+        store_total = sum(Decimal(item.get_subtotal()) for item in items)
+
+        vendor_subject = f"New Order #{order.id} - {store.name}"
+        vendor_context = {
+            "store": store,
+            "order": order,
+            "items": items,
+            "store_total": store_total
+        }
+        vendor_body = render_to_string(
+            "shop/vendor_order_confirmation_email.txt", vendor_context
+        )
+
+        vendor_email = EmailMessage(
+            vendor_subject, vendor_body, None, [store.email],)
+        vendor_email.send(fail_silently=True)
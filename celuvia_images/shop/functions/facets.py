@@ -0,0 +1,217 @@
+from decimal import Decimal
+from django.db.models import F
+from celuvia_images.routers import PRIMARY_DB
+from ..models import Product
+from .cache import LocalIndex
+
+"""
+PRICE_BANDS:
+    - Price facet of the home page as (key, label, lowest, below), by the
+      product's "from" price, its small size.
+
+RATING_BUCKETS:
+    - Rating facet of the home page as (key, label, lowest average).
+
+_index:
+    - Process-local facet index, rebuilt when the facets or catalog
+      version changes.
+"""
+PRICE_BANDS = [
+    ("under-25", "Under £25", None, Decimal("25")),
+    ("25-50", "£25 to £50", Decimal("25"), Decimal("50")),
+    ("50-100", "£50 to £100", Decimal("50"), Decimal("100")),
+    ("100-plus", "£100 and over", Decimal("100"), None),
+]
+RATING_BUCKETS = [
+    ("4", "4 stars & up", 4),
+    ("3", "3 stars & up", 3),
+    ("2", "2 stars & up", 2),
+    ("1", "1 star & up", 1),
+]
+
+
+def listed_products():
+    """
+    Returns the products the home page lists: active, priced and in an
+    open store.
+    """
+    return Product.objects.filter(store__is_active=True, is_active=True,
+                                  sizes__small_price__gt=0)
+
+
+def selected_facets(params, category=None):
+    """
+    Returns the facet values chosen in a request's query parameters,
+    None for missing or unknown ones.
+
+    - param params: the request's GET parameters.
+    - param category: the category browsed, if any.
+    - return: dict of facet name to the selected value.
+    """
+    price = params.get("price")
+    rating = params.get("rating")
+    return {
+        "category": category.id if category else None,
+        "price": price if price in {band[0] for band in PRICE_BANDS}
+        else None,
+        "rating": rating if rating in {bucket[0] for bucket in RATING_BUCKETS}
+        else None,
+    }
+
+
+def filter_facets(products, price=None, rating=None):
+    """
+    Filters products by a price band and rating bucket, without
+    aggregating reviews.
+
+    - param products: queryset of products.
+    - param price: key of PRICE_BANDS, ignored if unknown.
+    - param rating: key of RATING_BUCKETS, ignored if unknown.
+    """
+    for key, _, lowest, below in PRICE_BANDS:
+        if key == price:
+            if lowest is not None:
+                products = products.filter(sizes__small_price__gte=lowest)
+            if below is not None:
+                products = products.filter(sizes__small_price__lt=below)
+    for key, _, lowest in RATING_BUCKETS:
+        if key == rating:
+            products = products.filter(
+                rating_stats__review_count__gt=0,
+                rating_stats__rating_sum__gte=F(
+                    "rating_stats__review_count") * lowest)
+    return products
+
+
+def bitmap(positions, size):
+    """
+    Returns an int with the bits at positions set, built in one pass
+    rather than one big int operation per bit.
+    """
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+class FacetIndex:
+    """
+    Bitmaps of the listed products for each category, price band and
+    rating bucket. A product's bit is its position in ids, so counting
+    products matching several facets is an AND of bitmaps and a popcount,
+    whatever the number of products.
+    """
+
+    def __init__(self, rows):
+        """
+        - param rows: (id, category_id, small price, rating sum, review
+          count) of each listed product.
+        """
+        self.ids = []
+        positions = {"category": {}, "price": {}, "rating": {}}
+        for position, (pk, category_id, price, ratings, reviews) in \
+                enumerate(rows):
+            self.ids.append(pk)
+            positions["category"].setdefault(category_id, []).append(
+                position)
+            for key, _, lowest, below in PRICE_BANDS:
+                if (lowest is None or price >= lowest) and \
+                        (below is None or price < below):
+                    positions["price"].setdefault(key, []).append(position)
+            for key, _, lowest in RATING_BUCKETS:
+                if reviews and ratings >= lowest * reviews:
+                    positions["rating"].setdefault(key, []).append(position)
+
+        self.position = {pk: position for position, pk in
+                         enumerate(self.ids)}
+        self.all = (1 << len(self.ids)) - 1
+        self.bitmaps = {
+            facet: {value: bitmap(found, len(self.ids))
+                    for value, found in values.items()}
+            for facet, values in positions.items()
+        }
+
+    def matching(self, ids):
+        """
+        Returns the bitmap of the given product IDs, e.g. a search's
+        results. IDs not in the index are ignored.
+        """
+        return bitmap((self.position[pk] for pk in ids
+                       if pk in self.position), len(self.ids))
+
+    def counts(self, selected, within=None):
+        """
+        Counts the products for each value of each facet.
+
+        Each facet is counted with the other facets' selections applied but
+        not its own, so the counts show what choosing another value of it
+        would give.
+
+        - param selected: dict of facet name to the selected value, or
+          None for no selection.
+        - param within: optional bitmap to count within, e.g. a search's.
+        - return: dict of facet name to dict of value to count.
+        """
+        base = self.all if within is None else within
+        counts = {}
+        for facet, values in self.bitmaps.items():
+            scope = base
+            for other, value in selected.items():
+                if other != facet and value is not None:
+                    scope &= self.bitmaps[other].get(value, 0)
+            counts[facet] = {value: (scope & bits).bit_count()
+                             for value, bits in values.items()}
+        return counts
+
+
+def facet_options(counts, selected, categories):
+    """
+    Returns the values of each facet to show, with their counts and
+    whether they are selected. Values with no products are left out
+    unless selected.
+
+    - param counts: result of FacetIndex.counts().
+    - param selected: dict of facet name to the selected value.
+    - param categories: all categories, in the order to show them.
+    - return: dict of facet name to list of dicts with "value", "label",
+      "count" and "selected".
+    """
+    choices = {
+        "category": [(category, category.name) for category in categories],
+        "price": [(key, label) for key, label, _, _ in PRICE_BANDS],
+        "rating": [(key, label) for key, label, _ in RATING_BUCKETS],
+    }
+    options = {}
+    for facet, values in choices.items():
+        options[facet] = []
+        for value, label in values:
+            key = value.id if facet == "category" else value
+            count = counts[facet].get(key, 0)
+            chosen = selected[facet] == key
+            if count or chosen:
+                options[facet].append({"value": value, "label": label,
+                                       "count": count, "selected": chosen})
+    return options
+
+
+def build_facet_index():
+    """
+    Returns a new facet index of the listed products.
+    """
+    # Read the primary, the replica may not have the change yet
+    rows = listed_products().using(PRIMARY_DB).order_by("pk").values_list(
+        "pk", "category_id", "sizes__small_price",
+        "rating_stats__rating_sum", "rating_stats__review_count")
+    return FacetIndex(rows.iterator())
+
+
+_index = LocalIndex(("facets", "catalog"), build_facet_index)
+
+
+def get_facet_index():
+    """
+    Returns the facet index for the current catalog, rebuilt from the
+    primary database when a product, its prices, its reviews or its store
+    changed since it was built.
+    """
+    return _index.get()
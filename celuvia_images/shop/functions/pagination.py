@@ -0,0 +1,108 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+"""
+CHUNK_ITEMS:
+    - Number of items encoded into each chunk of a streamed JSON list.
+"""
+CHUNK_ITEMS = 200
+
+
+def page_limit(request, maximum, default=None):
+    """
+    Returns the page size from the limit query parameter.
+
+    - param request: HTTP request object.
+    - param maximum: largest page size allowed.
+    - param default: page size when no limit is given, None for no paging.
+    - return: page size, or default.
+    - raise ValueError: if limit isn't a whole number from 1 to maximum.
+    """
+    limit = request.GET.get("limit")
+    if limit is None:
+        return default
+    if not limit.isdigit() or not 1 <= int(limit) <= maximum:
+        raise ValueError(f"limit must be a number from 1 to {maximum}.")
+    return int(limit)
+
+
+def encode_cursor(values):
+    """
+    Returns an opaque cursor for the ordering values of the last row on a
+    page.
+    """
+    data = json.dumps(values, cls=DjangoJSONEncoder).encode()
+    return urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(request, size, types=None):
+    """
+    Returns the ordering values in the cursor query parameter.
+
+    - param request: HTTP request object.
+    - param size: number of ordering values the cursor should hold.
+    - param types: optional type of each value, e.g. (str, int), checked so
+      a tampered cursor can't reach the database as a bad lookup.
+    - return: list of values, or None if there is no cursor.
+    - raise ValueError: if the cursor is malformed.
+    """
+    cursor = request.GET.get("cursor")
+    if cursor is None:
+        return None
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+    except (DecodeError, UnicodeError, ValueError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor.")
+    if types is not None and not all(
+            isinstance(value, kind) and not isinstance(value, bool)
+            for value, kind in zip(values, types)):
+        raise ValueError("Invalid cursor.")
+    return values
+
+
+def after(ordering, values):
+    """
+    Returns a filter for the rows after values in an ordering, e.g.
+    ordering ("name", "-id") gives name > n OR (name = n AND id < i).
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        lookup = "lt" if field.startswith("-") else "gt"
+        step = Q(**{f"{field.lstrip('-')}__{lookup}": values[i]})
+        for previous, value in zip(ordering[:i], values):
+            step &= Q(**{previous.lstrip("-"): value})
+        condition |= step
+    return condition
+
+
+def next_link(request, values):
+    """
+    Returns a Link header value pointing at the page after values.
+    """
+    query = request.GET.copy()
+    query["cursor"] = encode_cursor(values)
+    url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+    return f'<{url}>; rel="next"'
+
+
+def stream_json_list(items):
+    """
+    Encodes an iterable as a JSON list a chunk at a time, so large
+    responses are never held in memory as one string.
+    """
+    encoder = DjangoJSONEncoder()
+    chunk = ["["]
+    for i, item in enumerate(items):
+        if i:
+            chunk.append(",")
+        chunk.append(encoder.encode(item))
+        if len(chunk) >= CHUNK_ITEMS * 2:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("]")
+    yield "".join(chunk)
@@ -0,0 +1,166 @@
+from threading import Lock
+from time import monotonic
+import httpx
+import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+
+"""
+UNAVAILABLE_ERRORS:
+    - Stripe errors meaning Stripe couldn't be reached or is failing. They
+      count towards opening the circuit breaker, errors in the request
+      itself (e.g. a bad API key) don't.
+
+_client:
+    - Process-wide Stripe client as (settings it was built with,
+      StripeClient). Replaced as a whole when the settings change.
+"""
+UNAVAILABLE_ERRORS = (stripe.APIConnectionError, stripe.APIError,
+                      stripe.RateLimitError)
+_client = (None, None)
+
+
+class PaymentUnavailable(Exception):
+    """
+    Raised when Stripe can't be reached or keeps failing, or when the
+    circuit breaker is open and Stripe isn't being called.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calling Stripe for a while once it has failed several times in a
+    row, so requests fail fast instead of each waiting out the timeouts
+    while Stripe is down.
+
+    After STRIPE_BREAKER_FAILURES failures in a row the breaker opens for
+    STRIPE_BREAKER_SECONDS. Then one trial call is let through, the others
+    still failing fast: if it succeeds the breaker closes, if it fails it
+    stays open for another period. The state is per process.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        """
+        Returns True if a call may go to Stripe.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if monotonic() - self.opened_at < settings.STRIPE_BREAKER_SECONDS:
+                return False
+            # Trial call, the others wait for another period
+            self.opened_at = monotonic()
+            return True
+
+    def record_success(self):
+        """
+        Closes the breaker after Stripe answered.
+        """
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """
+        Counts a failed call, opening the breaker after too many in a row.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures >= settings.STRIPE_BREAKER_FAILURES:
+                self.opened_at = monotonic()
+
+
+breaker = CircuitBreaker()
+
+
+def stripe_client():
+    """
+    Returns the process's Stripe client, built once with the timeouts and
+    retries in settings, so the API key is never set globally and
+    connections to Stripe are kept alive between requests.
+
+    - raise stripe.AuthenticationError: if no API key is set.
+    """
+    global _client
+    config = (settings.STRIPE_SECRET_KEY, settings.STRIPE_API_BASE,
+              settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT,
+              settings.STRIPE_MAX_RETRIES)
+    if _client[0] != config:
+        api_key, api_base, connect, read, retries = config
+        _client = (config, stripe.StripeClient(
+            api_key, base_addresses={"api": api_base},
+            max_network_retries=retries,
+            http_client=stripe.RequestsClient(
+                timeout=(connect, read),
+                async_fallback_client=stripe.HTTPXClient(
+                    timeout=httpx.Timeout(read, connect=connect)))))
+    return _client[1]
+
+
+def idempotency_key(checkout_id):
+    """
+    Returns the Stripe idempotency key of a checkout, from the random ID
+    it was given when the buyer started it. Retries after a timeout, and
+    the same checkout started twice, get the session Stripe already
+    created instead of a new one, while buying the same cart again later
+    is a new checkout with a new key. Stripe keeps keys for 24 hours.
+
+    - param checkout_id: the checkout's random ID.
+    """
+    return f"checkout-{checkout_id}"
+
+
+async def start_checkout(request, checkout_id, **params):
+    """
+    Creates a Stripe checkout session for request, through the circuit
+    breaker. Timeouts and server errors are retried by the Stripe client,
+    with exponential backoff and jitter, under the same idempotency key.
+
+    The session's URL is cached under its idempotency key for
+    STRIPE_SESSION_CACHE_SECONDS, so the same checkout started again, e.g.
+    by a double-click, is sent to the same session without calling Stripe.
+
+    Under ASGI it is created with Stripe's async client (httpx), so no
+    thread waits on Stripe. The client's connections belong to the
+    server's event loop; under WSGI async views run in a new event loop
+    per request, where they can't be reused, so Stripe's sync client is
+    called in a thread instead.
+
+    - param request: HTTP request starting checkout.
+    - param checkout_id: the checkout's random ID, see idempotency_key().
+    - param params: arguments of the checkout session.
+    - return: URL of the checkout session's payment page.
+    - raise PaymentUnavailable: if Stripe is down or the breaker is open.
+    """
+    key = idempotency_key(checkout_id)
+    url = await cache.aget(key)
+    if url is not None:
+        return url
+
+    sessions = stripe_client().v1.checkout.sessions
+    if not breaker.allow():
+        raise PaymentUnavailable("Stripe is unavailable, not calling it.")
+
+    options = {"idempotency_key": key}
+    try:
+        if isinstance(request, ASGIRequest):
+            session = await sessions.create_async(params, options)
+        else:
+            session = await sync_to_async(sessions.create)(params, options)
+    except UNAVAILABLE_ERRORS as e:
+        breaker.record_failure()
+        raise PaymentUnavailable(str(e)) from e
+    except stripe.StripeError:
+        # Stripe answered, the request itself was refused
+        breaker.record_success()
+        raise
+    breaker.record_success()
+    await cache.aset(key, session.url, settings.STRIPE_SESSION_CACHE_SECONDS)
+    return session.url
@@ -0,0 +1,134 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Value
+from django.db.models.functions import Greatest, Round
+from django.utils.timezone import now
+from ..models import Product, Size, PriceChange
+from .cache import bump_version_on_commit
+
+"""
+SIZE_PRICES:
+    - Price fields of the Size model changed by a bulk price change.
+
+PRICE_MAX:
+    - Highest price the Size price fields can hold.
+"""
+SIZE_PRICES = ["small_price", "medium_price", "large_price"]
+PRICE_MAX = Decimal("999999.99")
+
+
+def new_price(field, mode, value):
+    """
+    Returns a database expression for the new value of a price field,
+    rounded to pence and never below zero. Empty prices stay empty.
+
+    - param field: name of the price field.
+    - param mode: "percent" or "amount".
+    - param value: percentage or amount to add, may be negative.
+    """
+    if mode == "percent":
+        price = F(field) * (1 + Decimal(value) / 100)
+    else:
+        price = F(field) + Decimal(value)
+    return Greatest(Round(price, 2), Value(Decimal("0.00")),
+                    output_field=Size._meta.get_field(field))
+
+
+def products_in_scope(store, category=None, products=None):
+    """
+    Returns the store's products a price change applies to.
+
+    - param store: store whose prices change.
+    - param category: optional category to limit the change to.
+    - param products: optional list of product IDs to limit it to.
+    """
+    scope = Product.objects.filter(store=store)
+    if category is not None:
+        scope = scope.filter(category=category)
+    if products is not None:
+        scope = scope.filter(pk__in=products)
+    return scope
+
+
+def sizes_in_scope(products):
+    """
+    Returns the Size rows of products, filtered with a subquery rather than
+    a join so the UPDATE is one statement on every database.
+    """
+    return Size.objects.filter(product__in=products.values("pk"))
+
+
+def preview_price_change(products, mode, value):
+    """
+    Computes what a price change would do, with one aggregate query and
+    without changing anything.
+
+    - param products: products in scope, from products_in_scope().
+    - param mode: "percent" or "amount".
+    - param value: percentage or amount to add.
+    - return: dict with the number of sizes rows and, per price field, a
+      dict with the current and new minimum, average and maximum.
+    """
+    aggregates = {"count": Count("pk")}
+    for field in SIZE_PRICES:
+        expression = new_price(field, mode, value)
+        aggregates.update({
+            f"{field}_min": Min(field), f"{field}_avg": Avg(field),
+            f"{field}_max": Max(field),
+            f"{field}_new_min": Min(expression),
+            f"{field}_new_avg": Avg(expression),
+            f"{field}_new_max": Max(expression),
+        })
+    totals = sizes_in_scope(products).aggregate(**aggregates)
+
+    preview = {"count": totals["count"], "prices": {}}
+    for field in SIZE_PRICES:
+        preview["prices"][field] = {
+            stat: round(totals[f"{field}_{stat}"], 2)
+            if totals[f"{field}_{stat}"] is not None else None
+            for stat in ["min", "avg", "max", "new_min", "new_avg", "new_max"]
+        }
+    return preview
+
+
+def price_change_fits(preview):
+    """
+    Returns True if every new price in a preview fits the price fields.
+    Databases either refuse or silently store prices that don't, so a
+    change is only applied when this holds.
+
+    - param preview: result of preview_price_change().
+    """
+    return all(prices["new_max"] is None or prices["new_max"] <= PRICE_MAX
+               for prices in preview["prices"].values())
+
+
+def apply_price_change(store, user, mode, value, category=None,
+                       products=None):
+    """
+    Changes the prices of every size in scope with one UPDATE, touches the
+    products' updated_at with another, and records a PriceChange.
+
+    update() sends no signals, so the cached product pages are invalidated
+    with a single bump of the catalog version once the change commits.
+
+    - param store: store whose prices change.
+    - param user: vendor making the change, for the audit log.
+    - param mode: "percent" or "amount".
+    - param value: percentage or amount to add, may be negative.
+    - param category: optional category to limit the change to.
+    - param products: optional list of product IDs to limit it to.
+    - return: the PriceChange recorded.
+    """
+    scope = products_in_scope(store, category, products)
+    with transaction.atomic():
+        updated = sizes_in_scope(scope).update(**{
+            field: new_price(field, mode, value) for field in SIZE_PRICES})
+        scope.update(updated_at=now())
+        change = PriceChange.objects.create(
+            store=store, user=user, mode=mode, value=value,
+            category=category,
+            product_ids=sorted(products) if products is not None else None,
+            sizes_updated=updated)
+        bump_version_on_commit("catalog")
+    return change
@@ -0,0 +1,60 @@
+from ..models import OrderItem, Purchase
+
+"""
+BACKFILL_BATCH_SIZE:
+    - Purchase rows inserted per query when backfilling from old orders.
+"""
+BACKFILL_BATCH_SIZE = 1000
+
+
+def record_purchases(user, product_ids):
+    """
+    Adds the products to the user's purchases with one INSERT, ignoring
+    products they had already bought.
+
+    - param user: User who bought the products.
+    - param product_ids: IDs of the products bought, may repeat.
+    """
+    Purchase.objects.bulk_create(
+        [Purchase(user=user, product_id=product_id)
+         for product_id in set(product_ids)],
+        ignore_conflicts=True)
+
+
+def has_purchased(user, product_id):
+    """
+    Returns True if the user has bought the product, with one lookup on
+    the unique index of Purchase.
+
+    - param user: User to check, may be anonymous.
+    - param product_id: ID of the product.
+    """
+    if not user.is_authenticated:
+        return False
+    return Purchase.objects.filter(
+        user=user, product_id=product_id).exists()
+
+
+def backfill_purchases(batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Records a purchase for every user and product in existing orders,
+    streaming the distinct pairs and inserting them in batches. Pairs
+    already recorded are skipped, so it is safe to run more than once.
+
+    - param batch_size: rows inserted per query.
+    - return: number of distinct user and product pairs found.
+    """
+    pairs = (OrderItem.objects.values_list("order__user_id", "product_id")
+             .order_by().distinct().iterator(chunk_size=batch_size))
+    count = 0
+    batch = []
+    for user_id, product_id in pairs:
+        batch.append(Purchase(user_id=user_id, product_id=product_id))
+        if len(batch) == batch_size:
+            count += len(batch)
+            Purchase.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        count += len(batch)
+        Purchase.objects.bulk_create(batch, ignore_conflicts=True)
+    return count
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+from django.db.models import F, Max, Q, Sum
+from django.utils.timezone import now
+from ..models import (Order, OrderItem, Product, ProductRanking,
+                      ProductRatingStats)
+
+"""
+BAYESIAN_WEIGHT:
+    - Number of average reviews every product's rating starts with, so a
+      product needs several good reviews to outrank well reviewed ones.
+
+TRENDING_HALF_LIFE:
+    - How long until a sale counts half as much towards trending.
+
+TRENDING_EPOCH:
+    - Fixed time trending weights are measured from. A sale is weighted by
+      2 ** (time since the epoch / half-life), so newer sales weigh more
+      and scores never need decaying: every score would shrink by the
+      same factor, leaving the order unchanged.
+
+RANKING_BATCH_SIZE:
+    - Products scored per batch when refreshing rankings.
+
+RANKING_SORTS:
+    - Sort modes of the home page, with their label and ordering.
+"""
+BAYESIAN_WEIGHT = 5
+TRENDING_HALF_LIFE = timedelta(days=7)
+TRENDING_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+RANKING_BATCH_SIZE = 1000
+RANKING_SORTS = {
+    "newest": ("Newest", ["-created_at", "-id"]),
+    "rated": ("Best rated", [F("ranking__bayesian_rating").desc(
+        nulls_last=True), "-created_at", "-id"]),
+    "bestselling": ("Best selling", [F("ranking__units_sold").desc(
+        nulls_last=True), "-created_at", "-id"]),
+    "trending": ("Trending", [F("ranking__trending_score").desc(
+        nulls_last=True), "-created_at", "-id"]),
+}
+
+
+def sort_products(products, sort):
+    """
+    Orders products by one of the RANKING_SORTS, newest first for an
+    unknown sort.
+
+    - param products: queryset of products.
+    - param sort: key of RANKING_SORTS.
+    - return: tuple of (ordered queryset, sort used).
+    """
+    if sort not in RANKING_SORTS:
+        sort = "newest"
+    return products.order_by(*RANKING_SORTS[sort][1]), sort
+
+
+def trending_weight(ordered_at):
+    """
+    Returns how much a sale at ordered_at counts towards trending.
+    """
+    return 2 ** ((ordered_at - TRENDING_EPOCH) / TRENDING_HALF_LIFE)
+
+
+def mean_rating():
+    """
+    Returns the average rating of all reviews, from the rating stats, or 0
+    if there are none.
+    """
+    totals = ProductRatingStats.objects.aggregate(
+        reviews=Sum("review_count"), ratings=Sum("rating_sum"))
+    if not totals["reviews"]:
+        return 0
+    return totals["ratings"] / totals["reviews"]
+
+
+def stale_products(since):
+    """
+    Returns the products whose rankings may have changed since a refresh:
+    ones with no ranking yet, ones ordered since, and ones whose rating
+    stats changed since.
+
+    - param since: when the last refresh started, None for every product.
+    """
+    if since is None:
+        return Product.objects.all()
+    return Product.objects.filter(
+        Q(ranking__isnull=True)
+        | Q(pk__in=OrderItem.objects.filter(order__in=Order.objects.filter(
+            created_at__gte=since).values("pk")).values("product_id"))
+        | Q(rating_stats__updated_at__gte=since))
+
+
+def score_products(product_ids, mean, started):
+    """
+    Computes the rankings of a batch of products, from their rating stats
+    and order items (2 queries).
+
+    - param product_ids: IDs of the products to score.
+    - param mean: average rating of all reviews.
+    - param started: when the refresh started, saved as updated_at.
+    - return: list of unsaved ProductRanking.
+    """
+    stats = ProductRatingStats.objects.in_bulk(product_ids)
+    units = dict.fromkeys(product_ids, 0)
+    trending = dict.fromkeys(product_ids, 0.0)
+    for product_id, quantity, ordered_at in OrderItem.objects.filter(
+            product_id__in=product_ids).values_list(
+            "product_id", "quantity", "order__created_at").iterator():
+        units[product_id] += quantity
+        trending[product_id] += quantity * trending_weight(ordered_at)
+
+    rankings = []
+    for product_id in product_ids:
+        row = stats.get(product_id)
+        reviews, ratings = (row.review_count, row.rating_sum) if row \
+            else (0, 0)
+        rankings.append(ProductRanking(
+            product_id=product_id,
+            bayesian_rating=(BAYESIAN_WEIGHT * mean + ratings)
+            / (BAYESIAN_WEIGHT + reviews),
+            units_sold=units[product_id],
+            trending_score=trending[product_id],
+            updated_at=started))
+    return rankings
+
+
+def refresh_rankings(full=False, batch_size=RANKING_BATCH_SIZE):
+    """
+    Rescores the products whose rankings may have changed since the last
+    refresh, or every product with full=True, upserting their rows in
+    batches.
+
+    Best rated uses the average of all reviews at the time each product
+    was scored, so a full refresh now and then keeps them comparable.
+
+    - param full: True to rescore every product.
+    - param batch_size: products scored and written per batch.
+    - return: number of products rescored.
+    """
+    started = now()
+    since = None if full else ProductRanking.objects.aggregate(
+        last=Max("updated_at"))["last"]
+    mean = mean_rating()
+    product_ids = list(stale_products(since).order_by("pk")
+                       .values_list("pk", flat=True))
+
+    for start in range(0, len(product_ids), batch_size):
+        ProductRanking.objects.bulk_create(
+            score_products(product_ids[start:start + batch_size], mean,
+                           started),
+            update_conflicts=True, unique_fields=["product"],
+            update_fields=["bayesian_rating", "units_sold",
+                           "trending_score", "updated_at"])
+    return len(product_ids)
@@ -0,0 +1,137 @@
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+from ..models import ProductRatingStats, Review
+
+"""
+STATS_FIELDS:
+    - Counters of ProductRatingStats, all kept up to date from reviews.
+
+RECONCILE_BATCH_SIZE:
+    - Stats rows written per query by the reconciliation.
+"""
+STATS_FIELDS = ["review_count", "rating_sum", "verified_count",
+                "verified_sum", "stars_1", "stars_2", "stars_3", "stars_4",
+                "stars_5"]
+RECONCILE_BATCH_SIZE = 1000
+
+
+def review_counters(rating, verified):
+    """
+    Returns what one review adds to each counter of its product's stats.
+
+    - param rating: the review's rating, 1 to 5.
+    - param verified: True if the review is verified.
+    """
+    return {
+        "review_count": 1,
+        "rating_sum": rating,
+        "verified_count": int(verified),
+        "verified_sum": rating if verified else 0,
+        f"stars_{rating}": 1,
+    }
+
+
+def apply_review_change(product_id, old=None, new=None):
+    """
+    Updates a product's stats for one review being added, edited or
+    deleted, with one UPDATE of the counters that change. Concurrent
+    reviews can't lose each other's changes, as the counters are
+    incremented by the database.
+
+    If the product has no stats row yet it is built from its reviews, so
+    products reviewed before the stats existed catch up on their next
+    review.
+
+    - param product_id: ID of the reviewed product.
+    - param old: (rating, verified) of the review before the change, None
+      for a new review.
+    - param new: (rating, verified) after the change, None for a deleted
+      review.
+    """
+    delta = dict.fromkeys(STATS_FIELDS, 0)
+    for state, sign in [(old, -1), (new, 1)]:
+        if state is not None:
+            for field, value in review_counters(*state).items():
+                delta[field] += sign * value
+    changes = {field: F(field) + value
+               for field, value in delta.items() if value}
+    if not changes:
+        return
+
+    updated = ProductRatingStats.objects.filter(
+        product_id=product_id).update(**changes, updated_at=now())
+    # Deleted reviews leave a missing row alone, their product may be
+    # being deleted too
+    if not updated and new is not None:
+        refresh_rating_stats([product_id])
+
+
+def rating_totals(reviews):
+    """
+    Returns the stats counters of each product computed from its reviews,
+    grouped in one aggregate query.
+
+    - param reviews: queryset of reviews to count.
+    - return: dict of product ID to dict of counters.
+    """
+    verified = Q(verified=True)
+    counters = {
+        "review_count": Count("id"),
+        "rating_sum": Coalesce(Sum("rating"), 0),
+        "verified_count": Count("id", filter=verified),
+        "verified_sum": Coalesce(Sum("rating", filter=verified), 0),
+    }
+    for stars in range(1, 6):
+        counters[f"stars_{stars}"] = Count("id", filter=Q(rating=stars))
+    rows = reviews.values("product_id").annotate(**counters).order_by()
+    return {row.pop("product_id"): row for row in rows}
+
+
+def refresh_rating_stats(product_ids):
+    """
+    Rebuilds the stats of the products from their reviews.
+
+    - param product_ids: IDs of the products to rebuild.
+    """
+    totals = rating_totals(Review.objects.filter(product_id__in=product_ids))
+    for product_id in product_ids:
+        ProductRatingStats.objects.update_or_create(
+            product_id=product_id,
+            defaults=totals.get(product_id, dict.fromkeys(STATS_FIELDS, 0)))
+
+
+def reconcile_rating_stats(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Compares every product's stats with its reviews and fixes the ones
+    that drifted, e.g. after reviews were changed with update() or in the
+    admin. Reviews are counted with one grouped query, and only the rows
+    that differ are written, in batches.
+
+    - param batch_size: stats rows written per query.
+    - return: dict with the number of rows "created", "updated" and
+      "checked".
+    """
+    totals = rating_totals(Review.objects.all())
+    stats = ProductRatingStats.objects.in_bulk()
+    empty = dict.fromkeys(STATS_FIELDS, 0)
+
+    changed = []
+    for product_id, row in stats.items():
+        counters = totals.pop(product_id, empty)
+        if any(getattr(row, field) != value
+               for field, value in counters.items()):
+            for field, value in counters.items():
+                setattr(row, field, value)
+            row.updated_at = now()
+            changed.append(row)
+    ProductRatingStats.objects.bulk_update(
+        changed, STATS_FIELDS + ["updated_at"], batch_size=batch_size)
+
+    # Products with reviews but no stats row yet
+    ProductRatingStats.objects.bulk_create(
+        [ProductRatingStats(product_id=product_id, **counters)
+         for product_id, counters in totals.items()],
+        batch_size=batch_size, ignore_conflicts=True)
+    return {"created": len(totals), "updated": len(changed),
+            "checked": len(stats)}
@@ -0,0 +1,179 @@
+from collections import Counter, defaultdict
+from heapq import nlargest
+from itertools import groupby
+from operator import itemgetter
+from django.db.models import Max
+from django.utils.timezone import now
+from ..models import Order, OrderItem, Product, ProductRecommendations
+from .cache import bump_version_on_commit
+
+"""
+RECOMMENDATIONS_PER_PRODUCT:
+    - Products kept for each product, the most often bought with it.
+
+RECOMMENDATIONS_BATCH_SIZE:
+    - Order items read, and recommendation rows written, per query.
+
+INCREMENTAL_SHARE:
+    - Largest share of all order items an incremental refresh reads with a
+      subquery. Products in more orders than this, like best sellers, are
+      refreshed by streaming every order item instead, which is faster
+      than a subquery matching most of them.
+
+PAGE_BUMP_LIMIT:
+    - Above this many changed products, a refresh invalidates every cached
+      product page with one bump of the catalog version, rather than one
+      bump per product.
+"""
+RECOMMENDATIONS_PER_PRODUCT = 6
+RECOMMENDATIONS_BATCH_SIZE = 2000
+INCREMENTAL_SHARE = 0.2
+PAGE_BUMP_LIMIT = 100
+
+
+def co_purchase_counts(items, only=None):
+    """
+    Counts how many orders each pair of products was bought together in.
+
+    Only the pairs seen are counted, a sparse matrix as a dict of
+    Counters, so memory grows with the pairs bought together rather than
+    with the square of the number of products.
+
+    - param items: (order_id, product_id) pairs, sorted by order_id.
+    - param only: optional set of product IDs to count rows for.
+    - return: dict of product ID to Counter of co-purchased product IDs.
+    """
+    counts = defaultdict(Counter)
+    for _, rows in groupby(items, key=itemgetter(0)):
+        products = {product_id for _, product_id in rows}
+        if len(products) < 2:
+            continue
+        for product_id in products:
+            if only is None or product_id in only:
+                counts[product_id].update(products - {product_id})
+    return counts
+
+
+def top_related(counts, limit=RECOMMENDATIONS_PER_PRODUCT):
+    """
+    Truncates each product's co-purchase counts to the limit most often
+    bought with it, ties going to the lower product ID.
+
+    - param counts: result of co_purchase_counts().
+    - param limit: products kept per product.
+    - return: dict of product ID to list of product IDs.
+    """
+    return {
+        product_id: [other for other, _ in nlargest(
+            limit, row.items(), key=lambda pair: (pair[1], -pair[0]))]
+        for product_id, row in counts.items()
+    }
+
+
+def refresh_recommendations(full=False, limit=RECOMMENDATIONS_PER_PRODUCT,
+                            batch_size=RECOMMENDATIONS_BATCH_SIZE):
+    """
+    Rebuilds the recommendations of the products ordered since the last
+    refresh, or of every product with full=True.
+
+    Order items are streamed sorted by order and counted in Python; an
+    incremental refresh only counts the products ordered since, and only
+    reads the orders they are in unless that is most of them. Cached pages
+    of products whose recommendations changed are invalidated once the
+    rows are written.
+
+    - param full: True to rebuild every product's recommendations.
+    - param limit: products kept per product.
+    - param batch_size: rows read and written per query.
+    - return: number of products refreshed.
+    """
+    started = now()
+    since = None if full else ProductRecommendations.objects.aggregate(
+        last=Max("updated_at"))["last"]
+
+    items = OrderItem.objects.all()
+    only = None
+    if since is not None:
+        only = set(OrderItem.objects.filter(order__in=Order.objects.filter(
+            created_at__gte=since).values("pk"))
+            .values_list("product_id", flat=True).distinct())
+        if not only:
+            return 0
+        affected = OrderItem.objects.filter(product_id__in=only)
+        if affected.count() < INCREMENTAL_SHARE * OrderItem.objects.count():
+            items = items.filter(order_id__in=affected.values("order_id"))
+
+    related = top_related(co_purchase_counts(
+        items.order_by("order_id").values_list("order_id", "product_id")
+        .iterator(chunk_size=batch_size), only), limit)
+
+    existing = ProductRecommendations.objects.all()
+    if only is not None:
+        existing = existing.filter(product_id__in=only)
+    existing = dict(existing.values_list("product_id", "product_ids"))
+    targets = only if only is not None else set(related) | set(existing)
+
+    ProductRecommendations.objects.bulk_create(
+        [ProductRecommendations(product_id=product_id,
+                                product_ids=related.get(product_id, []),
+                                updated_at=started)
+         for product_id in targets],
+        batch_size=batch_size, update_conflicts=True,
+        unique_fields=["product"], update_fields=["product_ids", "updated_at"])
+
+    changed = [product_id for product_id in targets
+               if existing.get(product_id, []) != related.get(product_id, [])]
+    if len(changed) > PAGE_BUMP_LIMIT:
+        bump_version_on_commit("catalog")
+    else:
+        for product_id in changed:
+            bump_version_on_commit(f"product:{product_id}")
+    return len(targets)
+
+
+def recommended_ids(product, limit=RECOMMENDATIONS_PER_PRODUCT):
+    """
+    Returns the IDs of the products most often bought with product, in
+    order. The recommendations row should already be loaded with
+    select_related("recommendations").
+
+    - param product: Product to recommend for.
+    - param limit: most IDs returned.
+    - return: list of product IDs.
+    """
+    try:
+        return product.recommendations.product_ids[:limit]
+    except ProductRecommendations.DoesNotExist:
+        return []
+
+
+def recommended_products(product_ids):
+    """
+    Returns the recommended products still listed, active and in an open
+    store, in order, in one query.
+
+    - param product_ids: result of recommended_ids().
+    - return: list of products with their sizes.
+    """
+    if not product_ids:
+        return []
+    products = Product.objects.filter(
+        pk__in=product_ids, is_active=True,
+        store__is_active=True).select_related("sizes").in_bulk()
+    return [products[pk] for pk in product_ids if pk in products]
+
+
+def recommended_stamps(product_ids):
+    """
+    Returns the version stamps of recommended products for an ETag, in one
+    query: each product's and its store's updated_at, which renames, price
+    changes, archiving and closing the store touch. A deleted product is
+    missing from them.
+
+    - param product_ids: IDs of the recommended products.
+    - return: list of (product ID, updated_at, store's updated_at).
+    """
+    if not product_ids:
+        return []
+    return list(Product.objects.filter(pk__in=product_ids).order_by(
+        "pk").values_list("pk", "updated_at", "store__updated_at"))
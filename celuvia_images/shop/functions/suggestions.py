@@ -0,0 +1,105 @@
+from bisect import bisect_left
+from django.urls import reverse
+from celuvia_images.routers import PRIMARY_DB
+from .cache import LocalIndex
+from .categories import get_categories
+from .facets import listed_products
+
+"""
+SUGGESTIONS_DEFAULT:
+    - Suggestions returned when the request gives no limit.
+
+SUGGESTIONS_MAX:
+    - Most suggestions a request can ask for.
+
+URL_NAMES:
+    - URL of each kind of suggestion, reversed with its slug or ID.
+
+_index:
+    - Process-local suggestion index, rebuilt when the suggestions,
+      catalog or categories version changes.
+"""
+SUGGESTIONS_DEFAULT = 8
+SUGGESTIONS_MAX = 20
+URL_NAMES = {"category": "shop:category_detail",
+             "product": "shop:product_detail"}
+
+
+class SuggestionIndex:
+    """
+    Sorted arrays of lower-cased names, searched by prefix with a binary
+    search. Names are also entered from the start of each later word, so
+    "for" suggests "Misty Forest", after the names that start with it.
+    """
+
+    def __init__(self, names):
+        """
+        - param names: (kind, name, slug or ID) of each category and
+          product, in the order to suggest them when their match is equally
+          good.
+        """
+        self.names = []
+        starts, words = [], []
+        for position, (kind, name, arg) in enumerate(names):
+            self.names.append((kind, name, arg))
+            key = name.casefold()
+            starts.append((key, position))
+            for i in range(1, len(key)):
+                if key[i - 1] == " " and key[i] != " ":
+                    words.append((key[i:], position))
+        # Tuples sort by key, then position
+        self.arrays = [sorted(starts), sorted(words)]
+
+    def suggest(self, query, limit=SUGGESTIONS_DEFAULT):
+        """
+        Returns up to limit names starting with query, or with a word
+        starting with it, ignoring case. Each lookup is a binary search and
+        a scan of at most the matches returned.
+
+        - param query: text typed so far.
+        - param limit: most suggestions returned.
+        - return: list of dicts with "type", "name" and "url".
+        """
+        query = query.strip().casefold()
+        if not query:
+            return []
+        found = []
+        seen = set()
+        for array in self.arrays:
+            i = bisect_left(array, (query,))
+            while i < len(array) and len(found) < limit:
+                key, position = array[i]
+                if not key.startswith(query):
+                    break
+                if position not in seen:
+                    seen.add(position)
+                    found.append(self.names[position])
+                i += 1
+        return [{"type": kind, "name": name,
+                 "url": reverse(URL_NAMES[kind], args=[arg])}
+                for kind, name, arg in found]
+
+
+def index_names():
+    """
+    Yields the (kind, name, slug or ID) of every category, then every
+    listed product, for the suggestion index.
+    """
+    for category in get_categories():
+        yield ("category", category.name, category.slug)
+    # Read the primary, the replica may not have the change yet
+    for pk, name in listed_products().using(PRIMARY_DB).order_by(
+            "name", "pk").values_list("pk", "name").iterator():
+        yield ("product", name, pk)
+
+
+_index = LocalIndex(("suggestions", "catalog", "categories"),
+                    lambda: SuggestionIndex(index_names()))
+
+
+def get_suggestion_index():
+    """
+    Returns the suggestion index for the current catalog, rebuilt when a
+    product, store or category changed since it was built.
+    """
+    return _index.get()
@@ -1,7 +1,9 @@
 import tweepy
 from django.conf import settings
+from .connections import recycles_connections
 
 
+@recycles_connections
 def post_tweet(text: str, media_path=None):
     """
     Use tweepy to authenticate and send tweets.
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from shop.functions.purchases import backfill_purchases, BACKFILL_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Fill the Purchase table from existing orders.
+
+    New orders record their purchases when the Stripe webhook creates
+    them, this adds the ones from orders placed before the table existed.
+    Purchases already recorded are skipped, so it can be run again.
+
+    Usage:
+        python manage.py backfill_purchases --batch-size 1000
+    """
+    help = "Record purchases from existing orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int,
+                            default=BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = backfill_purchases(options["batch_size"])
+        self.stdout.write(f"Checked {count} purchases from existing orders.")
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pipe, Process
+from time import perf_counter
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from shop.models import Store, Product, Size, PendingCheckout
+from shop.testing.fake_stripe import serve_fake_stripe, CHECKOUT_URL
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Benchmark creating Stripe checkout sessions while Stripe is slow,
+    served by WSGI worker threads and by ASGI.
+
+    A fake Stripe in another process answers after --delay ms. Under WSGI
+    each thread waits for Stripe, so throughput is capped at threads /
+    delay; under ASGI one process keeps --concurrency requests waiting on
+    Stripe at once. Requests go through the full middleware stack with
+    Django's test clients, in this process. Checkout sessions aren't
+    cached, so every request waits on Stripe.
+
+    The buyer, product and session are deleted afterwards.
+
+    Usage:
+        python manage.py bench_asgi --requests 200 --delay 100
+    """
+    help = "Compare checkout session throughput under WSGI and ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--delay", type=int, default=100)
+        parser.add_argument("--threads", default="1,4,16")
+        parser.add_argument("--concurrency", type=int, default=100)
+
+    def handle(self, *args, **options):
+        requests = options["requests"]
+        receive, send = Pipe(duplex=False)
+        fake = Process(target=serve_fake_stripe,
+                       args=(options["delay"] / 1000, send), daemon=True)
+        fake.start()
+        api_base = receive.recv()
+
+        buyer = self.create_buyer()
+        cookie = None
+        try:
+            cookie = self.checkout_cookie(buyer)
+            url = reverse("shop:create_checkout_session")
+            self.stdout.write(f"{requests} checkout sessions, Stripe "
+                              f"answering in {options['delay']} ms")
+            with override_settings(STRIPE_SECRET_KEY="sk_test_bench",
+                                   STRIPE_API_BASE=api_base,
+                                   STRIPE_SESSION_CACHE_SECONDS=0,
+                                   ALLOWED_HOSTS=["testserver"]):
+                for threads in map(int, options["threads"].split(",")):
+                    elapsed = self.run_wsgi(url, cookie, requests, threads)
+                    self.report(f"WSGI, {threads} threads", requests,
+                                elapsed)
+                concurrency = options["concurrency"]
+                elapsed = asyncio.run(
+                    self.run_asgi(url, cookie, requests, concurrency))
+                self.report(f"ASGI, {concurrency} concurrent", requests,
+                            elapsed)
+        finally:
+            fake.terminate()
+            Session.objects.filter(session_key=cookie).delete()
+            buyer.delete()
+
+    def create_buyer(self):
+        """
+        Create a buyer, and a store and product for their cart.
+        """
+        buyer = User.objects.create_user(
+            email="bench@celuvia.local", first_name="Bench",
+            last_name="Buyer")
+        store = Store.objects.create(
+            owner=buyer, name="Bench Store", email="bench@celuvia.local",
+            phone_number="0")
+        buyer.bench_product = Product.objects.create(
+            store=store, name="Bench Print", image="products/no-image.png")
+        Size.objects.create(product=buyer.bench_product, small_price=25)
+        return buyer
+
+    def checkout_cookie(self, buyer):
+        """
+        Log the buyer in with a cart ready to check out, returning their
+        session key. Checkout only reads the session, so every request can
+        share it.
+        """
+        pending = PendingCheckout.objects.create(user=buyer, cart={"bench": {
+            "product_id": buyer.bench_product.id, "size": "S",
+            "frame_colour": "black", "price": "25.00", "quantity": 1}})
+        client = Client()
+        client.force_login(buyer)
+        session = client.session
+        session["checkout_id"] = str(pending.pk)
+        session.save()
+        return session.session_key
+
+    def check_checkout(self, response):
+        """
+        Fail the benchmark if checkout didn't reach the fake Stripe.
+        """
+        if not response.get("Location", "").startswith(CHECKOUT_URL):
+            raise RuntimeError(
+                f"Checkout failed: {response.status_code} "
+                f"{response.get('Location')}")
+
+    def run_wsgi(self, url, cookie, requests, threads):
+        """
+        Time requests made by a pool of threads, one client each.
+        """
+        local = threading.local()
+
+        def get(_):
+            if not hasattr(local, "client"):
+                local.client = Client()
+                local.client.cookies[settings.SESSION_COOKIE_NAME] = cookie
+            self.check_checkout(local.client.get(url))
+
+        start = perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(get, range(requests)))
+        return perf_counter() - start
+
+    async def run_asgi(self, url, cookie, requests, concurrency):
+        """
+        Time requests made on one event loop, at most concurrency at once.
+        """
+        limit = asyncio.Semaphore(concurrency)
+
+        async def get():
+            async with limit:
+                client = AsyncClient()
+                client.cookies[settings.SESSION_COOKIE_NAME] = cookie
+                self.check_checkout(await client.get(url))
+
+        start = perf_counter()
+        await asyncio.gather(*(get() for _ in range(requests)))
+        return perf_counter() - start
+
+    def report(self, label, requests, seconds):
+        """
+        Write one throughput line.
+        """
+        self.stdout.write(
+            f"  {label:<24} {requests / seconds:8.1f} requests/sec, "
+            f"{seconds / requests * 1000:.2f} ms/request")
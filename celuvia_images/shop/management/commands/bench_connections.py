@@ -0,0 +1,75 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the per-request cost of opening database connections.
+
+    Simulates a number of requests, each running one small query between
+    Django's request_started/request_finished connection handling, first
+    with CONN_MAX_AGE=0 (a new connection per request) and then with
+    persistent, health checked connections.
+
+    Usage:
+        python manage.py bench_connections --requests 500
+    """
+    help = "Compare per-request connection overhead with and without reuse."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        requests = options["requests"]
+        conn = connections[alias]
+        original = (conn.settings_dict["CONN_MAX_AGE"],
+                    conn.settings_dict["CONN_HEALTH_CHECKS"])
+
+        self.stdout.write(
+            f"{requests} requests against '{alias}' ({conn.vendor})")
+        try:
+            results = [
+                ("new connection per request", 0, False),
+                ("persistent + health checks", 600, True),
+            ]
+            for label, max_age, health_checks in results:
+                conn.settings_dict["CONN_MAX_AGE"] = max_age
+                conn.settings_dict["CONN_HEALTH_CHECKS"] = health_checks
+                conn.close()
+                elapsed, opened = self.run_requests(conn, requests)
+                self.stdout.write(
+                    f"  {label:<28} {elapsed / requests * 1e6:8.1f} "
+                    f"us/request, {opened} connections opened")
+        finally:
+            conn.settings_dict["CONN_MAX_AGE"] = original[0]
+            conn.settings_dict["CONN_HEALTH_CHECKS"] = original[1]
+            conn.close()
+
+    def run_requests(self, conn, requests):
+        """
+        Run the simulated requests and return (seconds, connections opened).
+        """
+        opened = []
+
+        def count(sender, connection, **kwargs):
+            if connection.alias == conn.alias:
+                opened.append(1)
+
+        connection_created.connect(count)
+        try:
+            start = perf_counter()
+            for _ in range(requests):
+                # What request_started and request_finished do
+                close_old_connections()
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+                close_old_connections()
+            elapsed = perf_counter() - start
+        finally:
+            connection_created.disconnect(count)
+        return elapsed, len(opened)
@@ -0,0 +1,136 @@
+import random
+from decimal import Decimal
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+from shop.models import (Store, Category, Product, Size,
+                         ProductRatingStats)
+from shop.functions.cache import bump_version
+from shop.functions.facets import (get_facet_index, listed_products,
+                                   PRICE_BANDS, RATING_BUCKETS)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the home page's facet counts on a large catalog: building
+    the in-process bitmap index, counting from it, and counting with one
+    grouped query per facet instead.
+
+    The products are bulk created inside a transaction that is rolled
+    back, so the database is left unchanged.
+
+    Usage:
+        python manage.py bench_facets --products 100000
+    """
+    help = "Time facet counts from the bitmap index against SQL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--requests", type=int, default=100)
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        requests = options["requests"]
+        with transaction.atomic():
+            categories = self.create_catalog(options["products"], rng)
+            selections = [{
+                "category": rng.choice([None] + categories),
+                "price": rng.choice([None] + [b[0] for b in PRICE_BANDS]),
+                "rating": rng.choice([None] + [b[0] for b in RATING_BUCKETS]),
+            } for _ in range(requests)]
+
+            bump_version("facets")
+            start = perf_counter()
+            index = get_facet_index()
+            self.report("build index", perf_counter() - start)
+
+            start = perf_counter()
+            for selected in selections:
+                index.counts(selected)
+            self.report("counts per request (index)",
+                        (perf_counter() - start) / requests)
+
+            start = perf_counter()
+            for selected in selections[:10]:
+                self.sql_counts(selected)
+            self.report("counts per request (SQL)",
+                        (perf_counter() - start) / 10)
+
+            transaction.set_rollback(True)
+
+    def create_catalog(self, count, rng):
+        """
+        Bulk create count products over 20 categories, with random prices
+        and ratings.
+        """
+        owner = User.objects.create_user(
+            email="bench@celuvia.local", first_name="Bench",
+            last_name="Vendor")
+        store = Store.objects.create(
+            owner=owner, name="Bench Store", email="bench@celuvia.local",
+            phone_number="0")
+        Category.objects.bulk_create([
+            Category(name=f"Bench {i}", slug=f"bench-{i}")
+            for i in range(20)])
+        categories = list(Category.objects.filter(name__startswith="Bench ")
+                          .values_list("pk", flat=True))
+        Product.objects.bulk_create([
+            Product(store=store, name=f"Bench Print {i}",
+                    category_id=rng.choice(categories),
+                    image="products/no-image.png")
+            for i in range(count)], batch_size=1000)
+        products = list(Product.objects.filter(store=store)
+                        .values_list("pk", flat=True))
+        Size.objects.bulk_create([
+            Size(product_id=pk, small_price=Decimal(rng.randint(5, 150)))
+            for pk in products], batch_size=1000)
+        ProductRatingStats.objects.bulk_create([
+            ProductRatingStats(product_id=pk, review_count=reviews,
+                               rating_sum=reviews * rng.randint(1, 5))
+            for pk in products[::2]
+            for reviews in [rng.randint(1, 20)]], batch_size=1000)
+        return categories
+
+    def sql_counts(self, selected):
+        """
+        Count each facet with one grouped query, the other facets'
+        selections applied.
+        """
+        def scope(facet):
+            products = listed_products()
+            if facet != "category" and selected["category"]:
+                products = products.filter(category=selected["category"])
+            for key, _, lowest, below in PRICE_BANDS:
+                if facet != "price" and key == selected["price"]:
+                    products = products.filter(
+                        **({"sizes__small_price__gte": lowest} if lowest
+                           else {}),
+                        **({"sizes__small_price__lt": below} if below
+                           else {}))
+            for key, _, lowest in RATING_BUCKETS:
+                if facet != "rating" and key == selected["rating"]:
+                    products = products.filter(
+                        rating_stats__rating_sum__gte=F(
+                            "rating_stats__review_count") * lowest)
+            return products
+
+        list(scope("category").values("category").annotate(n=Count("pk")))
+        scope("price").aggregate(**{key: Count("pk", filter=Q(
+            **({"sizes__small_price__gte": lowest} if lowest else {}),
+            **({"sizes__small_price__lt": below} if below else {})))
+            for key, _, lowest, below in PRICE_BANDS})
+        scope("rating").aggregate(**{key: Count("pk", filter=Q(
+            rating_stats__review_count__gt=0,
+            rating_stats__rating_sum__gte=F(
+                "rating_stats__review_count") * lowest))
+            for key, _, lowest in RATING_BUCKETS})
+
+    def report(self, label, seconds):
+        """
+        Write one timing line.
+        """
+        self.stdout.write(f"  {label:<34} {seconds * 1000:9.2f} ms")
@@ -0,0 +1,96 @@
+from time import perf_counter
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+from shop.models import Store, Product, Size, Review
+from shop.functions.cache import bump_version
+
+User = get_user_model()
+
+NO_CACHE = {"default": {
+    "BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class Command(BaseCommand):
+    """
+    Benchmark anonymous requests to the product detail page of one hot
+    product, with the page cache disabled and with it warm.
+
+    The product and its reviews are created inside a transaction that is
+    rolled back, so the database is left unchanged.
+
+    Usage:
+        python manage.py bench_product_page --requests 500 --reviews 45
+    """
+    help = "Compare product detail requests/sec with and without page cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--reviews", type=int, default=45)
+
+    def handle(self, *args, **options):
+        requests = options["requests"]
+        with transaction.atomic():
+            product = self.create_product(options["reviews"])
+            # Ids are reused after the rollback, never serve an old page
+            bump_version(f"product:{product.id}")
+            url = reverse("shop:product_detail", args=[product.id])
+            self.stdout.write(f"{requests} requests to {url} with "
+                              f"{options['reviews']} reviews")
+
+            for label, caches in [("no page cache", NO_CACHE),
+                                  ("hot page cache", None)]:
+                overrides = {"ALLOWED_HOSTS": ["testserver"]}
+                if caches:
+                    overrides["CACHES"] = caches
+                with override_settings(**overrides):
+                    elapsed = self.run_requests(url, requests)
+                self.stdout.write(
+                    f"  {label:<16} {requests / elapsed:8.1f} requests/sec, "
+                    f"{elapsed / requests * 1000:.2f} ms/request")
+
+            transaction.set_rollback(True)
+
+    def create_product(self, reviews):
+        """
+        Create a product with sizes and the given number of reviews.
+        """
+        owner = User.objects.create_user(
+            email="bench@celuvia.local", first_name="Bench",
+            last_name="Vendor")
+        store = Store.objects.create(
+            owner=owner, name="Bench Store", email="bench@celuvia.local",
+            phone_number="0")
+        product = Product.objects.create(
+            store=store, name="Bench Print", image="products/no-image.png")
+        Size.objects.create(
+            product=product, small_price=Decimal("20.00"),
+            medium_price=Decimal("30.00"), large_price=Decimal("40.00"))
+        for i in range(reviews):
+            reviewer = User.objects.create_user(
+                email=f"bench-reviewer{i}@celuvia.local",
+                first_name="Bench", last_name=f"Reviewer {i}")
+            Review.objects.create(
+                product=product, user=reviewer, rating=4,
+                comment="Lovely print", created_at=now() + timedelta(
+                    minutes=i))
+        return product
+
+    def run_requests(self, url, requests):
+        """
+        Request the page once to warm up, then time the given number of
+        requests.
+
+        - return: seconds taken.
+        """
+        client = Client()
+        client.get(url)
+        start = perf_counter()
+        for _ in range(requests):
+            client.get(url)
+        return perf_counter() - start
@@ -0,0 +1,103 @@
+import random
+from itertools import accumulate
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from shop.models import Store, Product, Order, OrderItem
+from shop.functions.recommendations import refresh_recommendations
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Benchmark building the "customers also bought" recommendations from a
+    large number of order items, then an incremental refresh after a few
+    new orders.
+
+    Orders of one to five products are bulk created, with some products
+    far more popular than others, inside a transaction that is rolled
+    back, so the database is left unchanged.
+
+    Usage:
+        python manage.py bench_recommendations --items 1000000
+    """
+    help = "Time full and incremental co-purchase recommendation builds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1000000)
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--new-orders", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        with transaction.atomic():
+            start = perf_counter()
+            user, products = self.create_catalog(options["products"])
+            self.create_orders(user, products, options["items"])
+            self.report(f"create {options['items']} order items",
+                        perf_counter() - start)
+
+            start = perf_counter()
+            count = refresh_recommendations(full=True)
+            self.report(f"full build ({count} products)",
+                        perf_counter() - start)
+
+            orders = options["new_orders"]
+            self.create_orders(user, products, orders * 3)
+            start = perf_counter()
+            count = refresh_recommendations()
+            self.report(f"incremental ({count} products)",
+                        perf_counter() - start)
+
+            transaction.set_rollback(True)
+
+    def create_catalog(self, count):
+        """
+        Bulk create a buyer and a store with count products.
+        """
+        user = User.objects.create_user(
+            email="bench@celuvia.local", first_name="Bench",
+            last_name="Buyer")
+        store = Store.objects.create(
+            owner=user, name="Bench Store", email="bench@celuvia.local",
+            phone_number="0")
+        Product.objects.bulk_create([
+            Product(store=store, name=f"Bench Print {i}",
+                    image="products/no-image.png")
+            for i in range(count)], batch_size=1000)
+        return user, list(Product.objects.filter(store=store)
+                          .values_list("pk", flat=True))
+
+    def create_orders(self, user, products, items):
+        """
+        Bulk create orders of one to five products until there are items
+        order items, popular products being picked more often.
+        """
+        weights = list(accumulate(1 / (rank + 1)
+                                  for rank in range(len(products))))
+        sizes = []
+        total = 0
+        while total < items:
+            sizes.append(min(self.random.randint(1, 5), items - total))
+            total += sizes[-1]
+        orders = Order.objects.bulk_create(
+            [Order(user=user) for _ in sizes], batch_size=1000)
+        if orders[0].pk is None:
+            orders = Order.objects.filter(user=user).order_by("-pk")[
+                :len(sizes)]
+        OrderItem.objects.bulk_create(
+            (OrderItem(order_id=order.pk, product_id=product_id, size="M",
+                       frame_colour="Black", price=30)
+             for order, size in zip(orders, sizes)
+             for product_id in set(self.random.choices(
+                 products, cum_weights=weights, k=size))),
+            batch_size=1000)
+
+    def report(self, label, seconds):
+        """
+        Write one timing line.
+        """
+        self.stdout.write(f"  {label:<34} {seconds * 1000:9.1f} ms")
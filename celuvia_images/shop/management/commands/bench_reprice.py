@@ -0,0 +1,82 @@
+from time import perf_counter
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from shop.models import Store, Product, Size
+from shop.functions.pricing import (products_in_scope, preview_price_change,
+                                    apply_price_change)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Benchmark a bulk price change on a large store: the preview, the
+    single UPDATE, and saving each Size the way edit_product does (timed
+    on a sample and scaled up).
+
+    The store and products are bulk created inside a transaction that is
+    rolled back, so the database is left unchanged.
+
+    Usage:
+        python manage.py bench_reprice --products 50000
+    """
+    help = "Time bulk price changes against per-product saves."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=50000)
+        parser.add_argument("--sample", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count, sample = options["products"], options["sample"]
+        with transaction.atomic():
+            store = self.create_store(count)
+            self.stdout.write(f"{count} products in one store")
+            scope = products_in_scope(store)
+
+            start = perf_counter()
+            preview_price_change(scope, "percent", Decimal("10"))
+            self.report("preview (aggregate query)", perf_counter() - start)
+
+            start = perf_counter()
+            apply_price_change(store, store.owner, "percent", Decimal("10"))
+            self.report("apply (one UPDATE)", perf_counter() - start)
+
+            start = perf_counter()
+            for size in Size.objects.filter(
+                    product__store=store)[:sample]:
+                size.medium_price = size.medium_price * Decimal("1.1")
+                size.save()
+            elapsed = (perf_counter() - start) * count / sample
+            self.report(f"save() per product (from {sample})", elapsed)
+
+            transaction.set_rollback(True)
+
+    def create_store(self, count):
+        """
+        Bulk create a store with count priced products.
+        """
+        owner = User.objects.create_user(
+            email="bench@celuvia.local", first_name="Bench",
+            last_name="Vendor")
+        store = Store.objects.create(
+            owner=owner, name="Bench Store", email="bench@celuvia.local",
+            phone_number="0")
+        products = Product.objects.bulk_create([
+            Product(store=store, name=f"Bench Print {i}",
+                    image="products/no-image.png")
+            for i in range(count)], batch_size=1000)
+        if products[0].pk is None:
+            products = Product.objects.filter(store=store)
+        Size.objects.bulk_create([
+            Size(product=product, small_price=Decimal("20.00"),
+                 medium_price=Decimal("30.00"), large_price=Decimal("40.00"))
+            for product in products], batch_size=1000)
+        return store
+
+    def report(self, label, seconds):
+        """
+        Write one timing line.
+        """
+        self.stdout.write(f"  {label:<34} {seconds * 1000:9.1f} ms")
@@ -0,0 +1,94 @@
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from shop.models import Store, Product, Size
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Measure django_session reads and writes for one shopping trip in each
+    session mode.
+
+    The trip is: view two products, add both to the cart, change a
+    quantity, view the cart, log in, and submit the checkout form. Test
+    data is created inside a transaction that is rolled back.
+
+    Usage:
+        python manage.py bench_session_writes
+    """
+    help = "Count session table queries per checkout for each session mode."
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'mode':<16}{'reads':>8}{'writes':>8}{'all queries':>14}")
+        with transaction.atomic():
+            user, products = self.create_data()
+            for mode, engine in settings.SESSION_ENGINES.items():
+                with override_settings(SESSION_MODE=mode,
+                                       SESSION_ENGINE=engine,
+                                       ALLOWED_HOSTS=["testserver"]):
+                    reads, writes, total = self.checkout(user, products)
+                self.stdout.write(
+                    f"{mode:<16}{reads:>8}{writes:>8}{total:>14}")
+            transaction.set_rollback(True)
+
+    def create_data(self):
+        """
+        Create a buyer and two products to buy.
+        """
+        user = User.objects.create_user(
+            email="bench-buyer@celuvia.local", first_name="Bench",
+            last_name="Buyer", password="benchpass123")
+        store = Store.objects.create(
+            owner=user, name="Bench Store", email="bench@celuvia.local",
+            phone_number="0")
+        products = []
+        for i in range(2):
+            product = Product.objects.create(
+                store=store, name=f"Bench Print {i}",
+                image="products/no-image.png")
+            Size.objects.create(
+                product=product, small_price=Decimal("20.00"),
+                medium_price=Decimal("30.00"), large_price=Decimal("40.00"))
+            products.append(product)
+        return user, products
+
+    def checkout(self, user, products):
+        """
+        Run the shopping trip and return (session reads, session writes,
+        all queries).
+        """
+        client = Client()
+        with CaptureQueriesContext(connections["default"]) as queries:
+            for product in products:
+                url = reverse("shop:product_detail", args=[product.id])
+                client.get(url)
+                client.post(url, {"frame_colour": "Oak", "size": "M",
+                                  "quantity": 1})
+            client.post(reverse("shop:update_cart"), {
+                "key": f"{products[0].id}-M-Oak", "quantity": 2})
+            client.get(reverse("shop:show_cart"))
+
+            client.force_login(user)
+            client.get(reverse("shop:checkout"))
+            client.post(reverse("shop:checkout"), {
+                "shipping-full_name": "Bench Buyer",
+                "shipping-address_line1": "1 Bench Street",
+                "shipping-city": "London",
+                "shipping-postcode": "E1 1AA",
+                "shipping-phone": "07777777777",
+                "same_billing": "on",
+            })
+
+        session_queries = [q["sql"] for q in queries.captured_queries
+                           if "django_session" in q["sql"]]
+        reads = sum(sql.startswith("SELECT") for sql in session_queries)
+        writes = len(session_queries) - reads
+        return reads, writes, len(queries.captured_queries)
@@ -0,0 +1,93 @@
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from shop.models import Store
+from shop.serializers import StoreSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the get/stores API with many stores, against the previous
+    implementation that queried each owner's stores separately.
+
+    The vendors and stores are bulk created inside a transaction that is
+    rolled back, so the database is left unchanged.
+
+    Usage:
+        python manage.py bench_stores --stores 10000 --stores-per-owner 4
+    """
+    help = "Compare get/stores time and queries with the per-owner version."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stores", type=int, default=10000)
+        parser.add_argument("--stores-per-owner", type=int, default=4)
+
+    def handle(self, *args, **options):
+        stores, per_owner = options["stores"], options["stores_per_owner"]
+        with transaction.atomic():
+            self.create_stores(stores, per_owner)
+            self.stdout.write(f"{stores} stores, {per_owner} per owner")
+
+            self.report("per owner queries", self.per_owner)
+            client = Client()
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                self.report("single query", lambda: b"".join(
+                    client.get("/get/stores").streaming_content))
+                self.report("single query, 1000 per page", lambda: b"".join(
+                    client.get("/get/stores?limit=1000").streaming_content))
+
+            transaction.set_rollback(True)
+
+    def create_stores(self, stores, per_owner):
+        """
+        Bulk create the owners and their stores.
+        """
+        owners = User.objects.bulk_create([
+            User(email=f"bench-vendor{i}@celuvia.local", first_name="Bench",
+                 last_name=f"Vendor {i}", full_name=f"Bench Vendor {i}")
+            for i in range(-(-stores // per_owner))])
+        Store.objects.bulk_create([
+            Store(owner=owners[i // per_owner], name=f"Bench Store {i}",
+                  email="bench@celuvia.local", phone_number="0")
+            for i in range(stores)], batch_size=1000)
+
+    def per_owner(self):
+        """
+        The previous view_stores body: one query per owner.
+        """
+        stores = Store.objects.select_related(
+            "owner").order_by("owner__full_name")
+        data = []
+        for owner in User.objects.filter(
+                stores__in=stores).distinct().order_by("full_name"):
+            owner_stores = stores.filter(owner=owner)
+            data.append({
+                "owner_id": owner.id,
+                "owner_name": owner.get_full_name(),
+                "stores": StoreSerializer(owner_stores, many=True).data,
+            })
+        return data
+
+    def report(self, label, func):
+        """
+        Time func and count the queries it runs on any database.
+        """
+        contexts = [CaptureQueriesContext(connections[alias])
+                    for alias in connections]
+        for context in contexts:
+            context.__enter__()
+        start = perf_counter()
+        try:
+            func()
+        finally:
+            elapsed = perf_counter() - start
+            for context in contexts:
+                context.__exit__(None, None, None)
+        queries = sum(len(context) for context in contexts)
+        self.stdout.write(f"  {label:<30} {elapsed * 1000:9.1f} ms, "
+                          f"{queries} queries")
@@ -0,0 +1,97 @@
+import random
+from decimal import Decimal
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from shop.models import Store, Product, Size
+from shop.functions.cache import bump_version
+from shop.functions.facets import listed_products
+from shop.functions.suggestions import (get_suggestion_index,
+                                        SUGGESTIONS_DEFAULT)
+
+User = get_user_model()
+
+WORDS = ["misty", "forest", "river", "golden", "sunset", "harbour", "city",
+         "lights", "winter", "morning", "mountain", "lake", "bridge", "old",
+         "tower", "meadow", "autumn", "storm", "quiet", "street", "coast",
+         "night", "garden", "valley", "north", "wild", "blue", "stone"]
+
+
+class Command(BaseCommand):
+    """
+    Benchmark search suggestions on a large catalog: building the
+    in-process prefix index, looking up typed prefixes in it, and the same
+    lookups as a LIKE query instead.
+
+    The products are bulk created inside a transaction that is rolled
+    back, so the database is left unchanged.
+
+    Usage:
+        python manage.py bench_suggestions --products 100000
+    """
+    help = "Time search suggestions from the prefix index against SQL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--requests", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        requests = options["requests"]
+        # Prefixes as typed, one to five letters of a word
+        queries = [word[:rng.randint(1, 5)]
+                   for word in rng.choices(WORDS, k=requests)]
+        with transaction.atomic():
+            self.create_catalog(options["products"], rng)
+
+            bump_version("suggestions")
+            start = perf_counter()
+            index = get_suggestion_index()
+            self.report("build index", perf_counter() - start)
+
+            start = perf_counter()
+            for query in queries:
+                index.suggest(query)
+            self.report("suggest per request (index)",
+                        (perf_counter() - start) / requests)
+
+            start = perf_counter()
+            for query in queries[:20]:
+                list(listed_products().filter(
+                    Q(name__istartswith=query)
+                    | Q(name__icontains=f" {query}"))
+                    .order_by("name").values_list("pk", "name")
+                    [:SUGGESTIONS_DEFAULT])
+            self.report("suggest per request (SQL)",
+                        (perf_counter() - start) / 20)
+
+            transaction.set_rollback(True)
+
+    def create_catalog(self, count, rng):
+        """
+        Bulk create count priced products named with two to four random
+        words and a number, as names are unique within a store.
+        """
+        owner = User.objects.create_user(
+            email="bench@celuvia.local", first_name="Bench",
+            last_name="Vendor")
+        store = Store.objects.create(
+            owner=owner, name="Bench Store", email="bench@celuvia.local",
+            phone_number="0")
+        Product.objects.bulk_create([
+            Product(store=store, image="products/no-image.png",
+                    name=" ".join(rng.choices(WORDS, k=rng.randint(2, 4)))
+                    .title() + f" {i}")
+            for i in range(count)], batch_size=1000)
+        Size.objects.bulk_create([
+            Size(product_id=pk, small_price=Decimal(rng.randint(5, 150)))
+            for pk in Product.objects.filter(store=store)
+            .values_list("pk", flat=True)], batch_size=1000)
+
+    def report(self, label, seconds):
+        """
+        Write one timing line.
+        """
+        self.stdout.write(f"  {label:<34} {seconds * 1000:9.2f} ms")
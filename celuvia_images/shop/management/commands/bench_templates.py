@@ -0,0 +1,111 @@
+from time import perf_counter
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.template import RequestContext, engines
+from django.template.engine import Engine
+from django.test import RequestFactory
+from shop.models import Store, Product, Size
+
+User = get_user_model()
+
+LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+
+
+class Command(BaseCommand):
+    """
+    Benchmark rendering home.html with a page of 12 product cards, with
+    templates re-parsed on every render (no cached loader) and with the
+    cached loader used in production.
+
+    The products are created inside a transaction that is rolled back, so
+    the database is left unchanged.
+
+    Usage:
+        python manage.py bench_templates --renders 200
+    """
+    help = "Compare home.html render time with and without cached templates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=200)
+
+    def handle(self, *args, **options):
+        renders = options["renders"]
+        with transaction.atomic():
+            context = self.home_context()
+            self.stdout.write(f"Rendering shop/home.html {renders} times "
+                              f"with {len(context['page_obj'])} cards")
+
+            for label, loaders in [
+                ("uncached loader", LOADERS),
+                ("cached loader", [("django.template.loaders.cached.Loader",
+                                    LOADERS)]),
+            ]:
+                engine = self.build_engine(loaders)
+                loading, elapsed = self.render(engine, context, renders)
+                self.stdout.write(
+                    f"  {label:<16} {elapsed / renders * 1000:8.2f} "
+                    f"ms/render, of which {loading / renders * 1000:.2f} "
+                    f"ms loading templates")
+
+            transaction.set_rollback(True)
+
+    def build_engine(self, loaders):
+        """
+        Copy the project's template engine with different loaders.
+        """
+        project = engines["django"].engine
+        return Engine(
+            dirs=project.dirs,
+            context_processors=project.context_processors,
+            loaders=loaders,
+            libraries=project.libraries,
+            builtins=[b for b in project.builtins
+                      if b not in Engine.default_builtins],
+            debug=project.debug,
+        )
+
+    def home_context(self):
+        """
+        Create 12 products and return the home page context for them.
+        """
+        owner = User.objects.create_user(
+            email="bench@celuvia.local", first_name="Bench",
+            last_name="Vendor")
+        store = Store.objects.create(
+            owner=owner, name="Bench Store", email="bench@celuvia.local",
+            phone_number="0")
+        for i in range(12):
+            product = Product.objects.create(
+                store=store, name=f"Bench Print {i}",
+                image="products/no-image.png")
+            Size.objects.create(
+                product=product, small_price=Decimal("20.00"),
+                medium_price=Decimal("30.00"), large_price=Decimal("40.00"))
+
+        products = Product.objects.filter(store=store)
+        page_obj = Paginator(products, 12).get_page(1)
+        return {"category": None, "categories": [], "page_obj": page_obj}
+
+    def render(self, engine, context, renders):
+        """
+        Render home.html the given number of times.
+
+        - return: tuple of (seconds loading templates, total seconds).
+        """
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        loading = 0
+        start = perf_counter()
+        for _ in range(renders):
+            load_start = perf_counter()
+            template = engine.get_template("shop/home.html")
+            loading += perf_counter() - load_start
+            template.render(RequestContext(request, context))
+        return loading, perf_counter() - start
@@ -0,0 +1,51 @@
+import json
+from zipfile import BadZipFile
+from django.core.management.base import BaseCommand, CommandError
+from shop.models import Store
+from shop.functions.catalog_import import (CatalogImport, ImageSource,
+                                           import_format, read_rows,
+                                           IMPORT_BATCH_SIZE)
+
+
+class Command(BaseCommand):
+    """
+    Import products and their prices into a store from a CSV or NDJSON
+    file, with images from a directory or zip file.
+
+    Rows that fail validation are skipped and listed with their errors,
+    the rest are imported in batches.
+
+    Usage:
+        python manage.py import_products 3 prints.csv --images prints/
+    """
+    help = "Bulk import products into a store from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("store_id", type=int)
+        parser.add_argument("file")
+        parser.add_argument("--images",
+                            help="Directory or zip file of the images.")
+        parser.add_argument("--format", choices=["csv", "ndjson"])
+        parser.add_argument("--batch-size", type=int,
+                            default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        store = Store.objects.filter(id=options["store_id"]).first()
+        if store is None:
+            raise CommandError(f"Store {options['store_id']} not found.")
+        try:
+            format = import_format(options["file"], options["format"])
+            images = ImageSource(options["images"])
+        except (ValueError, BadZipFile, OSError) as e:
+            raise CommandError(e)
+
+        with open(options["file"], "rb") as file:
+            report = CatalogImport(store, images, options["batch_size"]).run(
+                read_rows(file, format))
+
+        for error in report["errors"]:
+            self.stderr.write(
+                f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} products into {store.name}, "
+            f"{len(report['errors'])} rows skipped."))
@@ -0,0 +1,39 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from shop.models import PendingCheckout
+
+
+class Command(BaseCommand):
+    """
+    Delete abandoned checkouts in small batches.
+
+    A PendingCheckout is deleted when its order is placed, so the ones
+    left are checkouts the buyer never paid for. Stripe retries a webhook
+    for up to 3 days, so the default of 7 days leaves time for a late
+    payment to still place its order.
+
+    Usage:
+        python manage.py purge_pending_checkouts --days 7 --batch-size 1000
+    """
+    help = "Batch-delete checkouts started but never paid for."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        cutoff = now() - timedelta(days=options["days"])
+        deleted = 0
+        while True:
+            ids = list(
+                PendingCheckout.objects.filter(created_at__lt=cutoff)
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            count, _ = PendingCheckout.objects.filter(pk__in=ids).delete()
+            deleted += count
+
+        self.stdout.write(f"Deleted {deleted} abandoned checkouts.")
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+
+class Command(BaseCommand):
+    """
+    Delete expired sessions in small batches.
+
+    Carts keep sessions alive for 7 days, so django_session keeps growing
+    unless expired rows are removed. Django's clearsessions deletes them
+    all in one statement, which can lock the table for a long time on a
+    big site. This deletes batch_size rows at a time instead.
+
+    Usage:
+        python manage.py purge_sessions --batch-size 1000
+    """
+    help = "Batch-delete expired sessions from the session table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if settings.SESSION_MODE == "signed_cookies":
+            self.stdout.write(
+                "Sessions are stored in signed cookies, nothing to purge.")
+            return
+
+        batch_size = options["batch_size"]
+        cutoff = now()
+        deleted = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=cutoff)
+                .values_list("session_key", flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            count, _ = Session.objects.filter(session_key__in=keys).delete()
+            deleted += count
+
+        self.stdout.write(f"Deleted {deleted} expired sessions.")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from shop.functions.rating_stats import (reconcile_rating_stats,
+                                         RECONCILE_BATCH_SIZE)
+
+
+class Command(BaseCommand):
+    """
+    Rebuild product rating stats that have drifted from their reviews.
+
+    Stats are updated as each review is saved or deleted, but changes
+    that skip signals, like update() or raw SQL, are only picked up here.
+    Run it nightly, and once after migrating to create the stats of
+    products reviewed before they existed.
+
+    Usage:
+        python manage.py reconcile_rating_stats --batch-size 1000
+    """
+    help = "Fix product rating stats that differ from their reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int,
+                            default=RECONCILE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        result = reconcile_rating_stats(options["batch_size"])
+        self.stdout.write(
+            f"Checked {result['checked']} rating stats, fixed "
+            f"{result['updated']} and created {result['created']}.")
@@ -0,0 +1,31 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from shop.functions.rankings import refresh_rankings, RANKING_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Refresh the rankings the home page sorts products by.
+
+    Only products ordered, reviewed or added since the last refresh are
+    rescored, so it can run every few minutes. Run it with --full now and
+    then, e.g. nightly, to rescore every product against the current
+    average rating.
+
+    Usage:
+        python manage.py refresh_rankings
+        python manage.py refresh_rankings --full
+    """
+    help = "Rescore product rankings for best rated, best selling and trending."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true",
+                            help="Rescore every product.")
+        parser.add_argument("--batch-size", type=int,
+                            default=RANKING_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        count = refresh_rankings(options["full"], options["batch_size"])
+        self.stdout.write(f"Rescored {count} products in "
+                          f"{(perf_counter() - start) * 1000:.0f} ms.")
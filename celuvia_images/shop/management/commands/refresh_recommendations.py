@@ -0,0 +1,35 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from shop.functions.recommendations import (refresh_recommendations,
+                                            RECOMMENDATIONS_PER_PRODUCT,
+                                            RECOMMENDATIONS_BATCH_SIZE)
+
+
+class Command(BaseCommand):
+    """
+    Refresh the "customers also bought" recommendations on product pages.
+
+    Only products ordered since the last refresh are rebuilt, from the
+    orders they appear in, so it can run every few minutes. Run it with
+    --full to rebuild every product's recommendations.
+
+    Usage:
+        python manage.py refresh_recommendations
+        python manage.py refresh_recommendations --full
+    """
+    help = "Rebuild co-purchase recommendations from order items."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true",
+                            help="Rebuild every product.")
+        parser.add_argument("--limit", type=int,
+                            default=RECOMMENDATIONS_PER_PRODUCT)
+        parser.add_argument("--batch-size", type=int,
+                            default=RECOMMENDATIONS_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        count = refresh_recommendations(
+            options["full"], options["limit"], options["batch_size"])
+        self.stdout.write(f"Refreshed recommendations of {count} products in "
+                          f"{(perf_counter() - start) * 1000:.0f} ms.")
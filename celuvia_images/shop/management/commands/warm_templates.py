@@ -0,0 +1,28 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from celuvia_images.template_cache import warm_templates
+
+
+class Command(BaseCommand):
+    """
+    Compile every template, reporting any that fail to parse.
+
+    The WSGI/ASGI apps do this at startup when WARM_TEMPLATES is on, this
+    command runs the same step on its own, e.g. as a deploy check.
+
+    Usage:
+        python manage.py warm_templates
+    """
+    help = "Compile all templates and report syntax errors."
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        compiled, errors = warm_templates()
+        elapsed = (perf_counter() - start) * 1000
+
+        for name, error in errors:
+            self.stderr.write(f"{name}: {error}")
+        self.stdout.write(
+            f"Compiled {compiled} templates in {elapsed:.1f} ms")
+        if errors:
+            raise CommandError(f"{len(errors)} templates failed to compile.")
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_category_updated_at_product_updated_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('percent', 'Percentage'), ('amount', 'Fixed amount')], max_length=10)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('product_ids', models.JSONField(blank=True, null=True)),
+                ('sizes_updated', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.category')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_changes', to='shop.store')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='price_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
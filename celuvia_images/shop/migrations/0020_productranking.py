@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_productratingstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='shop.product')),
+                ('bayesian_rating', models.FloatField(db_index=True, default=0)),
+                ('units_sold', models.PositiveIntegerField(db_index=True, default=0)),
+                ('trending_score', models.FloatField(db_index=True, default=0)),
+                ('updated_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='productratingstats',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
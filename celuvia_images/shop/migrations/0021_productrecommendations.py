@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_productranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecommendations',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendations', serialize=False, to='shop.product')),
+                ('product_ids', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Product recommendations',
+            },
+        ),
+    ]
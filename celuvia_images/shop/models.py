@@ -5,6 +5,7 @@ from django.db.models import Avg
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 from decimal import Decimal
+from uuid import uuid4
 
 """
 FRAME_CHOICES:
@@ -26,6 +27,7 @@ class Store(models.Model):
         - owner: ForeignKey to the vendor User who owns the store.
         - name: CharField for the store's name (max length 200).
         - description: TextField for a short description of the store.
+        - updated_at: DateTimeField set whenever the store is saved.
     """
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
@@ -35,6 +37,7 @@ class Store(models.Model):
     email = models.EmailField(max_length=100)
     phone_number = models.CharField(max_length=20)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
 
     @property
@@ -52,9 +55,11 @@ class Category(models.Model):
     Fields:
         - name: CharField, unique, for the category name.
         - slug: SlugField, unique, used for URLs and category lookups.
+        - updated_at: DateTimeField set whenever the category is saved.
     """
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=120, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -79,6 +84,8 @@ class Product(models.Model):
         - description: TextField for the product description.
         - image: ImageField storing uploaded product images.
         - created_at: DateTimeField set when the product is created.
+        - updated_at: DateTimeField set whenever the product, its sizes or
+          its reviews change.
 
     Meta:
         - unique_together: Prevents duplicate product variations in same store.
@@ -92,6 +99,7 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to="products/")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     is_active = models.BooleanField(default=True)
 
     class Meta:
@@ -165,6 +173,7 @@ class Review(models.Model):
         - comment: TextField for review content.
         - verified: BooleanField, True if buyer purchased the product.
         - created_at: DateTimeField for review creation date.
+        - updated_at: DateTimeField set whenever the review is saved.
 
     Meta:
         - ordering: sets ordering of user reviews..
@@ -185,6 +194,7 @@ class Review(models.Model):
     comment = models.TextField(blank=True)
     verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=now)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["-created_at"]
@@ -193,6 +203,122 @@ class Review(models.Model):
         return f"{self.user.full_name} - {self.product.name} ({self.rating}/5)"
 
 
+class ProductRatingStats(models.Model):
+    """
+    Review statistics of a product, kept up to date as reviews are added,
+    edited and deleted so pages can show them without aggregating reviews.
+
+    Fields:
+        - product: OneToOneField, the product the reviews are for.
+        - review_count: PositiveIntegerField, number of reviews.
+        - rating_sum: PositiveIntegerField, sum of all ratings.
+        - verified_count: PositiveIntegerField, number of verified reviews.
+        - verified_sum: PositiveIntegerField, sum of verified ratings.
+        - stars_1 to stars_5: PositiveIntegerField, reviews per rating.
+        - updated_at: DateTimeField, when the stats last changed.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True,
+        related_name="rating_stats")
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    verified_count = models.PositiveIntegerField(default=0)
+    verified_sum = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Product rating stats"
+
+    @property
+    def average_rating(self):
+        """
+        Returns the average rating, or None if there are no reviews.
+        """
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
+
+    @property
+    def verified_average_rating(self):
+        """
+        Returns the average rating of verified reviews, or None if there
+        are none.
+        """
+        if not self.verified_count:
+            return None
+        return self.verified_sum / self.verified_count
+
+    def histogram(self):
+        """
+        Returns the number and percentage of reviews for each rating, from
+        5 stars down to 1.
+        """
+        return [{
+            "stars": stars,
+            "count": getattr(self, f"stars_{stars}"),
+            "percent": round(100 * getattr(self, f"stars_{stars}")
+                             / self.review_count) if self.review_count else 0,
+        } for stars in range(5, 0, -1)]
+
+    def __str__(self):
+        return f"Rating stats for {self.product.name}"
+
+
+class ProductRanking(models.Model):
+    """
+    Precomputed scores the home page sorts products by, refreshed by the
+    refresh_rankings command so sorted pages are an indexed scan.
+
+    Fields:
+        - product: OneToOneField, the product ranked.
+        - bayesian_rating: FloatField, average rating pulled towards the
+          average of all reviews, so a few reviews can't top the list.
+        - units_sold: PositiveIntegerField, units ordered in all orders.
+        - trending_score: FloatField, units ordered weighted by how
+          recently, see shop/functions/rankings.py.
+        - updated_at: DateTimeField, when the scores were last refreshed.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True,
+        related_name="ranking")
+    bayesian_rating = models.FloatField(default=0, db_index=True)
+    units_sold = models.PositiveIntegerField(default=0, db_index=True)
+    trending_score = models.FloatField(default=0, db_index=True)
+    updated_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Ranking of {self.product.name}"
+
+
+class ProductRecommendations(models.Model):
+    """
+    Products most often bought in the same order as a product, built from
+    order items by the refresh_recommendations command.
+
+    Fields:
+        - product: OneToOneField, the product the recommendations are for.
+        - product_ids: JSONField, IDs of the products most often bought
+          with it, most often first.
+        - updated_at: DateTimeField, when they were last refreshed.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True,
+        related_name="recommendations")
+    product_ids = models.JSONField(default=list)
+    updated_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Product recommendations"
+
+    def __str__(self):
+        return f"Recommendations for {self.product.name}"
+
+
 class Order(models.Model):
     """
     Model representing a buyer's order.
@@ -209,7 +335,7 @@ class Order(models.Model):
         on_delete=models.CASCADE, related_name="orders")
     total = models.DecimalField(max_digits=10, decimal_places=2,
                                 default=Decimal(0.00))
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     shipping_address = models.ForeignKey("Address", on_delete=models.SET_NULL,
                                          null=True, blank=True,
                                          related_name="shipping_orders")
@@ -338,3 +464,107 @@ class Address(models.Model):
 
     def __str__(self):
         return f"{self.full_name}, {self.address_line1}, {self.city}"
+
+
+class PriceChange(models.Model):
+    """
+    Audit log of bulk price changes made by vendors.
+
+    MODE_CHOICES:
+        - How the value changes prices: by a percentage or a fixed amount.
+
+    Fields:
+        - store: ForeignKey, the store whose prices were changed.
+        - user: ForeignKey, the vendor who made the change.
+        - mode: CharField, percentage or amount.
+        - value: DecimalField, percentage or amount added to each price.
+        - category: ForeignKey, category the change was limited to.
+        - product_ids: JSONField, products the change was limited to.
+        - sizes_updated: PositiveIntegerField, Size rows changed.
+        - created_at: DateTimeField, when the change was made.
+    """
+    MODE_CHOICES = [
+        ("percent", "Percentage"),
+        ("amount", "Fixed amount"),
+    ]
+    store = models.ForeignKey(
+        Store, on_delete=models.CASCADE, related_name="price_changes")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True,
+        related_name="price_changes")
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    value = models.DecimalField(max_digits=8, decimal_places=2)
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="+")
+    product_ids = models.JSONField(null=True, blank=True)
+    sizes_updated = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        sign = "+" if self.value >= 0 else ""
+        unit = "%" if self.mode == "percent" else ""
+        return f"{self.store.name}: {sign}{self.value}{unit}"
+
+
+class Purchase(models.Model):
+    """
+    Products each user has bought, one row per user and product however
+    many orders it was in. Maintained when orders are created, so checking
+    a purchase is one probe of the unique index rather than a join across
+    orders and their items.
+
+    Fields:
+        - user: ForeignKey, the User who bought the product.
+        - product: ForeignKey, the product bought.
+        - created_at: DateTimeField, when it was first bought.
+
+    Meta:
+        - constraints: one row per user and product.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        related_name="purchases")
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="purchases")
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "product"],
+                                    name="unique_purchase"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.full_name} bought {self.product.name}"
+
+
+class PendingCheckout(models.Model):
+    """
+    A buyer's cart and addresses, frozen when they start checkout and read
+    by the Stripe webhook to create the order. Only its ID is sent through
+    Stripe, whose metadata is too small for a large cart.
+
+    Fields:
+        - id: UUIDField, random so it can't be guessed.
+        - user: ForeignKey, the buyer checking out.
+        - cart: JSONField, the cart, repriced when the Stripe session is
+          created.
+        - shipping: JSONField, fields of the shipping address.
+        - billing: JSONField, fields of the billing address.
+        - created_at: DateTimeField, when checkout was started.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        related_name="pending_checkouts")
+    cart = models.JSONField(default=dict)
+    shipping = models.JSONField(default=dict)
+    billing = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Checkout {self.id} by {self.user.full_name}"
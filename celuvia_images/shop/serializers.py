@@ -48,6 +48,24 @@ class SizeSerializer(serializers.ModelSerializer):
         ]
 
 
+class CatalogProductSerializer(serializers.ModelSerializer):
+    """
+    Serializer class for products in the catalog API, with their sizes
+    nested. Pass fields to only include some of the fields.
+    """
+    sizes = SizeSerializer(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Product
+        fields = ["id"] + ProductSerializer.Meta.fields + ["sizes"]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     """
     Serializer class for the Review model.
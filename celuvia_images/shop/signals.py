@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models import QuerySet
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Address
+from django.utils.timezone import now
+from .models import Address, Category, Store, Product, Size, Review
+from .functions.cache import bump_version_on_commit
+from .functions.rating_stats import apply_review_change, refresh_rating_stats
 
 # Get custom user model
 User = get_user_model()
@@ -31,3 +35,162 @@ def create_user_address(sender, instance, created, **kwargs):
                 is_shipping=True,
                 is_billing=True,
             )
+
+
+def owner_names(user):
+    """
+    Returns the names get/stores shows and orders a store owner by, as
+    loaded, without fetching deferred fields.
+    """
+    return tuple(user.__dict__.get(field) for field in
+                 ("full_name", "first_name", "last_name"))
+
+
+@receiver(post_init, sender=User)
+def remember_names(sender, instance, **kwargs):
+    """
+    Remember the names a user was loaded with, to tell when they change.
+
+    sender not used; but is required by signal signature
+    """
+    instance._loaded_names = owner_names(instance)
+
+
+@receiver(post_save, sender=User)
+def touch_owned_stores(sender, instance, created, **kwargs):
+    """
+    Touch the updated_at of a user's stores when their names change, so
+    the ETag of get/stores, which shows stores with their owner's first
+    and last names and orders them by full name, changes too.
+
+    sender not used; but is required by signal signature
+    """
+    names = owner_names(instance)
+    if not created and names != instance._loaded_names:
+        Store.objects.filter(owner=instance).update(updated_at=now())
+    instance._loaded_names = names
+
+
+def deleting_product(origin):
+    """
+    Returns True if a deletion started from a product or store, so the
+    product of every size and review it cascades to is being deleted too.
+
+    - param origin: the instance or queryset delete() was called on.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Product, Store)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, **kwargs):
+    """
+    Invalidate the cached category registry when a category is added,
+    changed or deleted.
+
+    sender not used; but is required by signal signature
+    """
+    bump_version_on_commit("categories")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_page(sender, instance, **kwargs):
+    """
+    Invalidate the cached product detail page, the facet index and the
+    search suggestions when a product is changed.
+
+    sender not used; but is required by signal signature
+    """
+    bump_version_on_commit(f"product:{instance.pk}", "facets",
+                           "suggestions")
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_listings(sender, **kwargs):
+    """
+    Invalidate the facet index and search suggestions when a store is
+    opened, closed or deleted, as only products in open stores are listed.
+
+    sender not used; but is required by signal signature
+    """
+    bump_version_on_commit("facets", "suggestions")
+
+
+@receiver(post_save, sender=Size)
+@receiver(post_delete, sender=Size)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_product_page_parts(sender, instance, **kwargs):
+    """
+    Invalidate the cached product detail page and the facet index when the
+    product's sizes or reviews change, and touch the product's updated_at
+    so its ETag changes too. update() doesn't send post_save for the
+    product. A price change can list or unlist the product, so sizes
+    invalidate the search suggestions too.
+
+    Skipped for sizes and reviews deleted along with their product, whose
+    own post_delete invalidates everything.
+    """
+    if deleting_product(kwargs.get("origin")):
+        return
+    Product.objects.filter(pk=instance.product_id).update(updated_at=now())
+    names = [f"product:{instance.product_id}", "facets"]
+    if sender is Size:
+        names.append("suggestions")
+    bump_version_on_commit(*names)
+
+
+def review_state(instance):
+    """
+    Returns the (rating, verified) of a review, or None if either field
+    was deferred when it was loaded.
+    """
+    fields = instance.__dict__
+    if "rating" not in fields or "verified" not in fields:
+        return None
+    return (fields["rating"], fields["verified"])
+
+
+@receiver(post_init, sender=Review)
+def remember_review_state(sender, instance, **kwargs):
+    """
+    Remember the rating a review was loaded with, so the product's stats
+    can be moved from the old rating to the new one when it is saved.
+
+    sender not used; but is required by signal signature
+    """
+    instance._rating_state = review_state(instance)
+
+
+@receiver(post_save, sender=Review)
+def update_rating_stats(sender, instance, created, **kwargs):
+    """
+    Update the product's rating stats for a new or edited review.
+
+    sender not used; but is required by signal signature
+    """
+    new = (instance.rating, instance.verified)
+    if created:
+        apply_review_change(instance.product_id, new=new)
+    elif instance._rating_state is None:
+        refresh_rating_stats([instance.product_id])
+    else:
+        apply_review_change(instance.product_id, instance._rating_state, new)
+    instance._rating_state = new
+
+
+@receiver(post_delete, sender=Review)
+def remove_from_rating_stats(sender, instance, **kwargs):
+    """
+    Take a deleted review out of the product's rating stats, recounting
+    them if its rating wasn't loaded.
+
+    sender not used; but is required by signal signature
+    """
+    if instance._rating_state is None:
+        refresh_rating_stats([instance.product_id])
+    else:
+        apply_review_change(instance.product_id, old=instance._rating_state)
@@ -0,0 +1,70 @@
+/*
+Custom JavaScript for search suggestions on the home page.
+
+As the user types in the search box, matching categories and products are
+fetched from the suggestions endpoint and listed under it as links.
+Pressing enter still searches the whole page as before.
+*/
+
+document.addEventListener("DOMContentLoaded", function () {
+  const input = document.getElementById("search-input");
+  const list = document.getElementById("search-suggestions");
+
+  if (!input || !list) return;
+
+  let timer = null;
+  let controller = null;
+
+  function hide() {
+    list.innerHTML = "";
+    list.classList.remove("show");
+  }
+
+  function show(suggestions) {
+    list.innerHTML = "";
+    suggestions.forEach((suggestion) => {
+      const link = document.createElement("a");
+      link.className = "dropdown-item d-flex justify-content-between";
+      link.href = suggestion.url;
+      link.textContent = suggestion.name;
+
+      const kind = document.createElement("small");
+      kind.className = "text-muted ms-3";
+      kind.textContent = suggestion.type;
+      link.appendChild(kind);
+
+      const item = document.createElement("li");
+      item.appendChild(link);
+      list.appendChild(item);
+    });
+    list.classList.toggle("show", suggestions.length > 0);
+  }
+
+  input.addEventListener("input", () => {
+    clearTimeout(timer);
+    const query = input.value.trim();
+    if (!query) {
+      hide();
+      return;
+    }
+    // Wait for a pause in typing, and drop replies to older queries
+    timer = setTimeout(() => {
+      if (controller) controller.abort();
+      controller = new AbortController();
+      fetch(`${list.dataset.url}?q=${encodeURIComponent(query)}`, {
+        signal: controller.signal,
+      })
+        .then((response) => response.json())
+        .then((data) => show(data.suggestions || []))
+        .catch(() => {});
+    }, 150);
+  });
+
+  input.addEventListener("keydown", (event) => {
+    if (event.key === "Escape") hide();
+  });
+
+  document.addEventListener("click", (event) => {
+    if (!list.contains(event.target) && event.target !== input) hide();
+  });
+});
@@ -0,0 +1,123 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import parse_qsl
+
+"""
+CHECKOUT_URL:
+    - Start of the payment page URL of every fake checkout session.
+"""
+CHECKOUT_URL = "https://checkout.stripe.test/pay/"
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """
+    Answers checkout session requests the way Stripe's API does.
+    Connections are kept alive, as Stripe's clients do with the real API.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        key = self.headers.get("Idempotency-Key")
+        server.calls.append({"path": self.path, "idempotency_key": key,
+                             "params": dict(parse_qsl(body.decode()))})
+        sleep(server.delay)
+
+        with server.lock:
+            failing = server.failures > 0
+            if failing:
+                server.failures -= 1
+            elif key is None or key not in server.sessions:
+                session_id = f"cs_test_{len(server.calls)}"
+                session = {"id": session_id, "object": "checkout.session",
+                           "url": CHECKOUT_URL + session_id}
+                if key is not None:
+                    server.sessions[key] = session
+            else:
+                session = server.sessions[key]
+        if failing:
+            self.reply(500, {"error": {"type": "api_error",
+                                       "message": "Fake Stripe error."}})
+        else:
+            self.reply(200, session)
+
+    def reply(self, status, data):
+        """
+        Send data as the JSON response.
+        """
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeStripe(ThreadingHTTPServer):
+    """
+    Local fake of Stripe's API for tests and benchmarks, creating checkout
+    sessions. Point STRIPE_API_BASE at its url.
+
+    Attributes:
+        - delay: seconds to wait before answering, to simulate a slow or
+          hanging Stripe.
+        - failures: number of the next requests answered with a 500 error.
+        - calls: dicts with the "path", "idempotency_key" and form encoded
+          "params" of every request received.
+        - sessions: sessions created, by idempotency key. A repeated key
+          gets the same session back, as with Stripe.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, delay=0):
+        super().__init__(("127.0.0.1", 0), FakeStripeHandler)
+        self.delay = delay
+        self.failures = 0
+        self.calls = []
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self):
+        """
+        Serve requests in a background thread, returning the server.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket.
+        """
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        """
+        Ignore clients that timed out and hung up before the reply.
+        """
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve_fake_stripe(delay, conn):
+    """
+    Runs a FakeStripe until the process is stopped, sending its URL down
+    conn. Benchmarks run it in its own process, so it doesn't compete with
+    Django for the GIL.
+    """
+    server = FakeStripe(delay)
+    conn.send(server.url)
+    server.serve_forever()
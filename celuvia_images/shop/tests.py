@@ -1,12 +1,73 @@
-from django.test import TestCase
+import base64
+import json
+from contextvars import Context
+from datetime import timedelta
+from decimal import Decimal
+import os
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock
+from PIL import Image
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.contrib.sessions.models import Session
+from django.contrib.messages import get_messages
+from django.utils.timezone import now
+from django.core.cache import cache
+from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
-from .models import Store
+from celuvia_images.template_cache import warm_templates, template_names
+from django.template import engines
+from celuvia_images.routers import (PrimaryReplicaRouter, read_from_replica,
+                                    PIN_COOKIE)
+from .models import (Store, Product, Category, Size, Review, PriceChange,
+                     Order, OrderItem, Purchase, ProductRatingStats, Address,
+                     ProductRanking, ProductRecommendations, PendingCheckout)
+from .checks import connection_pool_size
+from .functions.connections import recycle_connections
+from .functions.categories import get_categories, get_category_by_slug
+from .functions.cache import get_version, bump_version
+from .functions.purchases import has_purchased, record_purchases
+from .functions.rating_stats import rating_totals, STATS_FIELDS
+from .functions.rankings import refresh_rankings
+from .functions.recommendations import refresh_recommendations
+from .functions.facets import get_facet_index, _index as facet_index
+from .functions.suggestions import (get_suggestion_index,
+                                    _index as suggestion_index)
+from .functions.payments import breaker
+from .functions.checkout import price_cart, place_order
+from .functions.catalog_import import CatalogImport, ImageSource
+from .testing.fake_stripe import FakeStripe, CHECKOUT_URL
 
 User = get_user_model()
 
 
+class BuyerStoreMixin:
+    """
+    Starts a test with an empty cache and a buyer, self.user, who owns
+    self.store.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="buyer@test.com",
+            first_name="Buyer",
+            last_name="User",
+            password="buyerpass123"
+        )
+        self.store = Store.objects.create(
+            owner=self.user, name="Test Store", email="store@test.com",
+            phone_number="07777777777")
+
+
 class VendorViewsTest(TestCase):
     """
     These tests test that users must be in the vendor group to access the
@@ -164,3 +225,1978 @@ class VendorViewsTest(TestCase):
         # Verify 403 Forbidden access response
         response = self.client.get(reverse("shop:add_store"))
         self.assertEqual(response.status_code, 403)
+
+
+class ReplicaRoutingTest(TestCase):
+    """
+    These tests check that catalog reads go to the replica database while
+    writes, and reads that follow a write, stay on the primary.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a vendor, a store and a product to browse.
+        """
+        self.router = PrimaryReplicaRouter()
+        self.vendor = User.objects.create_user(
+            email="vendor@test.com",
+            first_name="Vendor",
+            last_name="User",
+            password="vendorpass123"
+        )
+        self.store = Store.objects.create(
+            owner=self.vendor,
+            name="Test Store",
+            email="store@test.com",
+            phone_number="07777777777"
+        )
+        self.product = Product.objects.create(
+            store=self.store, name="Test Product")
+        Size.objects.create(product=self.product, small_price=10)
+
+    def test_router_reads(self):
+        """
+        Shop reads only use the replica inside read_from_replica(), and
+        never for users or sessions.
+        """
+        def route():
+            outside = self.router.db_for_read(Product)
+            with read_from_replica():
+                return (outside, self.router.db_for_read(Product),
+                        self.router.db_for_read(User))
+
+        # Run in a fresh context so writes in setUp don't pin the test
+        self.assertEqual(Context().run(route),
+                         ("default", "replica", "default"))
+
+    def test_write_pins_to_primary(self):
+        """
+        Once a request writes, its later reads go to the primary.
+        """
+        def route():
+            with read_from_replica():
+                self.router.db_for_write(Product)
+                return self.router.db_for_read(Product)
+
+        self.assertEqual(Context().run(route), "default")
+
+    def test_home_reads_from_replica(self):
+        """
+        Products on the home page are loaded from the replica.
+        """
+        response = self.client.get(reverse("shop:home"))
+        self.assertEqual(response.status_code, 200)
+        product = response.context["page_obj"][0]
+        self.assertEqual(product._state.db, "replica")
+
+    def test_pin_cookie_keeps_reads_on_primary(self):
+        """
+        A client holding the pin cookie reads from the primary.
+        """
+        self.client.cookies[PIN_COOKIE] = "1"
+        response = self.client.get(reverse("shop:home"))
+        product = response.context["page_obj"][0]
+        self.assertEqual(product._state.db, "default")
+
+    def test_write_sets_pin_cookie(self):
+        """
+        Writing a shop model sets the pin cookie for the next requests.
+        """
+        self.vendor.groups.add(Group.objects.create(name="Vendors"))
+        self.client.login(email="vendor@test.com", password="vendorpass123")
+        response = self.client.post(reverse("shop:add_store"), {
+            "name": "New Store",
+            "description": "Test new store",
+            "email": "newstore@test.com",
+            "phone_number": "07777777778"
+        })
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+class ConnectionReuseTest(TestCase):
+    """
+    Tests for persistent connection settings and connection recycling.
+    """
+
+    @override_settings(DB_CONN_MAX_AGE=60, WEB_WORKERS=40, WEB_THREADS=4,
+                       DB_MAX_CONNECTIONS=151)
+    def test_pool_size_warning(self):
+        """
+        Warn when workers x threads won't fit in max_connections.
+        """
+        warnings = connection_pool_size(None)
+        self.assertEqual([w.id for w in warnings], ["shop.W001"])
+
+    @override_settings(DB_CONN_MAX_AGE=0, WEB_WORKERS=40, WEB_THREADS=4)
+    def test_no_warning_without_reuse(self):
+        """
+        Connections closed after every request are not held per thread.
+        """
+        self.assertEqual(connection_pool_size(None), [])
+
+    def test_recycle_keeps_open_transaction(self):
+        """
+        Recycling never closes a connection inside an atomic block.
+        """
+        connection.ensure_connection()
+        recycle_connections()
+        self.assertIsNotNone(connection.connection)
+        self.assertTrue(connection.in_atomic_block)
+
+    def recycle_obsolete(self, max_age):
+        """
+        Recycle the connection outside a transaction once it has outlived
+        max_age, returning the mocked close().
+        """
+        connection.ensure_connection()
+        with mock.patch.dict(connection.settings_dict,
+                             {"CONN_MAX_AGE": max_age}), \
+                mock.patch.object(connection, "in_atomic_block", False), \
+                mock.patch.object(connection, "close_at", 0), \
+                mock.patch.object(connection, "close") as close:
+            recycle_connections()
+        return close
+
+    def test_recycle_closes_obsolete_connection(self):
+        """
+        A reused connection past CONN_MAX_AGE is closed.
+        """
+        self.recycle_obsolete(60).assert_called_once()
+
+    def test_recycle_keeps_connection_without_reuse(self):
+        """
+        With CONN_MAX_AGE 0, recycling keeps the same connection rather
+        than closing and reopening it mid-request.
+        """
+        connection.ensure_connection()
+        before = connection.connection
+        self.recycle_obsolete(0).assert_not_called()
+        self.assertIs(connection.connection, before)
+
+
+class TemplateWarmupTest(TestCase):
+    """
+    Tests for compiling templates ahead of the first request.
+    """
+
+    def test_warm_templates(self):
+        """
+        Every project template compiles, including the email templates.
+        """
+        names = template_names(engines["django"].engine)
+        self.assertIn("shop/home.html", names)
+        self.assertIn("shop/order_confirmation_email.txt", names)
+
+        compiled, errors = warm_templates()
+        self.assertEqual(errors, [])
+        self.assertEqual(compiled, len(names))
+
+
+class PurgeSessionsTest(TestCase):
+    """
+    Tests for the purge_sessions cleanup command.
+    """
+
+    def test_deletes_only_expired_sessions(self):
+        """
+        Expired sessions are removed in batches, live sessions are kept.
+        """
+        for i in range(5):
+            Session.objects.create(
+                session_key=f"expired{i}", session_data="",
+                expire_date=now() - timedelta(days=1))
+        Session.objects.create(
+            session_key="live", session_data="",
+            expire_date=now() + timedelta(days=7))
+
+        out = StringIO()
+        call_command("purge_sessions", batch_size=2, stdout=out)
+
+        self.assertIn("Deleted 5 expired sessions", out.getvalue())
+        self.assertEqual(
+            list(Session.objects.values_list("session_key", flat=True)),
+            ["live"])
+
+
+class PurgePendingCheckoutsTest(BuyerStoreMixin, TestCase):
+    """
+    Tests for the purge_pending_checkouts cleanup command.
+    """
+
+    def test_deletes_only_abandoned_checkouts(self):
+        """
+        Checkouts older than --days are removed in batches, newer ones are
+        kept.
+        """
+        for _ in range(5):
+            PendingCheckout.objects.create(user=self.user)
+        PendingCheckout.objects.update(created_at=now() - timedelta(days=8))
+        recent = PendingCheckout.objects.create(user=self.user)
+
+        out = StringIO()
+        call_command("purge_pending_checkouts", days=7, batch_size=2,
+                     stdout=out)
+
+        self.assertIn("Deleted 5 abandoned checkouts", out.getvalue())
+        self.assertEqual(list(PendingCheckout.objects.all()), [recent])
+
+
+class CategoryRegistryTest(TestCase):
+    """
+    Tests for the cached category registry and the categories context
+    processor.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Start from an empty cache with one category.
+        """
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nature = Category.objects.create(name="Nature")
+
+    def test_registry_loaded_once(self):
+        """
+        Once loaded, categories and slug lookups don't query the database.
+        """
+        get_categories()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_categories(), [self.nature])
+            self.assertEqual(get_category_by_slug("nature"), self.nature)
+            self.assertIsNone(get_category_by_slug("missing"))
+
+    def test_save_and_delete_invalidate(self):
+        """
+        Adding or deleting a category refreshes the registry.
+        """
+        get_categories()
+        with self.captureOnCommitCallbacks(execute=True):
+            city = Category.objects.create(name="City")
+        self.assertEqual(get_categories(), [city, self.nature])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            city.delete()
+        self.assertEqual(get_categories(), [self.nature])
+
+    def test_category_page_uses_registry(self):
+        """
+        The categories page renders from the registry without querying
+        categories.
+        """
+        get_categories()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("shop:category"))
+        self.assertContains(response, "Nature")
+
+    def test_unknown_category_slug(self):
+        """
+        An unknown category slug returns 404.
+        """
+        response = self.client.get(
+            reverse("shop:category_detail", args=["missing"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_categories_api_uses_registry(self):
+        """
+        get/categories lists the categories from the registry.
+        """
+        get_categories()
+        response = self.client.get("/get/categories")
+        self.assertEqual([category["name"] for category in response.json()],
+                         ["Nature"])
+
+
+class ProductDetailQueriesTest(TestCase):
+    """
+    Tests that the product detail page uses a fixed number of queries
+    however many reviews a product has, and is served from the page cache
+    until the product, its sizes or its reviews change.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a product with sizes, a category and 45 reviews.
+        """
+        cache.clear()
+        self.vendor = User.objects.create_user(
+            email="vendor@test.com",
+            first_name="Vendor",
+            last_name="User",
+            password="vendorpass123"
+        )
+        self.store = Store.objects.create(
+            owner=self.vendor,
+            name="Test Store",
+            email="store@test.com",
+            phone_number="07777777777"
+        )
+        self.product = Product.objects.create(
+            store=self.store, name="Test Product",
+            category=Category.objects.create(name="Nature"))
+        self.sizes = Size.objects.create(product=self.product, small_price=10,
+                                         medium_price=20, large_price=30)
+
+        self.reviewers = []
+        for i in range(45):
+            reviewer = User.objects.create_user(
+                email=f"reviewer{i}@test.com",
+                first_name="Reviewer",
+                last_name=str(i),
+                password="reviewerpass123"
+            )
+            Review.objects.create(product=self.product, user=reviewer,
+                                  rating=4, created_at=now() +
+                                  timedelta(minutes=i))
+            self.reviewers.append(reviewer)
+        self.url = reverse("shop:product_detail", args=[self.product.id])
+
+    def test_cache_miss_query_count(self):
+        """
+        Product, review count and one page of reviews with their users,
+        loaded from the primary on a cache miss, after the ETag stamps.
+        """
+        with self.assertNumQueries(3), \
+                self.assertNumQueries(1, using="replica"):
+            response = self.client.get(self.url)
+        self.assertContains(response, "data-review-id", count=20)
+        self.assertContains(response, "Reviewer 0")
+
+    def test_cache_hit_query_count(self):
+        """
+        A cached page is served with only the ETag stamps' query for
+        anonymous users.
+        """
+        self.client.get(self.url)
+        with self.assertNumQueries(0), \
+                self.assertNumQueries(1, using="replica"):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Reviewer 0")
+
+    def test_user_review_overlay(self):
+        """
+        A logged in user's review and purchase badge are one query each on
+        top of the cached page.
+        """
+        self.client.get(self.url)
+        self.client.force_login(self.reviewers[44])
+        # Session, user and the navbar's vendor check from the primary
+        with self.assertNumQueries(3), \
+                self.assertNumQueries(3, using="replica"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context["user_review"].user,
+                         self.reviewers[44])
+        self.assertContains(response, "Your Review")
+
+    def test_changes_invalidate_page(self):
+        """
+        Changing the product, its sizes or its reviews refreshes the page.
+        """
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Renamed Product"
+            self.product.save()
+        self.assertContains(self.client.get(self.url), "Renamed Product")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sizes.medium_price = 25
+            self.sizes.save()
+        self.assertContains(self.client.get(self.url), "25.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.filter(user=self.reviewers[0]).get().delete()
+        self.assertNotContains(self.client.get(self.url), "Reviewer 0<")
+
+
+class ConditionalGetTest(TestCase):
+    """
+    Tests for ETag and Last-Modified handling on catalog pages and APIs.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a product with sizes in a category.
+        """
+        cache.clear()
+        self.vendor = User.objects.create_user(
+            email="vendor@test.com",
+            first_name="Vendor",
+            last_name="User",
+            password="vendorpass123"
+        )
+        self.store = Store.objects.create(
+            owner=self.vendor,
+            name="Test Store",
+            email="store@test.com",
+            phone_number="07777777777"
+        )
+        self.product = Product.objects.create(
+            store=self.store, name="Test Product",
+            category=Category.objects.create(name="Nature"))
+        Size.objects.create(product=self.product, small_price=10,
+                            medium_price=20, large_price=30)
+        self.url = reverse("shop:product_detail", args=[self.product.id])
+
+    def test_api_not_modified(self):
+        """
+        A repeat request with the ETag or Last-Modified gets a 304 until
+        a category is added.
+        """
+        response = self.client.get("/get/categories")
+        self.assertEqual(response.json(), [{"name": "Nature",
+                                            "slug": "nature"}])
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(
+            "/get/categories", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(
+            "/get/categories",
+            HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code,
+            304)
+
+        Category.objects.create(name="City")
+        self.assertEqual(self.client.get(
+            "/get/categories", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_product_page_not_modified(self):
+        """
+        The product page is 304 without running the view until a review
+        is added.
+        """
+        # The first response sets the CSRF cookie, which is in the ETag
+        self.client.get(self.url)
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(0), \
+                self.assertNumQueries(1, using="replica"):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Review.objects.create(product=self.product, user=self.vendor,
+                              rating=5)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_product_page_stamps_recommendations_and_purchases(self):
+        """
+        Refreshed recommendations and the user buying the product change
+        the product page's ETag.
+        """
+        self.client.force_login(self.vendor)
+        self.client.get(self.url)
+        etag = self.client.get(self.url)["ETag"]
+
+        ProductRecommendations.objects.create(
+            product=self.product, product_ids=[], updated_at=now())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response["ETag"]
+        record_purchases(self.vendor, [self.product.id])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_owner_name_changes_stores_etag(self):
+        """
+        Renaming a store owner changes the get/stores ETag, other saves of
+        the user don't touch their stores.
+        """
+        etag = self.client.get("/get/stores")["ETag"]
+        self.vendor.save()
+        self.assertEqual(self.client.get(
+            "/get/stores", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.vendor.full_name = "Renamed Vendor"
+        self.vendor.save()
+        response = self.client.get("/get/stores", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # get/stores shows the first and last names, which leave the full
+        # name as it was
+        self.vendor.first_name = "Renamed"
+        self.vendor.save()
+        response = self.client.get("/get/stores",
+                                   HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'"owner_name": "Renamed User"',
+                      b"".join(response.streaming_content))
+
+    def test_product_delete_skips_touching_product(self):
+        """
+        Deleting a product doesn't touch it again for each size and review
+        deleted with it.
+        """
+        Review.objects.create(product=self.product, user=self.vendor,
+                              rating=5)
+        with CaptureQueriesContext(connection) as queries:
+            self.store.delete()
+        self.assertFalse([query for query in queries
+                          if query["sql"].startswith('UPDATE "shop_product"')])
+
+    def test_pages_vary_by_user(self):
+        """
+        HTML pages have a different ETag once logged in and no
+        Last-Modified.
+        """
+        response = self.client.get(reverse("shop:home"))
+        self.assertNotIn("Last-Modified", response)
+        self.client.force_login(self.vendor)
+        response = self.client.get(reverse("shop:home"),
+                                   HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+
+class StoresApiTest(TestCase):
+    """
+    Tests for the get/stores API.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create three vendors with two stores each, one of them closed.
+        """
+        self.vendors = []
+        for name in ["Carol", "Alice", "Bob"]:
+            vendor = User.objects.create_user(
+                email=f"{name.lower()}@test.com",
+                first_name=name,
+                last_name="Vendor",
+                password="vendorpass123"
+            )
+            for i in range(2):
+                Store.objects.create(
+                    owner=vendor, name=f"{name} Store {i}",
+                    email=f"{name.lower()}{i}@test.com",
+                    phone_number="07777777777", is_active=i == 0)
+            self.vendors.append(vendor)
+
+    def get_json(self, url):
+        """
+        Request url and return (decoded streamed JSON, response).
+        """
+        response = self.client.get(url)
+        content = b"".join(response.streaming_content)
+        return json.loads(content), response
+
+    def test_grouped_in_one_query(self):
+        """
+        Stores are read in one query, after the ETag stamp, and grouped
+        by owner name.
+        """
+        with self.assertNumQueries(0), \
+                self.assertNumQueries(2, using="replica"):
+            data, response = self.get_json("/get/stores")
+        self.assertEqual([group["owner_name"] for group in data],
+                         ["Alice Vendor", "Bob Vendor", "Carol Vendor"])
+        self.assertEqual([store["name"] for store in data[0]["stores"]],
+                         ["Alice Store 0", "Alice Store 1"])
+
+    def test_active_filter(self):
+        """
+        active=true lists only active stores.
+        """
+        data, response = self.get_json("/get/stores?active=true")
+        self.assertEqual([len(group["stores"]) for group in data], [1, 1, 1])
+        self.assertTrue(all(group["stores"][0]["is_active"]
+                            for group in data))
+
+    def test_cursor_pagination(self):
+        """
+        Following the Link headers returns every store once.
+        """
+        url, names = "/get/stores?limit=4", []
+        while url:
+            data, response = self.get_json(url)
+            names += [store["name"] for group in data
+                      for store in group["stores"]]
+            link = response.get("Link")
+            url = link[1:link.index(">")] if link else None
+        self.assertEqual(len(names), 6)
+        self.assertEqual(names[3:5], ["Bob Store 1", "Carol Store 0"])
+
+    def test_invalid_parameters(self):
+        """
+        A bad limit or cursor returns 400.
+        """
+        self.assertEqual(
+            self.client.get("/get/stores?limit=0").status_code, 400)
+        self.assertEqual(
+            self.client.get("/get/stores?cursor=bad").status_code, 400)
+        cursor = base64.urlsafe_b64encode(b'["a", "x", 1]').decode()
+        self.assertEqual(self.client.get(
+            f"/get/stores?cursor={cursor}").status_code, 400)
+
+
+class CatalogApiTest(TestCase):
+    """
+    Tests for the get/products catalog API.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create two stores with priced products in two categories, an
+        archived product and one without sizes.
+        """
+        self.vendor = User.objects.create_user(
+            email="vendor@test.com",
+            first_name="Vendor",
+            last_name="User",
+            password="vendorpass123"
+        )
+        nature = Category.objects.create(name="Nature")
+        city = Category.objects.create(name="City")
+        self.stores = [Store.objects.create(
+            owner=self.vendor, name=f"Store {i}", email="store@test.com",
+            phone_number="07777777777") for i in range(2)]
+        for i, price in enumerate([10, 20, 30, 40]):
+            product = Product.objects.create(
+                store=self.stores[i % 2], name=f"Print {i}",
+                category=nature if i < 2 else city)
+            Size.objects.create(product=product, small_price=None,
+                                medium_price=price, large_price=price + 5)
+        Product.objects.create(store=self.stores[0], name="Unpriced")
+        Product.objects.create(store=self.stores[0], name="Archived",
+                               is_active=False)
+
+    def get_names(self, url):
+        """
+        Request url and return the product names.
+        """
+        return [product["name"] for product in self.client.get(url).json()]
+
+    def test_one_query(self):
+        """
+        Products and their sizes are read in one query after the ETag
+        stamp.
+        """
+        with self.assertNumQueries(0), \
+                self.assertNumQueries(2, using="replica"):
+            data = self.client.get("/get/products").json()
+        self.assertEqual(len(data), 5)
+        self.assertEqual(data[0]["sizes"]["medium_price"], "10.00")
+        self.assertIsNone(data[4]["sizes"])
+
+    def test_filters(self):
+        """
+        Store, category, price range and active filters.
+        """
+        self.assertEqual(
+            self.get_names(f"/get/products?store={self.stores[1].id}"),
+            ["Print 1", "Print 3"])
+        self.assertEqual(self.get_names("/get/products?category=city"),
+                         ["Print 2", "Print 3"])
+        self.assertEqual(
+            self.get_names("/get/products?min_price=15&max_price=30"),
+            ["Print 1", "Print 2"])
+        self.assertEqual(self.get_names("/get/products?active=false"),
+                         ["Archived"])
+
+    def test_fields_and_pagination(self):
+        """
+        fields limits the keys returned and Link headers page through
+        every product.
+        """
+        response = self.client.get("/get/products?fields=id,name&limit=2")
+        self.assertEqual(set(response.json()[0]), {"id", "name"})
+        names = []
+        while response:
+            names += [product["name"] for product in response.json()]
+            link = response.get("Link")
+            response = self.client.get(link[1:link.index(">")]) \
+                if link else None
+        self.assertEqual(len(names), 5)
+
+    def test_invalid_parameters(self):
+        """
+        Unknown fields and bad filter values return 400.
+        """
+        cursor = base64.urlsafe_b64encode(b'["abc"]').decode()
+        for query in ["fields=name,secret", "min_price=cheap", "store=x",
+                      "active=maybe", "min_price=NaN", "max_price=Infinity",
+                      f"cursor={cursor}"]:
+            self.assertEqual(self.client.get(
+                f"/get/products?{query}").status_code, 400)
+
+
+class ReviewsApiTest(TestCase):
+    """
+    Tests for the get/reviews vendor API.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a vendor with two reviewed products, and a review of
+        another vendor's product.
+        """
+        self.vendor = User.objects.create_user(
+            email="vendor@test.com",
+            first_name="Vendor",
+            last_name="User",
+            password="vendorpass123"
+        )
+        other = User.objects.create_user(
+            email="other@test.com",
+            first_name="Other",
+            last_name="Vendor",
+            password="otherpass123"
+        )
+        store = Store.objects.create(
+            owner=self.vendor, name="Test Store", email="store@test.com",
+            phone_number="07777777777")
+        other_store = Store.objects.create(
+            owner=other, name="Other Store", email="other@test.com",
+            phone_number="07777777777")
+        lake = Product.objects.create(store=store, name="Lake")
+        hill = Product.objects.create(store=store, name="Hill")
+        elsewhere = Product.objects.create(store=other_store, name="Elsewhere")
+
+        start = now() - timedelta(days=10)
+        for i, (product, rating) in enumerate([
+                (lake, 5), (lake, 4), (lake, 3), (hill, 5), (elsewhere, 1)]):
+            reviewer = User.objects.create_user(
+                email=f"reviewer{i}@test.com",
+                first_name="Reviewer",
+                last_name=str(i),
+                password="reviewerpass123"
+            )
+            Review.objects.create(product=product, user=reviewer,
+                                  rating=rating, verified=i == 0,
+                                  created_at=start + timedelta(days=i))
+        self.start = start
+        credentials = base64.b64encode(b"vendor@test.com:vendorpass123")
+        self.auth = {"HTTP_AUTHORIZATION": f"Basic {credentials.decode()}"}
+
+    def test_reviews_and_summary(self):
+        """
+        Reviews come newest first with their product and store, the
+        summary has one row per product, in two replica queries.
+        """
+        with self.assertNumQueries(2, using="replica"):
+            data = self.client.get("/get/reviews", **self.auth).json()
+        self.assertEqual([review["product_name"]
+                          for review in data["reviews"]],
+                         ["Hill", "Lake", "Lake", "Lake"])
+        self.assertEqual(data["reviews"][0]["store_name"], "Test Store")
+        self.assertEqual(data["summary"], [
+            {"product_id": data["summary"][0]["product_id"],
+             "product_name": "Hill", "reviews": 1, "average_rating": 5.0,
+             "verified": 0},
+            {"product_id": data["summary"][1]["product_id"],
+             "product_name": "Lake", "reviews": 3, "average_rating": 4.0,
+             "verified": 1},
+        ])
+
+    def test_filters_and_pagination(self):
+        """
+        Rating and date filters apply to the reviews and the summary, and
+        Link headers page through the reviews.
+        """
+        data = self.client.get("/get/reviews?rating=5", **self.auth).json()
+        self.assertEqual(len(data["reviews"]), 2)
+        since = (self.start + timedelta(days=2)).date().isoformat()
+        data = self.client.get(f"/get/reviews?since={since}",
+                               **self.auth).json()
+        self.assertEqual([row["reviews"] for row in data["summary"]], [1, 1])
+
+        response = self.client.get("/get/reviews?limit=3", **self.auth)
+        self.assertEqual(len(response.json()["reviews"]), 3)
+        link = response["Link"]
+        response = self.client.get(link[1:link.index(">")], **self.auth)
+        self.assertEqual([review["rating"]
+                          for review in response.json()["reviews"]], [5])
+        self.assertNotIn("Link", response)
+
+    def test_invalid_parameters(self):
+        """
+        Bad ratings, dates and cursors return 400.
+        """
+        cursors = [base64.urlsafe_b64encode(json.dumps(cursor).encode())
+                   .decode() for cursor in [
+                       ["yesterday", 1], [20240101, 1],
+                       ["2024-13-01T00:00:00+00:00", 1],
+                       ["2024-01-01T00:00:00+00:00", "1"]]]
+        for query in ["rating=6", "since=yesterday", "cursor=bad",
+                      *[f"cursor={cursor}" for cursor in cursors]]:
+            self.assertEqual(self.client.get(
+                f"/get/reviews?{query}", **self.auth).status_code, 400)
+
+
+def png_bytes():
+    """
+    Returns a tiny PNG image.
+    """
+    image = BytesIO()
+    Image.new("RGB", (2, 2)).save(image, "PNG")
+    return image.getvalue()
+
+
+class CatalogImportTest(TestCase):
+    """
+    Tests for the bulk product import API and management command.
+    """
+    def setUp(self):
+        """
+        Create a vendor's store and a temporary media directory.
+        """
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.vendor = User.objects.create_user(
+            email="vendor@test.com",
+            first_name="Vendor",
+            last_name="User",
+            password="vendorpass123"
+        )
+        self.store = Store.objects.create(
+            owner=self.vendor, name="Test Store", email="store@test.com",
+            phone_number="07777777777")
+        Product.objects.create(store=self.store, name="Existing")
+        credentials = base64.b64encode(b"vendor@test.com:vendorpass123")
+        self.auth = {"HTTP_AUTHORIZATION": f"Basic {credentials.decode()}"}
+
+    def test_api_import_with_report(self):
+        """
+        Valid rows are imported with their sizes and new categories,
+        invalid rows are reported by row number.
+        """
+        csv_file = SimpleUploadedFile("prints.csv", (
+            "name,description,category,image,small_price,medium_price,"
+            "large_price\n"
+            "Lake,Calm,Water,lake.png,10,20,30\n"
+            "Existing,,,lake.png,10,,\n"
+            "Hill,,,missing.png,10,,\n"
+            "Cliff,,,lake.png,,,\n").encode())
+        images = BytesIO()
+        with zipfile.ZipFile(images, "w") as archive:
+            archive.writestr("lake.png", png_bytes())
+        images = SimpleUploadedFile("images.zip", images.getvalue())
+
+        response = self.client.post("/post/products", {
+            "store": self.store.id, "file": csv_file, "images": images,
+        }, **self.auth)
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual(report["created"], 1)
+        self.assertEqual([error["row"] for error in report["errors"]],
+                         [2, 3, 4])
+        self.assertIn("name", report["errors"][0]["errors"])
+        self.assertIn("image", report["errors"][1]["errors"])
+
+        product = Product.objects.get(name="Lake")
+        self.assertEqual(product.category.name, "Water")
+        self.assertEqual(product.sizes.large_price, 30)
+        self.assertTrue(product.image.storage.exists(product.image.name))
+
+    def test_api_other_vendors_store(self):
+        """
+        Vendors can only import into their own stores.
+        """
+        other = User.objects.create_user(
+            email="other@test.com", first_name="Other", last_name="Vendor",
+            password="otherpass123")
+        store = Store.objects.create(
+            owner=other, name="Other Store", email="other@test.com",
+            phone_number="07777777777")
+        response = self.client.post("/post/products", {
+            "store": store.id,
+            "file": SimpleUploadedFile("prints.csv", b"name\n"),
+        }, **self.auth)
+        self.assertEqual(response.status_code, 403)
+
+    def test_command_import_in_batches(self):
+        """
+        The command imports NDJSON rows in batches with images from a
+        directory, skipping lines that aren't JSON objects.
+        """
+        images = tempfile.TemporaryDirectory()
+        self.addCleanup(images.cleanup)
+        with open(os.path.join(images.name, "print.png"), "wb") as image:
+            image.write(png_bytes())
+        rows = tempfile.NamedTemporaryFile("w", suffix=".ndjson",
+                                           delete=False)
+        self.addCleanup(os.remove, rows.name)
+        with rows:
+            for i in range(3):
+                rows.write(json.dumps({
+                    "name": f"Print {i}", "category": "Nature",
+                    "image": "print.png", "medium_price": "25.00"}) + "\n")
+            rows.write("not json\n")
+            rows.write(json.dumps({"name": "Escape", "image": "../x.png",
+                                   "small_price": 1}) + "\n")
+
+        out, err = StringIO(), StringIO()
+        call_command("import_products", self.store.id, rows.name,
+                     images=images.name, batch_size=2, stdout=out, stderr=err)
+        self.assertIn("Imported 3 products", out.getvalue())
+        self.assertIn("Row 4:", err.getvalue())
+        self.assertIn("Row 5:", err.getvalue())
+        self.assertEqual(Size.objects.filter(
+            product__store=self.store, medium_price=25).count(), 3)
+        self.assertEqual(Category.objects.filter(name="Nature").count(), 1)
+
+    def test_import_refreshes_listings(self):
+        """
+        Imported products show in the facet and suggestion indexes, and a
+        category name whose slug is taken goes in that category.
+        """
+        cache.clear()
+        black_white = Category.objects.create(name="Black & White")
+        get_facet_index(), get_suggestion_index()
+        images = tempfile.TemporaryDirectory()
+        self.addCleanup(images.cleanup)
+        with open(os.path.join(images.name, "print.png"), "wb") as image:
+            image.write(png_bytes())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report = CatalogImport(self.store, ImageSource(images.name)).run([
+                {"name": "Misty Forest", "category": "Black White",
+                 "image": "print.png", "small_price": "10"}])
+        self.assertEqual(report, {"created": 1, "errors": []})
+        product = Product.objects.get(name="Misty Forest")
+        self.assertEqual(product.category, black_white)
+        self.assertEqual([suggestion["name"] for suggestion in
+                          get_suggestion_index().suggest("misty", 8)],
+                         ["Misty Forest"])
+        self.assertEqual(get_facet_index().counts(
+            {"category": black_white.id, "price": None, "rating": None}
+        )["category"], {black_white.id: 1})
+
+
+class RepriceTest(TestCase):
+    """
+    Tests for bulk price changes on a vendor's store.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a vendor with priced products in two categories, and another
+        store whose prices must not change.
+        """
+        cache.clear()
+        self.vendor = User.objects.create_user(
+            email="vendor@test.com",
+            first_name="Vendor",
+            last_name="User",
+            password="vendorpass123"
+        )
+        self.vendor.groups.add(Group.objects.create(name="Vendors"))
+        self.store = Store.objects.create(
+            owner=self.vendor, name="Test Store", email="store@test.com",
+            phone_number="07777777777")
+        other_store = Store.objects.create(
+            owner=self.vendor, name="Other Store", email="other@test.com",
+            phone_number="07777777777")
+        nature = Category.objects.create(name="Nature")
+        self.products = []
+        for i, category in enumerate([nature, nature, None]):
+            product = Product.objects.create(
+                store=self.store, name=f"Print {i}", category=category)
+            Size.objects.create(product=product, small_price=None,
+                                medium_price=20 + i, large_price=30)
+            self.products.append(product)
+        self.other = Product.objects.create(store=other_store, name="Other")
+        Size.objects.create(product=self.other, medium_price=20)
+        self.url = reverse("shop:reprice_products", args=[self.store.id])
+        self.client.force_login(self.vendor)
+
+    def test_preview_changes_nothing(self):
+        """
+        The preview shows current and new prices without saving.
+        """
+        response = self.client.post(self.url, {
+            "mode": "percent", "value": "10", "category": "",
+            "preview": ""})
+        preview = response.context["preview"]
+        self.assertEqual(preview["count"], 3)
+        self.assertEqual(preview["prices"]["medium_price"]["max"], 22)
+        self.assertEqual(preview["prices"]["medium_price"]["new_max"],
+                         Decimal("24.20"))
+        self.assertIsNone(preview["prices"]["small_price"]["new_max"])
+        self.assertEqual(Size.objects.filter(medium_price=22).count(), 1)
+        self.assertFalse(PriceChange.objects.exists())
+
+    def test_apply_in_one_update(self):
+        """
+        Applying updates every size in scope with one UPDATE, rounds to
+        pence, logs the change and refreshes cached product pages.
+        """
+        page = reverse("shop:product_detail", args=[self.products[0].id])
+        self.client.get(page)
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {
+                "mode": "percent", "value": "-12.5", "apply": ""})
+        self.assertEqual(len([query for query in queries
+                              if query["sql"].startswith(
+                                  'UPDATE "shop_size"')]), 1)
+
+        self.assertEqual(
+            [size.medium_price for size in
+             Size.objects.filter(product__store=self.store)
+             .order_by("product_id")],
+            [Decimal("17.50"), Decimal("18.38"), Decimal("19.25")])
+        self.assertEqual(self.other.sizes.medium_price, 20)
+        change = PriceChange.objects.get()
+        self.assertEqual((change.sizes_updated, change.user),
+                         (3, self.vendor))
+        self.assertContains(self.client.get(page), "17.50")
+
+    def test_selected_products_and_floor(self):
+        """
+        A change can be limited to selected products, and never takes a
+        price below zero.
+        """
+        self.client.post(self.url, {
+            "mode": "amount", "value": "-25", "apply": "",
+            "products": [self.products[0].id, self.products[2].id]})
+        sizes = {size.product_id: size for size in Size.objects.all()}
+        self.assertEqual(sizes[self.products[0].id].medium_price, 0)
+        self.assertEqual(sizes[self.products[0].id].large_price, 5)
+        self.assertEqual(sizes[self.products[1].id].medium_price, 21)
+        self.assertEqual(PriceChange.objects.get().product_ids,
+                         sorted([self.products[0].id, self.products[2].id]))
+
+    def test_price_limits(self):
+        """
+        Values out of bounds, or that would take a price beyond what the
+        price fields hold, are refused without changing anything.
+        """
+        for value in ["999999", "1001"]:
+            response = self.client.post(self.url, {
+                "mode": "percent", "value": value, "apply": ""})
+            self.assertFalse(response.context["form"].is_valid())
+
+        Size.objects.filter(product=self.products[0]).update(
+            large_price=Decimal("999990"))
+        response = self.client.post(self.url, {
+            "mode": "amount", "value": "100", "apply": ""})
+        self.assertIn("value", response.context["form"].errors)
+        self.assertEqual(Size.objects.get(product=self.products[0])
+                         .large_price, Decimal("999990"))
+        self.assertFalse(PriceChange.objects.exists())
+
+    def test_other_stores_products_rejected(self):
+        """
+        Products from another store can't be selected.
+        """
+        response = self.client.post(self.url, {
+            "mode": "amount", "value": "1", "apply": "",
+            "products": [self.other.id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("products", response.context["form"].errors)
+        self.assertFalse(PriceChange.objects.exists())
+
+
+class BulkProductActionsTest(TestCase):
+    """
+    Tests for archiving and unarchiving many products at once, and for
+    closing a store together with its products.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a vendor with products in two categories.
+        """
+        cache.clear()
+        self.vendor = User.objects.create_user(
+            email="vendor@test.com",
+            first_name="Vendor",
+            last_name="User",
+            password="vendorpass123"
+        )
+        self.vendor.groups.add(Group.objects.create(name="Vendors"))
+        self.store = Store.objects.create(
+            owner=self.vendor, name="Test Store", email="store@test.com",
+            phone_number="07777777777")
+        self.nature = Category.objects.create(name="Nature")
+        city = Category.objects.create(name="City")
+        self.products = [
+            Product.objects.create(store=self.store, name=f"Print {i}",
+                                   category=category)
+            for i, category in enumerate([self.nature, self.nature, city])]
+        self.url = reverse("shop:bulk_products", args=[self.store.id])
+        self.client.force_login(self.vendor)
+
+    def active(self):
+        """
+        Return the names of the store's active products.
+        """
+        return list(self.store.products.filter(is_active=True)
+                    .order_by("name").values_list("name", flat=True))
+
+    def test_archive_selected_in_one_update(self):
+        """
+        Only the selected products are archived, with one UPDATE, and the
+        cached product pages are refreshed once.
+        """
+        version = get_version("catalog")
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {
+                "action": "archive",
+                "products": [self.products[0].id, self.products[2].id]})
+        self.assertEqual(len([query for query in queries
+                              if query["sql"].startswith(
+                                  'UPDATE "shop_product"')]), 1)
+        self.assertEqual(self.active(), ["Print 1"])
+        self.assertNotEqual(get_version("catalog"), version)
+
+        self.client.post(self.url, {
+            "action": "unarchive", "products": [self.products[2].id]})
+        self.assertEqual(self.active(), ["Print 1", "Print 2"])
+
+    def test_archive_category(self):
+        """
+        Every product in the chosen category is archived.
+        """
+        self.client.post(self.url, {
+            "action": "archive_category", "category": self.nature.id})
+        self.assertEqual(self.active(), ["Print 2"])
+
+    def test_reprice_selected(self):
+        """
+        Changing prices passes the selection on to the price change page.
+        """
+        response = self.client.post(self.url, {
+            "action": "reprice", "products": [self.products[1].id]})
+        self.assertRedirects(
+            response, reverse("shop:reprice_products", args=[self.store.id])
+            + f"?products={self.products[1].id}")
+
+    def test_close_store_with_products(self):
+        """
+        Closing a store can archive all of its products too.
+        """
+        self.client.post(reverse("shop:close_store", args=[self.store.id]),
+                         {"archive_products": "on"})
+        self.store.refresh_from_db()
+        self.assertFalse(self.store.is_active)
+        self.assertEqual(self.active(), [])
+
+        self.client.post(reverse("shop:reopen_store", args=[self.store.id]))
+        self.store.refresh_from_db()
+        self.assertTrue(self.store.is_active)
+
+
+class PurchaseTest(BuyerStoreMixin, TestCase):
+    """
+    Tests for the purchase index behind verified reviews and the "you
+    bought this" badge.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a buyer, a product they ordered and one they didn't.
+        """
+        super().setUp()
+        self.bought = Product.objects.create(store=self.store, name="Bought")
+        self.other = Product.objects.create(store=self.store, name="Other")
+        for product in [self.bought, self.other]:
+            Size.objects.create(product=product, medium_price=20)
+        order = Order.objects.create(user=self.user, total=40)
+        for size in ["S", "M"]:
+            OrderItem.objects.create(order=order, product=self.bought,
+                                     size=size, frame_colour="black",
+                                     price=20)
+        self.client.force_login(self.user)
+
+    def test_backfill_from_orders(self):
+        """
+        The backfill records one purchase per user and product, and can be
+        run again.
+        """
+        call_command("backfill_purchases", stdout=StringIO())
+        call_command("backfill_purchases", stdout=StringIO())
+        self.assertEqual(
+            list(Purchase.objects.values_list("user", "product")),
+            [(self.user.id, self.bought.id)])
+
+    def test_probe_is_one_query(self):
+        """
+        Checking a purchase is one query with no join.
+        """
+        record_purchases(self.user, [self.bought.id, self.bought.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(has_purchased(self.user, self.bought.id))
+            self.assertFalse(has_purchased(self.user, self.other.id))
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("JOIN", queries[0]["sql"])
+
+    def test_verified_review_and_badge(self):
+        """
+        Reviews of bought products are verified and their pages show the
+        badge, other products don't.
+        """
+        record_purchases(self.user, [self.bought.id])
+        for product in [self.bought, self.other]:
+            self.client.post(
+                reverse("shop:add_review", args=[product.id]),
+                {"rating": 5, "comment": "Lovely"})
+        self.assertEqual(
+            dict(Review.objects.values_list("product", "verified")),
+            {self.bought.id: True, self.other.id: False})
+        self.assertContains(self.client.get(reverse(
+            "shop:product_detail", args=[self.bought.id])), "You bought this")
+        self.assertNotContains(self.client.get(reverse(
+            "shop:product_detail", args=[self.other.id])), "You bought this")
+
+
+class RatingStatsTest(TestCase):
+    """
+    Tests for the per-product rating stats kept up to date from reviews.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a product and three reviewers.
+        """
+        cache.clear()
+        self.users = [User.objects.create_user(
+            email=f"user{i}@test.com",
+            first_name="User",
+            last_name=str(i),
+            password="userpass123"
+        ) for i in range(3)]
+        store = Store.objects.create(
+            owner=self.users[0], name="Test Store", email="store@test.com",
+            phone_number="07777777777")
+        self.product = Product.objects.create(store=store, name="Print")
+        Size.objects.create(product=self.product, medium_price=20)
+
+    def stats(self):
+        """
+        Return the product's stats counters.
+        """
+        stats = ProductRatingStats.objects.get(product=self.product)
+        return {field: getattr(stats, field) for field in STATS_FIELDS}
+
+    def assertStatsMatchReviews(self):
+        """
+        Assert the stats equal a fresh aggregate of the product's reviews.
+        """
+        self.assertEqual(
+            self.stats(), rating_totals(Review.objects.all())[self.product.id])
+
+    def test_create_edit_delete(self):
+        """
+        Stats follow reviews as they are added, edited and deleted.
+        """
+        reviews = [Review.objects.create(product=self.product, user=user,
+                                         rating=rating, verified=verified)
+                   for user, rating, verified in zip(
+                       self.users, [5, 4, 2], [True, False, True])]
+        self.assertStatsMatchReviews()
+        self.assertEqual(self.stats()["stars_4"], 1)
+
+        review = Review.objects.get(pk=reviews[0].pk)
+        review.rating = 1
+        review.save()
+        self.assertStatsMatchReviews()
+        self.assertEqual(self.stats()["verified_sum"], 3)
+
+        reviews[1].delete()
+        self.assertStatsMatchReviews()
+        stats = ProductRatingStats.objects.get(product=self.product)
+        self.assertEqual(stats.average_rating, 1.5)
+        self.assertEqual([row["count"] for row in stats.histogram()],
+                         [0, 0, 0, 1, 1])
+
+    def test_delete_deferred_review(self):
+        """
+        Deleting a review loaded without its rating recounts the stats.
+        """
+        for user, rating in zip(self.users, [5, 3]):
+            Review.objects.create(product=self.product, user=user,
+                                  rating=rating)
+        Review.objects.only("pk", "product").get(user=self.users[0]).delete()
+        self.assertStatsMatchReviews()
+        self.assertEqual(self.stats()["review_count"], 1)
+
+    def test_histogram_on_page(self):
+        """
+        The product page shows the average and a bar per rating.
+        """
+        for user, rating in zip(self.users, [5, 5, 2]):
+            Review.objects.create(product=self.product, user=user,
+                                  rating=rating, verified=rating == 5)
+        response = self.client.get(
+            reverse("shop:product_detail", args=[self.product.id]))
+        self.assertContains(response, "4.0/5 from 3 reviews")
+        self.assertContains(response, "5.0/5 from 2 verified purchases")
+        self.assertContains(response, 'style="width: 67%;"')
+
+    def test_reconcile_fixes_drift(self):
+        """
+        Reconciling fixes stats changed behind the signals' back and
+        creates missing ones.
+        """
+        for user, rating in zip(self.users, [3, 4, 5]):
+            Review.objects.create(product=self.product, user=user,
+                                  rating=rating)
+        Review.objects.filter(rating=3).update(rating=1)
+        out = StringIO()
+        call_command("reconcile_rating_stats", stdout=out)
+        self.assertIn("fixed 1 and created 0", out.getvalue())
+        self.assertStatsMatchReviews()
+
+        ProductRatingStats.objects.all().delete()
+        call_command("reconcile_rating_stats", stdout=StringIO())
+        self.assertStatsMatchReviews()
+
+
+class RankingTest(TestCase):
+    """
+    Tests for the precomputed rankings behind the home page's sort modes.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create three products: "Loved" with several good reviews, "Lucky"
+        with one perfect review and a recent sale, and "Classic" with one
+        poor review and many sales two months ago.
+        """
+        users = [User.objects.create_user(
+            email=f"user{i}@test.com",
+            first_name="User",
+            last_name=str(i),
+            password="userpass123"
+        ) for i in range(3)]
+        store = Store.objects.create(
+            owner=users[0], name="Test Store", email="store@test.com",
+            phone_number="07777777777")
+        self.products = {}
+        for name, ratings in [("Classic", [1]), ("Loved", [5, 5, 4]),
+                              ("Lucky", [5])]:
+            product = Product.objects.create(store=store, name=name)
+            Size.objects.create(product=product, small_price=10)
+            for user, rating in zip(users, ratings):
+                Review.objects.create(product=product, user=user,
+                                      rating=rating)
+            self.products[name] = product
+        self.user = users[0]
+        self.order("Classic", 10, timedelta(days=60))
+        self.order("Lucky", 2, timedelta(days=1))
+
+    def order(self, name, quantity, age):
+        """
+        Create an order of quantity units of a product, age ago.
+        """
+        order = Order.objects.create(user=self.user, total=0)
+        Order.objects.filter(pk=order.pk).update(created_at=now() - age)
+        OrderItem.objects.create(order=order, product=self.products[name],
+                                 size="S", frame_colour="black", price=10,
+                                 quantity=quantity)
+
+    def ranked(self, sort):
+        """
+        Return product names in the home page's order for sort.
+        """
+        response = self.client.get(reverse("shop:home"), {"sort": sort})
+        return [product.name for product in response.context["page_obj"]]
+
+    def test_sort_modes(self):
+        """
+        Best rated weighs review counts, best selling counts units and
+        trending favours recent sales.
+        """
+        refresh_rankings(full=True)
+        self.assertEqual(self.ranked("rated"), ["Loved", "Lucky", "Classic"])
+        self.assertEqual(self.ranked("bestselling")[0], "Classic")
+        self.assertEqual(self.ranked("trending")[0], "Lucky")
+        self.assertEqual(self.ranked("unknown"),
+                         ["Lucky", "Loved", "Classic"])
+
+    def test_incremental_refresh(self):
+        """
+        A refresh only rescores products that changed since the last one.
+        """
+        self.assertEqual(refresh_rankings(), 3)
+        self.assertEqual(refresh_rankings(), 0)
+        self.order("Loved", 20, timedelta(0))
+        self.assertEqual(refresh_rankings(), 1)
+        self.assertEqual(
+            ProductRanking.objects.get(product=self.products["Loved"])
+            .units_sold, 20)
+        self.assertEqual(refresh_rankings(full=True), 3)
+
+
+class RecommendationsTest(BuyerStoreMixin, TestCase):
+    """
+    Tests for the "customers also bought" recommendations built from
+    order items.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create four products and orders where A is bought with B twice and
+        with C once.
+        """
+        super().setUp()
+        self.products = {}
+        for name in "ABCD":
+            self.products[name] = Product.objects.create(
+                store=self.store, name=f"Print {name}")
+            Size.objects.create(product=self.products[name], small_price=10)
+        for names in ["AB", "AB", "AC", "BC", "D"]:
+            self.order(names)
+
+    def order(self, names):
+        """
+        Create an order of one of each named product.
+        """
+        order = Order.objects.create(user=self.user, total=0)
+        for name in names:
+            OrderItem.objects.create(order=order, product=self.products[name],
+                                     size="S", frame_colour="black",
+                                     price=10)
+
+    def related(self, name):
+        """
+        Return the names of the products recommended for a product.
+        """
+        ids = ProductRecommendations.objects.get(
+            product=self.products[name]).product_ids
+        return "".join(Product.objects.get(pk=pk).name[-1] for pk in ids)
+
+    def test_full_build(self):
+        """
+        Products are ranked by how many orders they shared, and truncated
+        to the limit.
+        """
+        self.assertEqual(refresh_recommendations(full=True), 3)
+        self.assertEqual(self.related("A"), "BC")
+        self.assertEqual(self.related("C"), "AB")
+        refresh_recommendations(full=True, limit=1)
+        self.assertEqual(self.related("A"), "B")
+
+    def test_incremental_refresh(self):
+        """
+        Only products in new orders are rebuilt, from all their orders.
+        """
+        refresh_recommendations(full=True)
+        self.assertEqual(refresh_recommendations(), 0)
+        self.order("DC")
+        self.assertEqual(refresh_recommendations(), 2)
+        self.assertEqual(self.related("C"), "ABD")
+        self.assertEqual(self.related("D"), "C")
+
+    def test_product_page(self):
+        """
+        The product page lists active products bought with it, and is
+        refreshed when they change.
+        """
+        url = reverse("shop:product_detail", args=[self.products["A"].id])
+        self.assertNotContains(self.client.get(url), "Customers also bought")
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_recommendations(full=True)
+        response = self.client.get(url)
+        self.assertContains(response, "Customers also bought")
+        self.assertContains(response, "Print C")
+
+        Product.objects.filter(pk=self.products["C"].pk).update(
+            is_active=False)
+        response = self.client.get(url)
+        self.assertContains(response, "Print B")
+        self.assertNotContains(response, "Print C")
+
+    def test_product_page_follows_also_bought(self):
+        """
+        Renaming, repricing or deleting a product also bought shows on the
+        page, and changes its ETag, without touching the page's product.
+        """
+        url = reverse("shop:product_detail", args=[self.products["A"].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_recommendations(full=True)
+        etag = self.client.get(url)["ETag"]
+
+        b = self.products["B"]
+        b.name = "Renamed B"
+        b.save()
+        b.sizes.small_price = 99
+        b.sizes.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Renamed B")
+        self.assertContains(response, "From £99")
+        etag = response["ETag"]
+
+        b.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Renamed B")
+
+
+class FacetTest(BuyerStoreMixin, TestCase):
+    """
+    Tests for the home page's category, price and rating facets.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create products in two categories at several prices, some rated.
+        """
+        super().setUp()
+        self.nature = Category.objects.create(name="Nature")
+        self.city = Category.objects.create(name="City")
+        for name, category, price, rating in [
+                ("Forest", self.nature, 10, 5), ("River", self.nature, 30, 2),
+                ("Lake", self.nature, 60, None), ("Bridge", self.city, 30, 4),
+                ("Tower", self.city, 120, None)]:
+            product = Product.objects.create(store=self.store, name=name,
+                                             category=category)
+            Size.objects.create(product=product, small_price=price)
+            if rating:
+                Review.objects.create(product=product, user=self.user,
+                                      rating=rating)
+
+    def facets(self, url, **params):
+        """
+        Return the names of the products listed and the facet counts.
+        """
+        response = self.client.get(url, params)
+        names = sorted(product.name for product in
+                       response.context["page_obj"])
+        counts = {facet: {str(option["value"]): option["count"]
+                          for option in options}
+                  for facet, options in response.context["facets"].items()}
+        return names, counts
+
+    def test_counts_and_filters(self):
+        """
+        Each facet is counted with the other facets applied, and the
+        listed products match all of them.
+        """
+        names, counts = self.facets(reverse("shop:home"))
+        self.assertEqual(len(names), 5)
+        self.assertEqual(counts["category"], {"Nature": 3, "City": 2})
+        self.assertEqual(counts["price"], {"under-25": 1, "25-50": 2,
+                                           "50-100": 1, "100-plus": 1})
+        self.assertEqual(counts["rating"], {"4": 2, "3": 2, "2": 3, "1": 3})
+
+        names, counts = self.facets(
+            reverse("shop:category_detail", args=[self.nature.slug]),
+            price="25-50")
+        self.assertEqual(names, ["River"])
+        self.assertEqual(counts["category"], {"Nature": 1, "City": 1})
+        self.assertEqual(counts["price"]["under-25"], 1)
+        self.assertEqual(counts["rating"], {"2": 1, "1": 1})
+
+        names, counts = self.facets(reverse("shop:home"), rating="4",
+                                    search="r")
+        self.assertEqual(names, ["Bridge", "Forest"])
+        self.assertEqual(counts["price"], {"under-25": 1, "25-50": 1})
+
+    def test_index_rebuilt_on_change(self):
+        """
+        The index is kept between requests until a product changes.
+        """
+        index = get_facet_index()
+        self.assertIs(get_facet_index(), index)
+        with self.captureOnCommitCallbacks(execute=True):
+            Size.objects.filter(product__name="Tower").get().save()
+        self.assertIsNot(get_facet_index(), index)
+
+    def test_index_kept_while_rebuilding(self):
+        """
+        Requests keep the previous index while another thread rebuilds it,
+        or until INDEX_REBUILD_SECONDS have passed since the last build.
+        """
+        index = get_facet_index()
+        bump_version("facets")
+        with facet_index.lock:
+            self.assertIs(get_facet_index(), index)
+        with override_settings(INDEX_REBUILD_SECONDS=60):
+            self.assertIs(get_facet_index(), index)
+        self.assertIsNot(get_facet_index(), index)
+
+
+class SuggestionsTest(BuyerStoreMixin, TestCase):
+    """
+    Tests for the search suggestions endpoint.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a category and some listed products, and one archived.
+        """
+        super().setUp()
+        self.category = Category.objects.create(name="Forests")
+        for name, active in [("Misty Forest", True), ("Forest Path", True),
+                             ("Foggy Lake", True), ("Forest Fire", False)]:
+            product = Product.objects.create(store=self.store, name=name,
+                                             is_active=active)
+            Size.objects.create(product=product, small_price=10)
+
+    def suggest(self, query, **params):
+        """
+        Return the names suggested for query.
+        """
+        response = self.client.get(reverse("shop:suggestions"),
+                                   {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [suggestion["name"] for suggestion in
+                response.json()["suggestions"]]
+
+    def test_prefix_matches(self):
+        """
+        Names starting with the query come first, alphabetically, then
+        names with a later word starting with it. Archived products are
+        left out.
+        """
+        self.assertEqual(self.suggest("FOR"),
+                         ["Forest Path", "Forests", "Misty Forest"])
+        self.assertEqual(self.suggest("fo"),
+                         ["Foggy Lake", "Forest Path", "Forests",
+                          "Misty Forest"])
+        self.assertEqual(self.suggest("lake"), ["Foggy Lake"])
+        self.assertEqual(self.suggest("  "), [])
+
+        response = self.client.get(reverse("shop:suggestions"),
+                                   {"q": "forests"})
+        suggestion = response.json()["suggestions"][0]
+        self.assertEqual(suggestion["type"], "category")
+        self.assertEqual(suggestion["url"], reverse(
+            "shop:category_detail", args=[self.category.slug]))
+
+    def test_limit(self):
+        """
+        The limit caps the suggestions, and a bad one is rejected.
+        """
+        self.assertEqual(self.suggest("fo", limit=2),
+                         ["Foggy Lake", "Forest Path"])
+        response = self.client.get(reverse("shop:suggestions"),
+                                   {"q": "fo", "limit": "many"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_rebuilt_on_change(self):
+        """
+        The index is kept between requests until a product changes.
+        """
+        index = get_suggestion_index()
+        self.assertIs(get_suggestion_index(), index)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(name="Foggy Lake")
+            product.name = "Forest Lake"
+            product.save()
+        self.assertIsNot(get_suggestion_index(), index)
+        self.assertEqual(self.suggest("lake"), ["Forest Lake"])
+
+    def test_index_kept_while_rebuilding(self):
+        """
+        Requests keep the previous index while another thread rebuilds it.
+        """
+        index = get_suggestion_index()
+        bump_version("suggestions")
+        with suggestion_index.lock:
+            self.assertIs(get_suggestion_index(), index)
+        self.assertIsNot(get_suggestion_index(), index)
+
+
+class AsyncViewsTest(BuyerStoreMixin, TestCase):
+    """
+    Tests for the views served async under ASGI: checkout, the Stripe
+    webhook and the catalog API.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Create a buyer and a product in their cart, and a fake Stripe.
+        """
+        super().setUp()
+        self.product = Product.objects.create(store=self.store, name="Forest")
+        Size.objects.create(product=self.product, small_price=25)
+        address = {"full_name": "Buyer User", "address_line1": "1 Road",
+                   "city": "London", "postcode": "N1 1AA"}
+        self.pending = PendingCheckout.objects.create(
+            user=self.user, shipping=address, billing=address,
+            cart={"item": {
+                "product_id": self.product.id, "size": "S",
+                "frame_colour": "black", "price": "25.00", "quantity": 2}})
+        self.fake = FakeStripe().start()
+        self.addCleanup(self.fake.stop)
+        self.enterContext(override_settings(
+            STRIPE_SECRET_KEY="sk_test_fake", STRIPE_API_BASE=self.fake.url))
+        breaker.record_success()
+
+    async def completed(self):
+        """
+        Sends the webhook Stripe posts when the checkout is paid.
+        """
+        event = {"type": "checkout.session.completed", "data": {"object": {
+            "customer_email": "buyer@test.com",
+            "metadata": {"checkout_id": str(self.pending.pk)},
+        }}}
+        with mock.patch("stripe.Webhook.construct_event",
+                        return_value=event):
+            return await self.async_client.post(
+                reverse("shop:stripe-webhook"), b"{}",
+                content_type="application/json")
+
+    async def test_webhook_creates_order(self):
+        """
+        A completed checkout creates the order and purchases, and pins the
+        buyer to the primary.
+        """
+        response = await self.completed()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        order = await Order.objects.aget(user=self.user)
+        self.assertEqual(order.total, Decimal("50.00"))
+        self.assertEqual(await order.items.acount(), 1)
+        address = await Address.objects.aget(user=self.user)
+        self.assertEqual(address.city, "London")
+        self.assertTrue(await Purchase.objects.filter(
+            user=self.user, product=self.product).aexists())
+        self.assertEqual(mail.outbox[0].to, ["buyer@test.com"])
+        self.assertFalse(await PendingCheckout.objects.filter(
+            pk=self.pending.pk).aexists())
+
+    async def test_webhook_redelivered(self):
+        """
+        Stripe sending the same event again places no second order and
+        sends no more emails.
+        """
+        await self.completed()
+        emails = len(mail.outbox)
+        response = await self.completed()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await Order.objects.filter(user=self.user).acount(),
+                         1)
+        self.assertEqual(len(mail.outbox), emails)
+
+    def test_failed_order_keeps_checkout(self):
+        """
+        An error placing the order rolls back the claim, so Stripe's retry
+        can place it.
+        """
+        with mock.patch("shop.functions.checkout.OrderItem.objects.create",
+                        side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            place_order(self.pending.pk)
+        self.assertTrue(PendingCheckout.objects.filter(
+            pk=self.pending.pk).exists())
+        self.assertFalse(Order.objects.exists())
+
+    async def test_checkout_session_async(self):
+        """
+        Under ASGI the checkout session is created with Stripe's async
+        client.
+        """
+        await self.async_client.aforce_login(self.user)
+        session = await self.async_client.asession()
+        await session.aset("checkout_id", str(self.pending.pk))
+        await session.asave()
+
+        with mock.patch("shop.functions.payments.sync_to_async") as thread:
+            response = await self.async_client.get(
+                reverse("shop:create_checkout_session"))
+
+        self.assertRedirects(response, CHECKOUT_URL + "cs_test_1",
+                             fetch_redirect_response=False)
+        thread.assert_not_called()
+        params = self.fake.calls[0]["params"]
+        self.assertEqual(
+            params["line_items[0][price_data][unit_amount]"], "2500")
+        self.assertEqual(params["line_items[0][quantity]"], "2")
+        self.assertEqual(params["metadata[checkout_id]"],
+                         str(self.pending.pk))
+        self.assertNotIn("metadata[cart]", params)
+
+    def test_checkout_session_wsgi(self):
+        """
+        Under WSGI the checkout session is created with Stripe's sync
+        client, as each request runs async views in a new event loop.
+        """
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["checkout_id"] = str(self.pending.pk)
+        session.save()
+
+        response = self.client.get(reverse("shop:create_checkout_session"))
+        self.assertRedirects(response, CHECKOUT_URL + "cs_test_1",
+                             fetch_redirect_response=False)
+
+    async def test_catalog_api_async(self):
+        """
+        The catalog API answers under ASGI, with a 304 for a repeat
+        request.
+        """
+        response = await self.async_client.get("/get/products")
+        self.assertEqual([product["name"] for product in response.json()],
+                         ["Forest"])
+        response = await self.async_client.get(
+            "/get/products", headers={"if-none-match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+
+class StripeGatewayTest(BuyerStoreMixin, TestCase):
+    """
+    Tests for starting checkout: repricing the cart, and calling Stripe
+    through the payments gateway with idempotency keys, retries, timeouts
+    and the circuit breaker, against a fake Stripe.
+    """
+
+    def setUp(self):
+        """
+        Log a buyer in with a checkout ready, and start a fake Stripe that
+        times out quickly.
+        """
+        super().setUp()
+        self.product = Product.objects.create(store=self.store, name="Forest")
+        Size.objects.create(product=self.product, small_price=25)
+        self.client.force_login(self.user)
+        self.pending = self.start_checkout(self.product)
+
+        self.fake = FakeStripe().start()
+        self.addCleanup(self.fake.stop)
+        self.enterContext(override_settings(
+            STRIPE_SECRET_KEY="sk_test_fake", STRIPE_API_BASE=self.fake.url,
+            STRIPE_CONNECT_TIMEOUT=0.2, STRIPE_READ_TIMEOUT=0.2,
+            STRIPE_MAX_RETRIES=0, STRIPE_BREAKER_FAILURES=2,
+            STRIPE_BREAKER_SECONDS=60))
+        breaker.record_success()
+        self.url = reverse("shop:create_checkout_session")
+
+    def start_checkout(self, product):
+        """
+        Put a new checkout of one product in the buyer's session.
+        """
+        pending = PendingCheckout.objects.create(user=self.user, cart={
+            "item": {"product_id": product.id, "size": "S",
+                     "frame_colour": "black", "price": "25.00",
+                     "quantity": 1}})
+        session = self.client.session
+        session["checkout_id"] = str(pending.pk)
+        session.save()
+        return pending
+
+    def test_same_checkout_reuses_session(self):
+        """
+        Starting the same checkout twice reuses its cached session without
+        calling Stripe. Once the cache is cleared, the same idempotency key
+        gets the same session from Stripe. A new checkout gets a new one.
+        """
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(first["Location"], CHECKOUT_URL + "cs_test_1")
+        self.assertEqual(second["Location"], first["Location"])
+        self.assertEqual(len(self.fake.calls), 1)
+
+        cache.clear()
+        third = self.client.get(self.url)
+        self.assertEqual(third["Location"], first["Location"])
+        keys = [call["idempotency_key"] for call in self.fake.calls]
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(keys[0], keys[1])
+
+        self.start_checkout(self.product)
+        fourth = self.client.get(self.url)
+        self.assertNotEqual(fourth["Location"], first["Location"])
+        self.assertNotEqual(self.fake.calls[2]["idempotency_key"], keys[0])
+
+    def test_checkout_freezes_cart(self):
+        """
+        Submitting the address form saves the cart and addresses as a
+        pending checkout, and only its ID in the session.
+        """
+        cart = self.pending.cart
+        session = self.client.session
+        session["cart"] = cart
+        session.save()
+        response = self.client.post(reverse("shop:checkout"), {
+            "shipping-full_name": "Buyer User",
+            "shipping-address_line1": "1 Road", "shipping-city": "London",
+            "shipping-postcode": "N1 1AA", "shipping-phone": "07777777777",
+            "same_billing": "on"})
+        self.assertRedirects(response, self.url,
+                             fetch_redirect_response=False)
+
+        pending = PendingCheckout.objects.latest("created_at")
+        self.assertEqual(self.client.session["checkout_id"], str(pending.pk))
+        self.assertEqual(pending.user, self.user)
+        self.assertEqual(pending.cart, cart)
+        self.assertEqual(pending.shipping["city"], "London")
+        self.assertEqual(pending.billing, pending.shipping)
+
+    def test_reprices_cart(self):
+        """
+        Line items and the cart sent to Stripe use the current price, not
+        the one saved in the session, read with one query.
+        """
+        Size.objects.filter(product=self.product).update(small_price=30)
+        with self.assertNumQueries(1):
+            priced, line_items = async_to_sync(price_cart)(self.pending.cart)
+        self.assertEqual(priced["item"]["price"], "30.00")
+        self.assertEqual(line_items[0]["price_data"]["unit_amount"], 3000)
+
+        self.client.get(self.url)
+        params = self.fake.calls[0]["params"]
+        self.assertEqual(
+            params["line_items[0][price_data][unit_amount]"], "3000")
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.cart["item"]["price"], "30.00")
+
+    def test_rejects_archived_products(self):
+        """
+        Archived products can't be checked out, and Stripe isn't called.
+        """
+        Product.objects.filter(pk=self.product.pk).update(
+            is_active=False)
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse("shop:show_cart"),
+                             fetch_redirect_response=False)
+        message = list(get_messages(response.wsgi_request))[0]
+        self.assertIn("Forest", str(message))
+        self.assertEqual(self.fake.calls, [])
+
+    @override_settings(STRIPE_MAX_RETRIES=1)
+    def test_retries_server_errors(self):
+        """
+        A server error is retried with the same idempotency key.
+        """
+        self.fake.failures = 1
+        response = self.client.get(self.url)
+        self.assertTrue(response["Location"].startswith(CHECKOUT_URL))
+        self.assertEqual(len(self.fake.calls), 2)
+        self.assertEqual(self.fake.calls[0]["idempotency_key"],
+                         self.fake.calls[1]["idempotency_key"])
+
+    def test_timeouts_open_breaker(self):
+        """
+        Timeouts send the buyer back to their cart. After too many in a
+        row Stripe isn't called until the breaker lets a trial through,
+        and a successful one closes it.
+        """
+        self.fake.delay = 0.5
+        for _ in range(3):
+            response = self.client.get(self.url)
+            self.assertRedirects(response, reverse("shop:show_cart"),
+                                 fetch_redirect_response=False)
+        self.assertEqual(len(self.fake.calls), 2)
+
+        self.fake.delay = 0
+        with override_settings(STRIPE_BREAKER_SECONDS=0):
+            response = self.client.get(self.url)
+        self.assertTrue(response["Location"].startswith(CHECKOUT_URL))
+        self.start_checkout(self.product)
+        response = self.client.get(self.url)
+        self.assertTrue(response["Location"].startswith(CHECKOUT_URL))
+        self.assertEqual(len(self.fake.calls), 4)
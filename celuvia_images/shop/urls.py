@@ -29,6 +29,10 @@ urlpatterns = [
          views.add_product, name="add_product"),
     path("vendor/stores/<int:store_id>/products/<int:product_id>/edit/",
          views.edit_product, name="edit_product"),
+    path("vendor/stores/<int:store_id>/products/bulk/",
+         views.bulk_products, name="bulk_products"),
+    path("vendor/stores/<int:store_id>/reprice/",
+         views.reprice_products, name="reprice_products"),
     path("vendor/stores/<int:store_id>/products/<int:product_id>/archive/",
          views.archive_product, name="archive_product"),
     path("vendor/stores/<int:store_id>/products/<int:product_id>/unarchive/",
@@ -64,8 +68,10 @@ urlpatterns = [
     path("get/stores", views.view_stores),
     path("post/store", views.add_store_api),
     path("get/categories", views.get_categories),
+    path("get/suggestions", views.get_suggestions, name="suggestions"),
     path("post/category", views.add_category_api),
     path("get/products", views.view_store_products),
     path("post/product", views.add_product_api),
+    path("post/products", views.import_products_api),
     path("get/reviews", views.get_reviews),
 ]
@@ -1,23 +1,32 @@
 import stripe
-import json
 import base64
 import os
+from asgiref.sync import sync_to_async
 from django.core.files.base import ContentFile
 from django.conf import settings
 from django.urls import reverse
+from django.utils.http import urlencode
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse, JsonResponse
+from django.http import (HttpResponse, JsonResponse, Http404,
+                         StreamingHttpResponse)
 from django.contrib.auth import get_user_model
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponseForbidden
 from django.core.paginator import Paginator
-from django.core.mail import EmailMessage
-from collections import defaultdict
+from django.core.cache import cache
 from django.template.loader import render_to_string
-from datetime import timedelta
-from decimal import Decimal
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from zipfile import BadZipFile
+from django.db import router
+from datetime import date, timedelta
+from django.db.models import Avg, Count, Exists, OuterRef, Q
+from django.utils.dateparse import parse_datetime
+from decimal import Decimal, InvalidOperation
+from django.db.models.functions import Coalesce, Least
 from django.utils.text import slugify
 from rest_framework import status
 from rest_framework.decorators import (api_view, authentication_classes,
@@ -25,20 +34,69 @@ from rest_framework.decorators import (api_view, authentication_classes,
 from rest_framework.authentication import BasicAuthentication
 from rest_framework.permissions import IsAuthenticated
 from .models import (Store, Product, Category, Size, Order, OrderItem, Review,
-                     Address, FRAME_CHOICES)
+                     Address, ProductRanking, PendingCheckout, Purchase,
+                     FRAME_CHOICES)
 from .forms import (StoreForm, ProductForm, ReviewForm, SizeForm,
-                    CheckoutAddressForm)
+                    CheckoutAddressForm, RepriceForm)
 from .serializers import (StoreSerializer, ProductSerializer,
-                          CategorySerializer, SizeSerializer, ReviewSerializer)
+                          CategorySerializer, SizeSerializer, ReviewSerializer,
+                          CatalogProductSerializer)
 from .functions.tweet import post_tweet
+from .functions.emails import send_order_emails
+from .functions.payments import start_checkout, PaymentUnavailable
+from .functions.checkout import price_cart, place_order
+from .functions import categories as category_registry
+from .functions.cache import get_version
+from .functions.conditional import conditional_get, table_stamp
+from .functions.catalog_import import (CatalogImport, ImageSource,
+                                       import_format, read_rows)
+from .functions.catalog_actions import (set_products_active,
+                                        set_store_active)
+from .functions.suggestions import (get_suggestion_index,
+                                   SUGGESTIONS_DEFAULT, SUGGESTIONS_MAX)
+from .functions.facets import (listed_products, selected_facets,
+                              filter_facets, facet_options, get_facet_index)
+from .functions.recommendations import (recommended_ids,
+                                        recommended_products,
+                                        recommended_stamps,
+                                        RECOMMENDATIONS_PER_PRODUCT)
+from .functions.rankings import sort_products, RANKING_SORTS
+from .functions.purchases import has_purchased, record_purchases
+from .functions.pricing import (products_in_scope, preview_price_change,
+                                price_change_fits, apply_price_change,
+                                PRICE_MAX)
+from .functions.pagination import (page_limit, decode_cursor, after,
+                                   next_link, stream_json_list)
+from celuvia_images.routers import replica_reads, pin_to_primary
 
 User = get_user_model()
 
 
+def catalog_stamps(request, category_slug=None):
+    """
+    Version stamps of everything the product listings show, and of the
+    rankings when the products are sorted by them.
+    """
+    stamps = [
+        table_stamp(Product.objects.filter(store__is_active=True)),
+        table_stamp(Store.objects.all()),
+        table_stamp(Category.objects.all()),
+    ]
+    if request.GET.get("sort", "newest") != "newest":
+        stamps.append(table_stamp(ProductRanking.objects.all()))
+    return stamps
+
+
+@conditional_get(catalog_stamps, per_user=True)
+@replica_reads
 def home(request, category_slug=None):
     """
     Stores landing page, showing list of products with pagination and optional
-    filtering by category.
+    filtering by category, price band and rating. Products can be sorted
+    by the precomputed rankings, newest first by default.
+
+    Facet counts come from the in-process facet index, so showing them
+    costs no queries beyond the search's matching IDs.
 
     - param request: HTTP request object.
     - param category_slug: optional slug to filter products by category.
@@ -46,24 +104,37 @@ def home(request, category_slug=None):
       paginated products.
     """
     category = None
-    categories = Category.objects.all()
-    products = Product.objects.filter(store__is_active=True)
+    products = listed_products().select_related("sizes", "rating_stats")
+    index = get_facet_index()
+    within = None
 
     search = request.GET.get("search")
     if search:
         products = products.filter(name__icontains=search)
+        within = index.matching(products.values_list("pk", flat=True))
 
     if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
+        category = category_registry.get_category_by_slug(category_slug)
+        if category is None:
+            raise Http404("No category matches the given slug.")
         products = products.filter(category=category)
 
+    selected = selected_facets(request.GET, category)
+    products = filter_facets(products, selected["price"], selected["rating"])
+    facets = facet_options(index.counts(selected, within), selected,
+                           category_registry.get_categories())
+
+    products, sort = sort_products(products, request.GET.get("sort"))
     paginator = Paginator(products, 12)
     page_obj = paginator.get_page(request.GET.get("page"))
 
+    # categories come from the context processor
     return render(request, "shop/home.html", {
         "category": category,
-        "categories": categories,
-        "page_obj": page_obj
+        "page_obj": page_obj,
+        "sort": sort,
+        "sorts": {key: label for key, (label, _) in RANKING_SORTS.items()},
+        "facets": facets,
         },
     )
 
@@ -98,7 +169,7 @@ def store_detail(request, store_id):
         return HttpResponseForbidden()
 
     store = get_object_or_404(Store, id=store_id, owner=request.user)
-    products = Product.objects.filter(store=store)
+    products = Product.objects.filter(store=store).select_related("category")
 
     search = request.GET.get("search")
     if search:
@@ -106,10 +177,56 @@ def store_detail(request, store_id):
 
     return render(request, "shop/store_detail.html", {
         "store": store,
-        "products": products
+        "products": products,
+        "store_categories": Category.objects.filter(
+            products__store=store).distinct().order_by("name"),
         })
 
 
+@login_required
+def bulk_products(request, store_id):
+    """
+    Applies an action to many of a store's products at once, from the
+    store page: archive or unarchive the selected products, archive every
+    product in a category, or change the selected products' prices.
+
+    - param request: HTTP request object.
+    - param store_id: ID of the store containing the products.
+    - return: redirect to store detail, or to the price change page, or
+      forbidden response if user is not a vendor.
+    """
+    if not request.user.is_vendor():
+        return HttpResponseForbidden()
+
+    store = get_object_or_404(Store, id=store_id, owner=request.user)
+    if request.method != "POST":
+        return redirect("shop:store_detail", store_id=store.id)
+
+    action = request.POST.get("action")
+    selected = [pk for pk in request.POST.getlist("products") if pk.isdigit()]
+
+    if action == "reprice":
+        query = urlencode({"products": selected}, doseq=True)
+        return redirect(
+            f"{reverse('shop:reprice_products', args=[store.id])}?{query}")
+
+    if action == "archive_category":
+        category = get_object_or_404(
+            Category, id=request.POST.get("category") or 0)
+        archived = set_products_active(
+            store.products.filter(category=category), False)
+        messages.success(request, (f"{archived} products in "
+                                   f"'{category.name}' archived."))
+    elif action in ("archive", "unarchive") and selected:
+        active = action == "unarchive"
+        changed = set_products_active(
+            store.products.filter(pk__in=selected), active)
+        messages.success(request, f"{changed} products {action}d.")
+    else:
+        messages.error(request, "Select at least one product.")
+    return redirect("shop:store_detail", store_id=store.id)
+
+
 @login_required
 def add_store(request):
     """
@@ -187,9 +304,12 @@ def close_store(request, store_id):
 
     store = get_object_or_404(Store, id=store_id, owner=request.user)
     if request.method == "POST":
-        store.is_active = False
-        store.save()
-        messages.info(request, f"Store '{store.name}' has been closed.")
+        archived = set_store_active(
+            store, False, archive_products="archive_products" in request.POST)
+        message = f"Store '{store.name}' has been closed."
+        if archived:
+            message += f" {archived} products were archived."
+        messages.info(request, message)
         return redirect("shop:vendor_dashboard")
 
     return render(request, "shop/close_store.html", {"store": store})
@@ -210,14 +330,14 @@ def reopen_store(request, store_id):
 
     store = get_object_or_404(Store, id=store_id, owner=request.user)
     if request.method == "POST":
-        store.is_active = True
-        store.save()
+        set_store_active(store, True)
         messages.info(request, f"Store '{store.name}' has been reopened.")
         return redirect("shop:vendor_dashboard")
     return render(request, "shop/reopen_store.html", {"store": store})
 
 
 @login_required
+@replica_reads
 def vendor_orders(request):
     """
     Allows a store owner to view orders from their store(s).
@@ -255,6 +375,7 @@ def vendor_orders(request):
     )
 
 
+@replica_reads
 def category(request):
     """
     Category page allowing users to filter and view products by category.
@@ -262,8 +383,8 @@ def category(request):
     - param request: HTTP request object.
     - return: rendered template with all categories.
     """
-    categories = Category.objects.all()
-    return render(request, "shop/category.html", {"categories": categories})
+    # categories come from the context processor
+    return render(request, "shop/category.html")
 
 
 @login_required
@@ -385,6 +506,62 @@ def edit_product(request, store_id, product_id):
     )
 
 
+@login_required
+def reprice_products(request, store_id):
+    """
+    Allows a store owner to change the prices of many products at once, by
+    a percentage or a fixed amount, for the whole store, a category or the
+    products selected on the store page. The change can be previewed
+    before it's applied.
+
+    - param request: HTTP request object.
+    - param store_id: ID of the store whose prices change.
+    - return: redirect to store detail once applied, or rendered form with
+      an optional preview, or forbidden response if user is not a vendor.
+    """
+    if not request.user.is_vendor():
+        return HttpResponseForbidden()
+
+    store = get_object_or_404(Store, id=store_id, owner=request.user)
+    preview = None
+
+    if request.method == "POST":
+        form = RepriceForm(request.POST, store=store)
+        if form.is_valid():
+            mode = form.cleaned_data["mode"]
+            value = form.cleaned_data["value"]
+            category = form.cleaned_data["category"]
+            products = [product.pk for product in
+                        form.cleaned_data["products"]] or None
+
+            preview = preview_price_change(
+                products_in_scope(store, category, products), mode, value)
+            if not price_change_fits(preview):
+                form.add_error("value", "This would take prices above "
+                                        f"£{PRICE_MAX}.")
+            elif "apply" in request.POST:
+                change = apply_price_change(store, request.user, mode, value,
+                                            category, products)
+                messages.success(request, (f"Prices changed for "
+                                           f"{change.sizes_updated} "
+                                           f"products."))
+                return redirect("shop:store_detail", store_id=store.id)
+    else:
+        form = RepriceForm(
+            initial={"products": request.GET.getlist("products")},
+            store=store)
+
+    return render(request, "shop/reprice_products.html", {
+        "store": store,
+        "form": form,
+        "selected": len(form["products"].value() or []),
+        "preview": preview,
+        "price_changes": store.price_changes.select_related(
+            "user", "category")[:10],
+        },
+    )
+
+
 @login_required
 def archive_product(request, store_id, product_id):
     """
@@ -401,8 +578,7 @@ def archive_product(request, store_id, product_id):
     product = get_object_or_404(Product, id=product_id, store=store)
 
     if request.method == "POST":
-        product.is_active = False
-        product.save()
+        set_products_active(Product.objects.filter(pk=product.pk), False)
         messages.success(request,
                          f"Product '{product.name}' archived successfully.")
         return redirect("shop:store_detail", store_id=store.id)
@@ -430,8 +606,7 @@ def unarchive_product(request, store_id, product_id):
     product = get_object_or_404(Product, id=product_id, store=store)
 
     if request.method == "POST":
-        product.is_active = True
-        product.save()
+        set_products_active(Product.objects.filter(pk=product.pk), True)
         messages.success(request, (f"Product '{product.name}' has been "
                                    f"unarchived and is now available "
                                    f"for purchase."))
@@ -445,26 +620,126 @@ def unarchive_product(request, store_id, product_id):
     )
 
 
+REVIEWS_PER_PAGE = 20
+
+
+def load_product_detail(product_id, reviews_page):
+    """
+    Loads everything the cached part of the product detail page shows in a
+    fixed number of queries, however many reviews the product has:
+
+    - the product with its sizes, store, category, rating stats and
+      recommendations (1 query)
+    - one page of reviews with their users (count + page, 2 queries)
+
+    The products customers also bought are only loaded by ID, and shown
+    per request, as their names and prices change without this product.
+
+    - param product_id: ID of the product to load.
+    - param reviews_page: number of the page of reviews to load.
+    - return: tuple of (product, IDs of products also bought, page of
+      reviews).
+    """
+    product = get_object_or_404(
+        Product.objects.select_related("sizes", "store", "category",
+                                       "rating_stats", "recommendations"),
+        id=product_id)
+
+    reviews = product.reviews.select_related("user").order_by("created_at")
+    page = Paginator(reviews, REVIEWS_PER_PAGE).get_page(reviews_page)
+    return product, recommended_ids(product), page
+
+
+def product_page_key(product_id, reviews_page):
+    """
+    Returns the cache key of a rendered product detail page. It includes
+    the product's version, bumped when the product, its sizes or its
+    reviews change, the categories version for the category name, and the
+    catalog version, bumped by bulk changes that skip signals.
+    """
+    return (f"product_page:{product_id}:"
+            f"{get_version(f'product:{product_id}')}:"
+            f"{get_version('categories')}:{get_version('catalog')}:"
+            f"{reviews_page}")
+
+
+def get_product_page(request, product_id):
+    """
+    Returns the parts of the product detail page that are the same for
+    every user, rendered to HTML and cached until the product changes.
+
+    - param request: HTTP request object.
+    - param product_id: ID of the product to display.
+    - return: dict with the product section and review list HTML, and
+      the IDs of the products also bought.
+    """
+    try:
+        reviews_page = max(int(request.GET.get("reviews_page", 1)), 1)
+    except ValueError:
+        reviews_page = 1
+
+    key = product_page_key(product_id, reviews_page)
+    page = cache.get(key)
+    if page is None:
+        # Load from the primary, so a lagging replica can't be cached
+        # under the new version
+        pin_to_primary()
+        product, also_bought, reviews = load_product_detail(
+            product_id, reviews_page)
+        page = {
+            "body": render_to_string("shop/product_body.html", {
+                "product": product,
+                "FRAME_CHOICES": FRAME_CHOICES,
+            }),
+            "reviews": render_to_string("shop/product_reviews.html", {
+                "reviews": reviews,
+            }),
+            "also_bought": also_bought,
+        }
+        cache.set(key, page)
+    return page
+
+
+def product_stamps(request, product_id):
+    """
+    Version stamps of everything the product page shows: the product,
+    which its sizes and reviews touch, its store, category and
+    customers-also-bought list, and whether the user bought it, in one
+    query, then the products also bought, in another if there are any.
+    None for a missing product, so the view returns 404.
+    """
+    bought = Purchase.objects.filter(user=request.user.pk,
+                                     product=OuterRef("pk"))
+    stamps = Product.objects.filter(pk=product_id).values_list(
+        "updated_at", "store__updated_at", "category__updated_at",
+        "recommendations__updated_at", Exists(bought),
+        "recommendations__product_ids").first()
+    if stamps is None:
+        return None
+    *stamps, also_bought = stamps
+    return [stamps, recommended_stamps(
+        (also_bought or [])[:RECOMMENDATIONS_PER_PRODUCT])]
+
+
+@conditional_get(product_stamps, per_user=True)
+@replica_reads
 def product_detail(request, product_id):
     """
     Shows the product detail view, displaying product information.
     Users can add items to cart.
 
+    The product and its reviews come from the page cache, only the user's
+    review, review form, purchase badge, cart count and the products also
+    bought are rendered per request.
+
     - param request: HTTP request object.
     - param product_id: ID of the product to display.
     - return: rendered product detail template or redirect after form
       submission.
     """
-    product = get_object_or_404(Product, id=product_id)
-    reviews = product.reviews.all().order_by("created_at")
-    review_form = ReviewForm() if request.user.is_authenticated else None
-
-    # Determine if the logged-in user has already left a review
-    user_review = None
-    if request.user.is_authenticated:
-        user_review = product.reviews.filter(user=request.user).first()
-
     if request.method == "POST":
+        product = get_object_or_404(
+            Product.objects.select_related("sizes"), id=product_id)
         frame = request.POST.get("frame_colour")
         size = request.POST.get("size")
         quantity = int(request.POST.get("quantity", 1))
@@ -508,12 +783,29 @@ def product_detail(request, product_id):
         )
         return redirect("shop:product_detail", product_id=product.id)
 
+    page = get_product_page(request, product_id)
+
+    # Only the user's own fragments are built on every request
+    user_review = None
+    review_form = None
+    purchased = has_purchased(request.user, product_id)
+    if request.user.is_authenticated:
+        user_review = Review.objects.filter(
+            product_id=product_id, user=request.user).first()
+        if user_review is None:
+            review_form = ReviewForm()
+    cart = request.session.get("cart", {})
+    cart_count = sum(item["quantity"] for item in cart.values()) \
+        if isinstance(cart, dict) else 0
+
     return render(request, "shop/product_detail.html", {
-        "product": product,
-        "FRAME_CHOICES": FRAME_CHOICES,
-        "reviews": reviews,
+        "product_id": product_id,
+        "page": page,
         "review_form": review_form,
         "user_review": user_review,
+        "purchased": purchased,
+        "cart_count": cart_count,
+        "also_bought": recommended_products(page["also_bought"]),
     })
 
 
@@ -660,41 +952,42 @@ def update_cart(request):
 
 
 @login_required
-def create_checkout_session(request):
+async def create_checkout_session(request):
     """
     Creates a stripe Checkout session with the current cart.
 
+    Async, so under ASGI no thread waits on Stripe. Stripe is called
+    through the payments gateway, with timeouts and a circuit breaker, so
+    a slow or down Stripe sends users back to their cart quickly. Items
+    are repriced from the database, and unavailable ones refused. Only the
+    pending checkout's ID is sent to Stripe, as metadata.
+
     - param request: HTTP request object.
     - return: redirect to Stripe checkout session or cart page if
       checkout fails or cart is empty.
     """
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+    user = await request.auser()
+    pending = await PendingCheckout.objects.filter(
+        pk=await request.session.aget("checkout_id"), user=user).afirst()
 
-    metadata = request.session.get("checkout_metadata", {})
-    cart = json.loads(metadata.get("cart", "{}"))
-
-    if not cart:
+    if pending is None or not pending.cart:
         messages.error(request, "Your cart is empty.")
         return redirect("shop:show_cart")
 
-    # Build line items
-    line_items = []
-    for entry in cart.values():
-        product = Product.objects.get(id=entry["product_id"])
-        price = int(Decimal(entry["price"]) * 100)
-        line_items.append({
-            "price_data": {
-                "currency": "gbp",
-                "product_data": {"name": (f"{product.name} ({entry['size']}, "
-                                          f"{entry['frame_colour']})")},
-                "unit_amount": price,
-            },
-            "quantity": entry["quantity"],
-        })
+    # Build line items at current prices, the order is saved with them
+    try:
+        cart, line_items = await price_cart(pending.cart)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect("shop:show_cart")
+    if cart != pending.cart:
+        pending.cart = cart
+        await pending.asave(update_fields=["cart"])
 
     # Create the stripe checkout session
     try:
-        checkout_session = stripe.checkout.Session.create(
+        checkout_url = await start_checkout(
+            request, pending.pk,
             payment_method_types=["card"],
             line_items=line_items,
             mode="payment",
@@ -702,14 +995,19 @@ def create_checkout_session(request):
                 reverse("shop:checkout_success")),
             cancel_url=request.build_absolute_uri(
                 reverse("shop:checkout_cancel")),
-            customer_email=request.user.email,
-            metadata=metadata,
+            customer_email=user.email,
+            metadata={"checkout_id": str(pending.pk)},
         )
-        return redirect(checkout_session.url)
+        return redirect(checkout_url)
     except stripe.error.AuthenticationError:
         messages.error(
             request, "Payment configuration error. Please contact support.")
         return redirect("shop:show_cart")
+    except PaymentUnavailable:
+        messages.error(
+            request, "Payments are unavailable at the moment. Please try "
+            "again in a few minutes.")
+        return redirect("shop:show_cart")
 
 
 @login_required
@@ -792,13 +1090,13 @@ def checkout(request):
                     defaults={**billing_data, "is_default": True},
                 )
 
-            # Store metadata for Stripe
-            request.session["checkout_metadata"] = {
-                "user_id": user.id,
-                "cart": json.dumps(cart),
-                **{f"shipping_{k}": v for k, v in shipping_data.items()},
-                **{f"billing_{k}": v for k, v in billing_data.items()},
-            }
+            # Freeze the cart and addresses for the webhook. Its ID gives
+            # each checkout its own idempotency key, while repeat requests
+            # for the same checkout reuse its Stripe session
+            pending = PendingCheckout.objects.create(
+                user=user, cart=cart, shipping=shipping_data,
+                billing=billing_data)
+            request.session["checkout_id"] = str(pending.pk)
 
             return redirect("shop:create_checkout_session")
 
@@ -816,10 +1114,15 @@ def checkout(request):
 
 
 @csrf_exempt
-def stripe_webhook(request):
+async def stripe_webhook(request):
     """
     Handles stripes webhook events securely.
 
+    Async, so under ASGI Stripe's retries and bursts of webhooks don't
+    each hold a thread while emails are sent. The order is created from
+    the pending checkout whose ID is in the session's metadata, which is
+    claimed so a redelivered event places no second order.
+
     - param request: HTTP request object.
     - return: HTTP 200 on success, or 400 if verification fails.
     """
@@ -838,98 +1141,19 @@ def stripe_webhook(request):
         session = event["data"]["object"]
         metadata = session.get("metadata", {})
 
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        user = User.objects.filter(id=metadata.get("user_id")).first()
-
-        # Extract address data
-        shipping_data = {key.replace("shipping_", ""): value
-                         for key, value in metadata.items()
-                         if key.startswith("shipping_")}
-        billing_data = {key.replace("billing_", ""): value
-                        for key, value in metadata.items()
-                        if key.startswith("billing_")}
-
-        # Create or reuse unique address
-        shipping_address, _ = Address.objects.update_or_create(
-            user=user,
-            is_shipping=True,
-            defaults={**shipping_data, "is_default": True},
-        )
-        if shipping_data == billing_data:
-            billing_address = shipping_address
-        else:
-            billing_address, _ = Address.objects.update_or_create(
-                user=user,
-                is_billing=True,
-                defaults={**billing_data, "is_default": True},
-            )
-
-        # Calculates carts total
-        cart = metadata.get("cart", "{}")
-        if isinstance(cart, str):
-            cart = json.loads(cart)
-
-        total = sum(Decimal(
-            item["price"]) * int(item["quantity"]) for item in cart.values())
-
-        # Creates order
-        order = Order.objects.create(
-            user=user,
-            total=total,
-            shipping_address=shipping_address,
-            billing_address=billing_address,
-        )
+        # Creates the order from the cart and addresses frozen when
+        # checkout started, once however often Stripe sends the event
+        placed = await sync_to_async(place_order)(metadata.get("checkout_id"))
+        if placed is None:
+            return HttpResponse(status=200)
+        order, purchased = placed
 
-        # Create order items
-        for entry in cart.values():
-            try:
-                product = Product.objects.get(id=entry["product_id"])
-            except Product.DoesNotExist:
-                continue
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                size=entry.get("size", ""),
-                frame_colour=entry.get("frame_colour", ""),
-                quantity=int(entry.get("quantity", 1)),
-                price=Decimal(entry.get("price", "0.00")),
-            )
-        print("Order item passed")
-
-        # Send customer email confirmation
-        subject = f"Celuvia Images - Order Confirmation #{order.id}"
-        body = render_to_string(
-            "shop/order_confirmation_email.txt", {"order": order})
-
-        email = EmailMessage(
-            subject, body, None, [session["customer_email"]])
-        email.send(fail_silently=True)
-
-        # Send store owner notification email
-        store_items = defaultdict(list)
-        for item in order.items.select_related("product__store"):
-            store_items[item.product.store].append(item)
-
-        for store, items in store_items.items():
-
-            # Get owner total per store
-            store_total = sum(Decimal(item.get_subtotal()) for item in items)
-
-            vendor_subject = f"New Order #{order.id} - {store.name}"
-            vendor_context = {
-                "store": store,
-                "order": order,
-                "items": items,
-                "store_total": store_total
-            }
-            vendor_body = render_to_string(
-                "shop/vendor_order_confirmation_email.txt", vendor_context
-            )
+        # Verified reviews and "you bought this" badges read these
+        await sync_to_async(record_purchases)(order.user, purchased)
 
-            vendor_email = EmailMessage(
-                vendor_subject, vendor_body, None, [store.email],)
-            vendor_email.send(fail_silently=True)
+        # Send customer and store owner emails
+        await sync_to_async(send_order_emails)(
+            order, session["customer_email"])
     return HttpResponse(status=200)
 
 
@@ -980,10 +1204,7 @@ def add_review(request, product_id):
             review.product = product
             review.user = request.user
             # mark as verified if user bought this product
-            review.verified = OrderItem.objects.filter(
-                order__user=request.user,
-                product=product
-            ).exists()
+            review.verified = has_purchased(request.user, product.id)
             review.save()
             return redirect("shop:product_detail", product_id=product.id)
     else:
@@ -1052,28 +1273,89 @@ def my_orders(request):
 # REST API Serializers
 
 
+def store_stamps(request):
+    """
+    Version stamp of the stores.
+    """
+    return [table_stamp(Store.objects.all())]
+
+
+STORES_PAGE_MAX = 1000
+STORE_ORDERING = ("owner__full_name", "owner_id", "id")
+
+
+def group_stores(rows):
+    """
+    Groups store rows, ordered by owner, into one entry per owner.
+
+    - param rows: iterable of store value dicts with the owner's names.
+    - return: generator of dicts with the owner and their stores.
+    """
+    for owner_id, stores in groupby(rows, key=itemgetter("owner")):
+        stores = list(stores)
+        owner_name = (f"{stores[0]['owner__first_name']} "
+                      f"{stores[0]['owner__last_name']}").strip()
+        yield {
+            "owner_id": owner_id,
+            "owner_name": owner_name,
+            "stores": [{field: store[field]
+                        for field in StoreSerializer.Meta.fields}
+                       for store in stores],
+        }
+
+
+@conditional_get(store_stamps)
 @api_view(["GET"])
+@replica_reads
 def view_stores(request):
     """
-    Allows users to view all active stores using an API.
+    Allows users to view stores, grouped by owner, using an API.
+
+    All stores are read in one query ordered by owner and streamed as JSON.
+    Query parameters:
+        - active: "true" or "false" to list only active or closed stores.
+        - limit: page size, the next page is given in the Link header. An
+          owner's stores may continue on the next page.
+        - cursor: position of the page, taken from the Link header.
     """
     if request.method == "GET":
-        stores = Store.objects.select_related(
-            "owner").order_by("owner__full_name")
-
-        # Group Stores by owner
-        data = []
-        for owner in User.objects.filter(
-                stores__in=stores).distinct().order_by("full_name"):
-            owner_stores = stores.filter(owner=owner)
-            store_data = StoreSerializer(owner_stores, many=True).data
-            data.append({
-                "owner_id": owner.id,
-                "owner_name": owner.get_full_name(),
-                "stores": store_data,
-            })
+        try:
+            limit = page_limit(request, STORES_PAGE_MAX)
+            position = decode_cursor(request, len(STORE_ORDERING),
+                                     (str, int, int))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        # Rows are read while streaming, after replica_reads has returned,
+        # so pick the database now
+        stores = Store.objects.using(router.db_for_read(Store)).order_by(
+            *STORE_ORDERING)
+        active = request.GET.get("active")
+        if active in ("true", "false"):
+            stores = stores.filter(is_active=active == "true")
+        if position:
+            stores = stores.filter(after(STORE_ORDERING, position))
+        rows = stores.values(*StoreSerializer.Meta.fields, "owner__full_name",
+                             "owner__first_name", "owner__last_name")
+
+        link = None
+        if limit:
+            rows = list(rows[:limit + 1])
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                link = next_link(request, [last["owner__full_name"],
+                                           last["owner"], last["id"]])
+        else:
+            rows = rows.iterator(chunk_size=2000)
 
-        return JsonResponse(data, safe=False, status=status.HTTP_200_OK)
+        response = StreamingHttpResponse(
+            stream_json_list(group_stores(rows)),
+            content_type="application/json", status=status.HTTP_200_OK)
+        if link:
+            response["Link"] = link
+        return response
 
 
 @api_view(["POST"])
@@ -1106,14 +1388,49 @@ def add_store_api(request):
             status=status.HTTP_400_BAD_REQUEST, safe=False)
 
 
+def category_stamps(request):
+    """
+    Version stamp of the categories.
+    """
+    return [table_stamp(Category.objects.all())]
+
+
+@conditional_get(category_stamps)
 @api_view(["GET"])
+@replica_reads
 def get_categories(request):
     """
     Allow users to view categories.
     """
     if request.method == "GET":
-        serializer = CategorySerializer(Category.objects.all(), many=True)
-        return JsonResponse(data=serializer.data)
+        serializer = CategorySerializer(
+            category_registry.get_categories(), many=True)
+        return JsonResponse(data=serializer.data, safe=False)
+
+
+@api_view(["GET"])
+def get_suggestions(request):
+    """
+    Suggests categories and products for the home page's search box, from
+    the in-process suggestion index, so no query is made once it is built.
+
+    Query parameters:
+        - q: text typed so far, matched against the start of each name and
+          of each word in it, ignoring case.
+        - limit: most suggestions returned.
+    """
+    if request.method == "GET":
+        try:
+            limit = page_limit(request, SUGGESTIONS_MAX, SUGGESTIONS_DEFAULT)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        query = request.GET.get("q", "")
+        return JsonResponse({
+            "query": query,
+            "suggestions": get_suggestion_index().suggest(query, limit),
+        })
 
 
 @api_view(["POST"])
@@ -1145,33 +1462,116 @@ def add_category_api(request):
                     data=category_data, status=status.HTTP_201_CREATED)
 
 
-def view_store_products(request):
+def product_list_stamps(request):
     """
-    Allow vendors to view products by store using an API.
+    Version stamp of the products, which their sizes touch.
+    """
+    return [table_stamp(Product.objects.all())]
+
+
+PRODUCTS_PAGE_SIZE = 100
+PRODUCTS_PAGE_MAX = 1000
+
+
+def filter_catalog(products, params):
+    """
+    Applies the catalog API's query parameters to a product queryset.
+
+    - param products: queryset of products.
+    - param params: query parameters of the request.
+    - return: filtered queryset.
+    - raise ValueError: if a parameter has an invalid value.
+    """
+    active = params.get("active", "true")
+    if active not in ("true", "false", "all"):
+        raise ValueError("active must be true, false or all.")
+    if active != "all":
+        products = products.filter(is_active=active == "true")
+
+    store = params.get("store")
+    if store is not None:
+        if not store.isdigit():
+            raise ValueError("store must be a store ID.")
+        products = products.filter(store_id=int(store))
+
+    category = params.get("category")
+    if category is not None:
+        products = products.filter(category__slug=category)
+
+    min_price, max_price = params.get("min_price"), params.get("max_price")
+    if min_price is not None or max_price is not None:
+        # Lowest price of the sizes the product has, as on product cards
+        products = products.annotate(from_price=Least(
+            Coalesce("sizes__small_price", "sizes__medium_price",
+                     "sizes__large_price"),
+            Coalesce("sizes__medium_price", "sizes__large_price",
+                     "sizes__small_price"),
+            Coalesce("sizes__large_price", "sizes__small_price",
+                     "sizes__medium_price")))
+        try:
+            low, high = (None if price is None else Decimal(price)
+                         for price in (min_price, max_price))
+            # NaN and Infinity parse, but no price field can hold them
+            if not all(price is None or price.is_finite()
+                       for price in (low, high)):
+                raise InvalidOperation
+        except InvalidOperation:
+            raise ValueError("min_price and max_price must be numbers.")
+        if low is not None:
+            products = products.filter(from_price__gte=low)
+        if high is not None:
+            products = products.filter(from_price__lte=high)
+    return products
+
+
+@conditional_get(product_list_stamps)
+@replica_reads
+async def view_store_products(request):
+    """
+    Allow users to browse the product catalog using an API.
+
+    Products and their sizes are read in one joined query, ordered by ID,
+    with the async ORM.
+    Query parameters:
+        - store: store ID, category: category slug.
+        - min_price, max_price: range for the product's lowest size price.
+        - active: "true" (default), "false" or "all".
+        - fields: comma separated fields to return, e.g. "id,name,sizes".
+        - limit: page size, default 100. The next page is given in the
+          Link header.
+        - cursor: position of the page, taken from the Link header.
     """
     if request.method == "GET":
-        stores = Store.objects.all()
-        for store in stores:
-            products = Product.objects.filter(
-                store=store, is_active=True).select_related("sizes")
-
-            # Build a list of the products
-            product_list = []
-            for product in products:
-                product_data = ProductSerializer(product).data
-
-                # If size prices exist
-                if hasattr(product, "sizes"):
-                    product_data["sizes"] = SizeSerializer(
-                        product.sizes).data
-                else:
-                    product_data["sizes"] = None
+        fields = request.GET.get("fields")
+        if fields is not None:
+            fields = fields.split(",")
+            unknown = set(fields) - set(CatalogProductSerializer.Meta.fields)
+            if unknown:
+                return JsonResponse(
+                    {"error": f"Unknown fields: {', '.join(sorted(unknown))}"},
+                    status=status.HTTP_400_BAD_REQUEST)
 
-                # Add products to the list then return the list
-                product_list.append(product_data)
-            return JsonResponse(
-                product_list, safe=False, status=status.HTTP_200_OK)
-        return JsonResponse(status=status.HTTP_403_FORBIDDEN)
+        try:
+            limit = page_limit(request, PRODUCTS_PAGE_MAX, PRODUCTS_PAGE_SIZE)
+            position = decode_cursor(request, 1, (int,))
+            products = filter_catalog(
+                Product.objects.select_related("sizes").order_by("id"),
+                request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+        if position:
+            products = products.filter(after(("id",), position))
+
+        products = [product async for product in products[:limit + 1]]
+        response = JsonResponse(
+            CatalogProductSerializer(
+                products[:limit], many=True, fields=fields).data,
+            safe=False, status=status.HTTP_200_OK)
+        if len(products) > limit:
+            response["Link"] = next_link(request, [products[limit - 1].id])
+        return response
+    return JsonResponse({}, status=status.HTTP_403_FORBIDDEN)
 
 
 @csrf_exempt
@@ -1271,32 +1671,168 @@ def add_product_api(request):
             status=status.HTTP_403_FORBIDDEN)
 
 
-@api_view(["GET"])
+@csrf_exempt
+@api_view(["POST"])
 @authentication_classes([BasicAuthentication])
 @permission_classes([IsAuthenticated])
-def get_reviews(request):
-    if request.method == "GET":
-        user = request.user
-        user_reviews = []
-
-        # Find products owned by this user
-        products = Product.objects.filter(store__owner=user)
+def import_products_api(request):
+    """
+    Allow vendors to import many products at once through an API.
 
-        # Collect reviews for those products
-        for product in products:
-            reviews = Review.objects.filter(product=product)
-            for review in reviews:
-                review_data = ReviewSerializer(review).data
-                review_data["product_name"] = product.name
-                review_data["store_name"] = product.store.name
-                user_reviews.append(review_data)
+    Multipart form fields:
+        - store: ID of the vendor's store to import into.
+        - file: CSV or NDJSON file with one product per row, with the
+          columns of CatalogRowForm.
+        - images: zip file of the images named in the rows.
+        - format: "csv" or "ndjson", if the file extension doesn't say.
 
-        # Return the collected reviews, or a message if there are none
-        if user_reviews:
+    Returns the number of products created and the errors of the rows
+    that were skipped.
+    """
+    if request.method == "POST":
+        store_id = str(request.data.get("store", ""))
+        store = Store.objects.filter(
+            id=store_id, owner=request.user).first() \
+            if store_id.isdigit() else None
+        if store is None:
             return JsonResponse(
-                user_reviews, status=status.HTTP_200_OK, safe=False)
+                {"error": "Store not found or not owned by the user."},
+                status=status.HTTP_403_FORBIDDEN)
+
+        upload = request.FILES.get("file")
+        if upload is None:
+            return JsonResponse({"error": "An import file is required."},
+                                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            format = import_format(upload.name, request.data.get("format"))
+            images = ImageSource(request.FILES.get("images"))
+        except (ValueError, BadZipFile) as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        report = CatalogImport(store, images).run(
+            read_rows(upload.file, format))
+
+        # One tweet for the whole import
+        if report["created"]:
+            try:
+                post_tweet(f"📢 {store.name} just added "
+                           f"{report['created']} new prints 🥳")
+            except Exception as e:
+                print("Tweet failed:", e)
+
+        if report["created"]:
+            code = status.HTTP_201_CREATED
+        elif report["errors"]:
+            code = status.HTTP_400_BAD_REQUEST
         else:
-            return JsonResponse(
-                {"message": "There are no reviews for your products!"},
-                status=status.HTTP_200_OK
-            )
+            code = status.HTTP_200_OK
+        return JsonResponse(report, status=code)
+
+
+REVIEWS_API_PAGE_SIZE = 100
+REVIEWS_API_PAGE_MAX = 1000
+REVIEW_ORDERING = ("-created_at", "-id")
+
+
+def filter_reviews(reviews, params):
+    """
+    Applies the reviews API's rating and date filters to a review queryset.
+
+    - param reviews: queryset of reviews.
+    - param params: query parameters of the request.
+    - return: filtered queryset.
+    - raise ValueError: if a parameter has an invalid value.
+    """
+    rating = params.get("rating")
+    if rating is not None:
+        if rating not in [str(value) for value, label in
+                          Review.RATING_CHOICES]:
+            raise ValueError("rating must be a number from 1 to 5.")
+        reviews = reviews.filter(rating=int(rating))
+
+    for param, lookup in [("since", "gte"), ("until", "lte")]:
+        day = params.get(param)
+        if day is not None:
+            try:
+                day = date.fromisoformat(day)
+            except ValueError:
+                raise ValueError(f"{param} must be a date, e.g. 2025-01-31.")
+            reviews = reviews.filter(**{f"created_at__date__{lookup}": day})
+    return reviews
+
+
+@api_view(["GET"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def get_reviews(request):
+    """
+    Allow vendors to view the reviews of their products using an API.
+
+    Returns a summary per product (review count, average rating and
+    verified reviews) and a page of reviews, newest first. The reviews
+    are read in one query with their product, store and user, and the
+    summary in one grouped query.
+    Query parameters:
+        - rating: only reviews with this rating.
+        - since, until: only reviews from/to these dates (YYYY-MM-DD).
+        - limit: page size, default 100. The next page is given in the
+          Link header.
+        - cursor: position of the page, taken from the Link header.
+    """
+    if request.method == "GET":
+        try:
+            limit = page_limit(request, REVIEWS_API_PAGE_MAX,
+                               REVIEWS_API_PAGE_SIZE)
+            position = decode_cursor(request, len(REVIEW_ORDERING),
+                                     (str, int))
+            if position:
+                position[0] = parse_datetime(position[0])
+                if position[0] is None:
+                    raise ValueError("Invalid cursor.")
+            reviews = filter_reviews(
+                Review.objects.filter(product__store__owner=request.user),
+                request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        summary = list(
+            reviews.values("product_id", "product__name")
+            .annotate(reviews=Count("id"), average_rating=Avg("rating"),
+                      verified=Count("id", filter=Q(verified=True)))
+            .order_by("product__name", "product_id"))
+
+        page = reviews.select_related("product__store", "user").order_by(
+            *REVIEW_ORDERING)
+        if position:
+            page = page.filter(after(REVIEW_ORDERING, position))
+        page = list(page[:limit + 1])
+
+        user_reviews = []
+        for review, review_data in zip(
+                page[:limit], ReviewSerializer(page[:limit], many=True).data):
+            review_data["product_name"] = review.product.name
+            review_data["store_name"] = review.product.store.name
+            review_data["user_name"] = review.user.full_name
+            user_reviews.append(review_data)
+
+        data = {
+            "summary": [{
+                "product_id": row["product_id"],
+                "product_name": row["product__name"],
+                "reviews": row["reviews"],
+                "average_rating": round(row["average_rating"], 2),
+                "verified": row["verified"],
+            } for row in summary],
+            "reviews": user_reviews,
+        }
+        if not summary:
+            data["message"] = "There are no reviews for your products!"
+        response = JsonResponse(data, status=status.HTTP_200_OK)
+        if len(page) > limit:
+            last = page[limit - 1]
+            response["Link"] = next_link(
+                request, [last.created_at.isoformat(), last.id])
+        return response